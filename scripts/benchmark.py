@@ -0,0 +1,323 @@
+""" Micro benchmarks for the research and backtest kernels on synthetic data.
+
+    $ python -m scripts.benchmark accounting --tickers 500 --years 15
+    $ python -m scripts.benchmark optimizer --assets 30
+    $ python -m scripts.benchmark moments --window 250
+    $ python -m scripts.benchmark win-weights --window 20
+    $ python -m scripts.benchmark ewma --halflife 20
+    $ python -m scripts.benchmark stats --signals 20
+    $ python -m scripts.benchmark drawdowns --signals 50 --top 10
+    $ python -m scripts.benchmark streaks --signals 50
+    $ python -m scripts.benchmark portfolio --signals 8 --processes 4
+    $ python -m scripts.benchmark incremental --tickers 50
+"""
+import click
+import numpy as np
+import pandas as pd
+import time
+
+from typing import *
+
+from src.utils.fe import ANNUAL
+
+
+def synthetic_prices(tickers: int, years: int, seed: int = 0) -> pd.DataFrame:
+    rs = np.random.RandomState(seed)
+    index = pd.bdate_range('2000-01-03', periods=years * ANNUAL)
+    returns = rs.normal(0.0003, 0.015, (len(index), tickers))
+    return pd.DataFrame(100 * np.exp(returns.cumsum(axis=0)), index=index, columns=[f'T{i}' for i in range(tickers)])
+
+
+def measure(func: Callable, repeat: int = 3) -> float:
+    """ Best wall time in seconds over repeat runs. """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return round(min(timings), 4)
+
+
+@click.group()
+def benchmark():
+    ...
+
+
+@benchmark.command('accounting')
+@click.option('--tickers', default=500, help='Number of tickers')
+@click.option('--years', default=15, help='Years of daily history')
+def accounting(tickers: int, years: int):
+    """ DailySignal pnl/tcost/net_returns: pandas chains vs the cached NumPy ledger. """
+    from src.execution.signal import DailySignal
+    from src.execution.utils import gross_pnl, txn_cost
+
+    prices = synthetic_prices(tickers, years)
+    rs = np.random.RandomState(1)
+    positions = (pd.DataFrame(rs.normal(0, 1, prices.shape), index=prices.index, columns=prices.columns)
+                 .mul(1000).div(prices).round()).iloc[1:]
+    notional = 10000
+
+    def pandas_chains():
+        # Every property access recomputed the chain, net_returns recomputing both pnl and tcost.
+        pnl = prices.diff().mul(positions.shift()).dropna(axis=1, how='all').dropna().sum(axis=1)
+        qty = positions.diff().abs().dropna()
+        notional_cost = qty.mul(prices).dropna().mul(0.01)
+        cost = pd.DataFrame(1.0, index=qty.index, columns=qty.columns)\
+            .combine(qty.mul(0.005).combine(notional_cost, np.minimum), np.maximum)
+        tcost = pd.DataFrame(np.where(qty > 5, cost, 0.0), index=qty.index, columns=qty.columns).sum(axis=1)
+        return pnl.subtract(tcost).div(notional).dropna()
+
+    def ledger():
+        return gross_pnl(positions, prices).subtract(txn_cost(positions, prices)).div(notional).dropna()
+
+    signal = DailySignal()
+    signal.prices, signal.positions, signal.notional = prices, positions, notional
+    signal.net_returns
+
+    click.echo(f'{tickers} tickers x {len(prices)} days')
+    click.echo(f'pandas chains (per access): {measure(pandas_chains)}s')
+    click.echo(f'numpy ledger (cold):        {measure(ledger)}s')
+    click.echo(f'numpy ledger (cached):      {measure(lambda: signal.net_returns)}s')
+
+
+@benchmark.command('optimizer')
+@click.option('--assets', default=30, help='Number of assets')
+@click.option('--solves', default=50, help='Number of solves per method')
+def optimizer(assets: int, solves: int):
+    """ Long-only min-variance per-solve time: fresh cvxpy problem vs cached template vs dedicated box QP solver. """
+    import cvxpy as cp
+    from src.signals.optimizer import factor, min_variance, min_variance_template
+
+    rs = np.random.RandomState(0)
+    sigmas = [np.cov(rs.normal(0, 0.01, (ANNUAL, assets)).T) for _ in range(solves)]
+    it = iter(sigmas)
+
+    def fresh():
+        w = cp.Variable(assets)
+        cp.Problem(cp.Minimize(cp.quad_form(w, next(it))), [cp.sum(w) == 1, w >= 0, w <= 0.1]).solve()
+
+    def template():
+        min_variance_template(assets).solve(F=factor(next(it)), lb=0, ub=0.1)
+
+    def box_qp():
+        min_variance(next(it), 0, 0.1)
+
+    click.echo(f'{assets} assets, seconds per solve')
+    for name, func in [('cvxpy fresh', fresh), ('cvxpy template', template), ('box qp', box_qp)]:
+        it = iter(sigmas)
+        click.echo(f'{name:15} {measure(lambda: [func() for _ in range(solves)], repeat=1) / solves:.6f}')
+
+
+@benchmark.command('moments')
+@click.option('--signals', default=10, help='Number of signals')
+@click.option('--years', default=15, help='Years of daily history')
+@click.option('--window', default=250, help='Rolling window length')
+def moments(signals: int, years: int, window: int):
+    """ Rolling mean and covariance for Combination.mvo: per-window frame copies vs incremental strided windows. """
+    from src.analytics.rolling import RollingMoments
+
+    returns = synthetic_prices(signals, years).pct_change().iloc[1:]
+
+    def frames():
+        for j in range(len(returns) - window + 1):
+            data = returns.iloc[j: j + window]
+            np.mean(np.array(data), 0), np.array(data.cov())
+
+    def incremental():
+        for _ in RollingMoments(returns.values, window):
+            ...
+
+    click.echo(f'{signals} signals x {len(returns)} days, window {window}')
+    click.echo(f'frame copies: {measure(frames, repeat=1)}s')
+    click.echo(f'incremental:  {measure(incremental, repeat=1)}s')
+
+
+@benchmark.command('win-weights')
+@click.option('--years', default=3, help='Years of daily history')
+@click.option('--window', default=20, help='Rolling window length')
+def win_weights(years: int, window: int):
+    """ Combination.win_weights: per window and weight pandas loop vs one batched grid. """
+    from src.analytics.performance import Statistics
+    from src.analytics.signal import Combination
+
+    signals = synthetic_prices(2, years).pct_change().iloc[1:]
+
+    def loop():
+        for data in Combination._window(signals, window):
+            vec = {}
+            for weight in [(1 / 20) * j for j in range(1, 21)]:
+                vec[weight] = Statistics().win_rate(weight * data.iloc[:, 0] + (1 - weight) * data.iloc[:, 1])
+            pd.Series(vec).idxmax()
+
+    click.echo(f'{len(signals)} days, window {window}')
+    click.echo(f'pandas loop: {measure(loop, repeat=1)}s')
+    click.echo(f'batched:     {measure(lambda: Combination.win_weights(signals, window))}s')
+
+
+@benchmark.command('ewma')
+@click.option('--tickers', default=500, help='Number of tickers')
+@click.option('--years', default=15, help='Years of daily history')
+@click.option('--halflife', default=20.0, help='EWMA halflife')
+def ewma(tickers: int, years: int, halflife: float):
+    """ TimeSeries.ewma/ewvar: explicit decay powers per column vs pandas ewm vs the batched recursive kernel. """
+    from src.analytics.ts import TimeSeries
+
+    prices = synthetic_prices(tickers, years)
+
+    def powers(data: pd.Series) -> pd.Series:
+        alpha = 1 - np.exp(np.log(0.5) / halflife)
+        n = data.shape[0]
+        p = (1 - alpha) ** (np.arange(n + 1))
+        scale = 1 / p[:-1]
+        return (data.iloc[0] * p[1:]) + ((data * (alpha * (1 - alpha) ** (n - 1)) * scale).cumsum() * scale[::-1])
+
+    def columns():
+        return pd.concat([powers(prices[col]) for col in prices.columns], axis=1)
+
+    expected = prices.ewm(halflife=halflife, adjust=False)
+    with np.errstate(all='ignore'):
+        old = columns()
+    click.echo(f'{tickers} tickers x {len(prices)} days, halflife {halflife}')
+    click.echo(f'decay powers:  {measure(columns, repeat=1)}s, max error {np.nanmax((old - expected.mean()).abs().values)}, '
+               f'{int(old.isna().values.sum())} NaN')
+    click.echo(f'pandas mean:   {measure(lambda: expected.mean())}s')
+    click.echo(f'kernel mean:   {measure(lambda: TimeSeries.ewma(prices, halflife))}s, '
+               f'max error {np.nanmax((TimeSeries.ewma(prices, halflife) - expected.mean()).abs().values)}')
+    click.echo(f'pandas var:    {measure(lambda: expected.var())}s')
+    click.echo(f'kernel var:    {measure(lambda: TimeSeries.ewvar(prices, halflife))}s, '
+               f'max relative error {np.nanmax((TimeSeries.ewvar(prices, halflife) / expected.var() - 1).abs().values)}')
+
+
+@benchmark.command('stats')
+@click.option('--signals', default=20, help='Number of return series')
+@click.option('--years', default=15, help='Years of daily history')
+def stats(signals: int, years: int):
+    """ Yearly and monthly stat tables: groupby-agg with per group lambdas per series vs one GroupStats pass. """
+    from src.analytics.performance import Statistics
+    from src.execution.analysis import Analysis
+
+    returns = synthetic_prices(signals, years).pct_change().iloc[1:]
+
+    def agg(data: pd.Series, keys: List[Any]) -> pd.DataFrame:
+        return data.groupby(keys).agg(
+            Sharpe=Statistics.sharpe, Sortino=Statistics.sortino, Win=Statistics.win_rate, Max=np.max, Min=np.min,
+            Return=lambda x: Statistics.cumulative_returns(x, history=False), Count=np.size).round(4)
+
+    def groupby():
+        for col in returns.columns:
+            data = returns[col]
+            agg(data, data.index.year), agg(data, [data.index.year, data.index.month])
+
+    def engine():
+        Analysis.yearly_stats(returns), Analysis.monthly_stats(returns)
+
+    click.echo(f'{signals} series x {len(returns)} days, yearly and monthly tables')
+    click.echo(f'groupby agg: {measure(groupby, repeat=1)}s')
+    click.echo(f'GroupStats:  {measure(engine)}s')
+
+
+@benchmark.command('drawdowns')
+@click.option('--signals', default=50, help='Number of return series')
+@click.option('--years', default=15, help='Years of daily history')
+@click.option('--top', default=10, help='Number of drawdowns per series')
+def drawdowns(signals: int, years: int, top: int):
+    """ Top drawdowns: repeated trough search and slice dropping per series vs one episode pass over the matrix. """
+    from src.execution.analysis import Analysis
+
+    returns = synthetic_prices(signals, years).pct_change().iloc[1:]
+
+    def search(data: pd.Series):
+        uw = Analysis.underwater(data)
+        for _ in range(top):
+            valley = uw.idxmin()
+            peak = uw[:valley][uw[:valley] == 0].index[-1]
+            recovered = uw[valley:][uw[valley:] == 0].index
+            if len(recovered):
+                uw.drop(uw[peak:recovered[0]].index[1:-1], inplace=True)
+            else:
+                uw = uw.loc[:peak]
+            if len(uw) == 0 or np.min(uw) == 0:
+                break
+
+    click.echo(f'{signals} series x {len(returns)} days, top {top}')
+    click.echo(f'trough search: {measure(lambda: [search(returns[col]) for col in returns.columns], repeat=1)}s')
+    click.echo(f'episode pass:  {measure(lambda: Analysis.drawdowns(returns, top))}s')
+
+
+@benchmark.command('streaks')
+@click.option('--signals', default=50, help='Number of return series')
+@click.option('--years', default=15, help='Years of daily history')
+def streaks(signals: int, years: int):
+    """ Winning and losing streaks: itertools.groupby per series and year vs one run-length pass over the matrix. """
+    from itertools import groupby
+    from src.analytics.performance import Statistics
+
+    returns = synthetic_prices(signals, years).pct_change().iloc[1:]
+
+    def python():
+        for col in returns.columns:
+            for year in returns.index.year.unique():
+                [(k, len(list(g))) for k, g in groupby(np.sign(returns[col].loc[str(year)]))]
+
+    click.echo(f'{signals} series x {len(returns)} days, streaks per year')
+    click.echo(f'groupby:    {measure(python, repeat=1)}s')
+    click.echo(f'run-length: {measure(lambda: Statistics.streaks(returns, returns.index.year))}s')
+
+
+@benchmark.command('portfolio')
+@click.option('--signals', default=8, help='Number of signals in the portfolio')
+@click.option('--tickers', default=50, help='Tickers per signal')
+@click.option('--years', default=15, help='Years of daily history')
+@click.option('--processes', default=4, help='Worker processes')
+def portfolio(signals: int, tickers: int, years: int, processes: int):
+    """ Portfolio update: signals one after the other vs a process pool over shared prices. """
+    import asyncio
+    from src.execution.portfolio import Portfolio
+    from src.execution.signals.global_reversal import GlobalReversalBase
+
+    prices = synthetic_prices(signals * tickers, years)
+
+    def update(n: int):
+        columns = list(prices.columns)
+        p = Portfolio([GlobalReversalBase(columns[i * tickers:(i + 1) * tickers], 5) for i in range(signals)])
+        p.set_prices(prices)
+        asyncio.run(p.update(1e6, processes=n))
+
+    click.echo(f'{signals} signals x {tickers} tickers x {len(prices)} days')
+    click.echo(f'sequential:  {measure(lambda: update(1), repeat=1)}s')
+    click.echo(f'{processes} processes: {measure(lambda: update(processes), repeat=1)}s')
+
+
+@benchmark.command('incremental')
+@click.option('--tickers', default=50, help='Number of tickers')
+@click.option('--years', default=15, help='Years of daily history')
+def incremental(tickers: int, years: int):
+    """ Live update with one new bar: full recompute vs advancing the saved state. """
+    import asyncio
+    import tempfile
+    from src.execution import signal as module
+    from src.execution.signals.global_reversal import GlobalReversalBase
+
+    prices = synthetic_prices(tickers, years)
+    module.STATE_DIR = tempfile.mkdtemp()
+    signal = GlobalReversalBase(list(prices.columns), 5)
+
+    def update(end: int, incremental: bool):
+        signal.set_prices(prices.iloc[:end])
+        asyncio.run(signal.update(1e6, incremental))
+
+    update(-1, True)
+    state = signal._state_file.read_bytes()
+
+    def advance():
+        # Every run advances the state of the previous day by the last bar.
+        signal._state_file.write_bytes(state)
+        update(len(prices), True)
+
+    click.echo(f'{tickers} tickers x {len(prices)} days, one new bar')
+    click.echo(f'full:        {measure(lambda: update(len(prices), False))}s')
+    click.echo(f'incremental: {measure(advance)}s')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,19 +1,36 @@
 import numpy as np
 import pandas as pd
 import statsmodels.formula.api as smf
+from src.analytics.rolling import window_moments
 from src.data.data_loader import Stock
-from multiprocessing import cpu_count, Pool
 from typing import *
 
 __author__ = 'kqureshi'
 
 
-class Pair:
+def rolling_ols(y: pd.Series, x: pd.Series, window: Optional[int] = None, min_periods: int = 2) -> pd.DataFrame:
+    """
+    OLS of y on x with an intercept over every rolling window (expanding if window is None) in one pass, from
+    the running sums of window_moments. Rows with a missing value are left out of the windows they fall in.
+    :return: frame with alpha, beta and resid (residual of the last observation of each window)
+    """
+    y, x = y.align(x, join='inner')
+    moments = window_moments(x.values.astype(float)[:, None], y.values.astype(float)[:, None], window)
+    n, mean_x, mean_y, cov, var, _ = [moment[:, 0] for moment in moments]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        beta = cov / var
+    first = (min_periods if window is None else window) - 1
+    beta[np.arange(len(beta)) < first] = np.nan
+    beta[(n < max(min_periods, 2)) | (var <= 0)] = np.nan
+    alpha = np.where(np.isnan(beta), np.nan, mean_y - beta * mean_x)
+    resid = y.values - alpha - beta * x.values
+    return pd.DataFrame(dict(alpha=alpha, beta=beta, resid=resid), index=y.index)
+
 
-    def __init__(self):
+class Pair:
 
-        self.cov_type = 'HAC'
-        self.windows = [20, 60, 120, 250, 500]
+    cov_type = 'HAC'
+    windows = [20, 60, 120, 250, 500]
 
     @classmethod
     def _window(cls, data: pd.DataFrame, window: int) -> List[pd.DataFrame]:
@@ -35,10 +52,16 @@ class Pair:
         return result.params[x]
 
     @classmethod
-    def spread(cls, y: str, x: str, tickers: List[str], window: int) -> pd.Series:
+    def hedge(cls, prices: pd.DataFrame, y: str, x: str, window: Optional[int] = None) -> pd.DataFrame:
+        """
+        Rolling (expanding if window is None) hedge ratios, intercepts and residuals of log prices
+        """
+        return rolling_ols(np.log(prices[y]), np.log(prices[x]), window=window)
+
+    @classmethod
+    def spread(cls, y: str, x: str, tickers: List[str], window: Optional[int] = None) -> pd.Series:
         data = Stock.daily(tickers=tickers, diff=False)
+        data.index = pd.DatetimeIndex(data.index)
         prices = np.log(data)
-        prices.index = pd.DatetimeIndex(prices.index)
-        data_list = _window(data=prices, window=window)
-        betas = pd.Series(list(Pool(cpu_count()).map(reg, data_list)), index=pd.DatetimeIndex(prices.index[(window - 1):]))
+        betas = cls.hedge(data, y, x, window)['beta']
         return prices[y] - (prices[x] * betas)
@@ -2,12 +2,38 @@ import sys
 import numpy as np
 import os
 import sys
-from itertools import groupby
 from src.utils.fe import *
 
 __author__ = 'kqureshi'
 
 
+def _runs(values: np.ndarray, breaks: Optional[np.ndarray] = None) -> Tuple[np.ndarray, ...]:
+    """
+    Run-length encoding of the signs of the columns of a 2D array. Zeros and NaNs end a run, as does a True in breaks
+    (one flag per row). Returns the column, first row, length, sign (1 or -1) and compounded return of every run.
+    """
+    n, m = values.shape
+    edges = np.zeros(n, dtype=bool) if breaks is None else np.asarray(breaks, dtype=bool).copy()
+    edges[:1] = True
+    # Column-major so that every column starts a new run.
+    flat = values.T.ravel()
+    signs = np.nan_to_num(np.sign(flat))
+    change = np.tile(edges, m)
+    change[1:] |= signs[1:] != signs[:-1]
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, n * m))
+    growth = np.multiply.reduceat(np.where(signs != 0, 1 + flat, 1), starts) - 1 if len(starts) else np.zeros(0)
+    keep = signs[starts] != 0
+    columns, rows = np.divmod(starts[keep], n)
+    return columns, rows, lengths[keep], signs[starts][keep].astype(int), growth[keep]
+
+
+def _longest(lengths: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """ Position of the longest run of every group, the last one on ties. """
+    order = np.lexsort((np.arange(len(lengths)), lengths, groups))
+    return order[np.append(groups[order][1:] != groups[order][:-1], True)] if len(order) else order
+
+
 class Statistics:
     
     ANNUAL = 252
@@ -80,10 +106,8 @@ class Statistics:
 
     @classmethod
     def calmar(cls, data: pd.Series) -> float:
-        return -(((data.loc[data.index[-1] - pd.DateOffset(years=cls.sample_years):data.index[-1]].groupby(
-            data.loc[data.index[-1] - pd.DateOffset(years=cls.sample_years):data.index[-1]].index.year
-        ).apply(lambda x: ((1 + x).cumprod() - 1)[-1]))).mean()) / (data.loc[data.index[-1] - pd.DateOffset(
-            years=cls.sample_years):data.index[-1]].min())
+        recent = data.loc[data.index[-1] - pd.DateOffset(years=cls.sample_years):]
+        return -GroupStats(recent, recent.index.year).stat('Return').mean() / recent.min()
 
     @classmethod
     def qd(cls, data: pd.Series) -> pd.Series:
@@ -98,62 +122,191 @@ class Statistics:
                 'Sharpe', 'Sortino', 'Win', 'Max', 'Min', 'Skew', 'Kurtosis', 'Count']).to_frame().T
 
     @classmethod
-    def monthly_stats(cls, data: pd.Series) -> pd.DataFrame:
-        return pd.DataFrame(data.groupby(data.index.month).agg(
-            Sharpe=cls.sharpe, Sortino=cls.sortino, Win=cls.win_rate, CAGR=cls.cagr,
-            Max=np.max, Min=np.min, Count=np.size))
+    def grouped_stats(cls, data: Union[pd.Series, pd.DataFrame], keys: Any) -> pd.DataFrame:
+        return GroupStats(data, keys).table(GroupStats.STATS)
+
+    @classmethod
+    def monthly_stats(cls, data: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
+        return cls.grouped_stats(data, data.index.month)
+
+    @classmethod
+    def yearly_stats(cls, data: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
+        return cls.grouped_stats(data, data.index.year)
 
     @classmethod
-    def yearly_stats(cls, data: pd.Series) -> pd.DataFrame:
-        return pd.DataFrame(data.groupby(data.index.year).agg(
-            Sharpe=cls.sharpe, Sortino=cls.sortino, Win=cls.win_rate, CAGR=cls.cagr,
-            Max=np.max, Min=np.min, Count=np.size))
+    def ym_stats(cls, data: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
+        return cls.grouped_stats(data, [data.index.year, data.index.month]).unstack()
 
     @classmethod
-    def ym_stats(cls, data: pd.Series) -> pd.DataFrame:
-        return pd.DataFrame(data.groupby([data.index.year, data.index.month]).agg(
-            Sharpe=cls.sharpe, Sortino=cls.sortino, Win=cls.win_rate, CAGR=cls.cagr,
-            Max=np.max, Min=np.min, Count=np.size)).unstack()
+    def tow(cls, data: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
+        return cls.grouped_stats(data, pd.Index(data.index.isocalendar().week.values.astype(int), name=data.index.name))
 
     @classmethod
-    def tow(cls, data: pd.Series) -> pd.DataFrame:
-        return pd.DataFrame(data.groupby(data.index.week).agg(
-            Sharpe=cls.sharpe, Sortino=cls.sortino, Win=cls.win_rate, CAGR=cls.cagr,
-            Max=np.max, Min=np.min, Count=np.size))
+    def tom(cls, data: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
+        return cls.grouped_stats(data, data.index.month)
 
     @classmethod
-    def tom(cls, data: pd.Series) -> pd.DataFrame:
-        return pd.DataFrame(data.groupby(data.index.month).agg(
-            Sharpe=cls.sharpe, Sortino=cls.sortino, Win=cls.win_rate, CAGR=cls.cagr,
-            Max=np.max, Min=np.min, Count=np.size))
+    def streaks(cls, data: Union[pd.Series, pd.DataFrame], groups: Any = None) -> pd.DataFrame:
+        """ Winning (Sign 1) and losing (Sign -1) streaks of one or many return series, found in one pass.
+
+        :param data: returns, a series or one series per column
+        :param groups: optional label per row, e.g. the year, a streak never spans two groups
+        :return: one row per streak with its Start, End, Length and compounded Return (and Series for a frame)
+        """
+        frame = data.to_frame() if isinstance(data, pd.Series) else data
+        breaks = None
+        if groups is not None:
+            groups = np.asarray(groups)
+            breaks = np.append(True, groups[1:] != groups[:-1])
+        columns, rows, lengths, signs, growth = _runs(frame.values.astype(float), breaks)
+        df = pd.DataFrame({
+            'Series': frame.columns[columns],
+            'Sign': signs,
+            'Start': frame.index[rows],
+            'End': frame.index[rows + lengths - 1],
+            'Length': lengths,
+            'Return': growth,
+        })
+        return df.drop(columns='Series') if isinstance(data, pd.Series) else df
 
     @classmethod
     def trend(cls, data: pd.Series) -> pd.DataFrame:
-        def fetch(data: pd.Series) -> pd.Series:
-            pos, max_len, cum_pos = 0, 0, 0
-            for k, g in groupby((np.sign(data))):
-                if k == 1:
-                    pat_size = len(list(g))
-                    pos, max_len = (pos, max_len) if pat_size < max_len else (cum_pos, pat_size)
-                    cum_pos += pat_size
-                else:
-                    cum_pos += len(list(g))
-            return (100 * data.iloc[pos:pos + max_len]).reset_index().rename(columns={0: 'returns (%)', 'index': DATE})
+        """ Longest winning (rally) and losing (tank) streak, the last one on ties. Tank returns are negated. """
+        _, rows, lengths, signs, _ = _runs(data.values.reshape(-1, 1).astype(float))
+
+        def fetch(sign: int) -> pd.DataFrame:
+            pos, max_len = 0, 0
+            candidates = np.flatnonzero(signs == sign)
+            if len(candidates):
+                i = candidates[_longest(lengths[candidates], np.zeros(len(candidates)))[0]]
+                pos, max_len = rows[i], lengths[i]
+            streak = 100 * sign * data.iloc[pos:pos + max_len]
+            return streak.reset_index().rename(columns={0: 'returns (%)', 'index': DATE})
 
-        return pd.concat([fetch(data), fetch(-data)], axis=1, keys=['rally', 'tank'])
+        return pd.concat([fetch(1), fetch(-1)], axis=1, keys=['rally', 'tank'])
 
     @classmethod
     def yearly_trend(cls, data: pd.Series, trend: str = 'tank') -> pd.DataFrame:
-
+        """ Cumulative return path of the longest rally or tank of every year, labelled by its start date. """
+        sign = 1 if trend == 'rally' else -1
+        years = np.asarray(data.index.year)
+        _, rows, lengths, signs, _ = _runs(data.values.reshape(-1, 1).astype(float),
+                                           np.append(True, years[1:] != years[:-1]))
+        rows, lengths = rows[signs == sign], lengths[signs == sign]
         vec, labels = [], []
-        years = list((data.index.year.unique()))
-        for year in years:
-            labels.append(cls.trend(data.loc[str(year)])[trend][YAHOO_DATE][0].strftime(DATE_FORMAT))
-            vec.append((1 + cls.trend(data.loc[str(year)])[trend]['returns (%)'] / 100).cumprod() - 1)
+        for i in _longest(lengths, years[rows]):
+            labels.append(data.index[rows[i]].strftime(DATE_FORMAT))
+            streak = sign * data.iloc[rows[i]:rows[i] + lengths[i]].reset_index(drop=True)
+            vec.append(((1 + streak).cumprod() - 1).rename('returns (%)'))
         df = pd.concat(vec, axis=1, keys=labels)
         return df if trend == 'rally' else -df
 
 
+class GroupStats:
+    """
+    Per group statistics of one or many return series, all derived from accumulators built in one vectorized pass.
+
+    The rows are ordered by group once, then reduceat gives for every group and series the count, sum and centered
+    sum of squares, the number of wins and losses, the sum and centered sum of squares of the losses, max, min, growth
+    (product of 1 + r) and the max drawdown of the growth within the group. NaNs are skipped by the statistics, but
+    like the groupby tables before, Count and the years CAGR annualizes over count every row of the group. A frame
+    gives the same table as each of its columns on its own.
+
+    Usage:
+    >>> GroupStats(returns, returns.index.year).table(['Sharpe', 'Win'])
+    """
+
+    STATS = ['Sharpe', 'Sortino', 'Win', 'CAGR', 'Max', 'Min', 'Count']
+
+    def __init__(self, data: Union[pd.Series, pd.DataFrame], keys: Any, notional: bool = False, dropna: bool = False):
+        """
+        :param data: returns (or pnl if notional), a series or one series per column
+        :param keys: group label of every row, or a list of them for nested groups
+        :param notional: Return is the sum instead of the compounded return
+        :param dropna: Count and CAGR only count the non-NaN rows, as if the NaNs of each series were dropped first
+        """
+        self.data = data
+        self.notional = notional
+        self.dropna = dropna
+        keys = keys if isinstance(keys, list) else [keys]
+        index = pd.MultiIndex.from_arrays(keys) if len(keys) > 1 else pd.Index(keys[0])
+        codes, self.groups = pd.factorize(index, sort=True)
+        self.groups.names = index.names
+        order = np.argsort(codes, kind='stable')
+        values = np.asarray(data, dtype=float).reshape(len(data), -1)[order]
+        codes = codes[order]
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+
+        def reduce(ufunc: np.ufunc, array: np.ndarray) -> np.ndarray:
+            return ufunc.reduceat(array, starts, axis=0) if len(starts) else np.zeros((0, values.shape[1]))
+
+        def centered(mask: np.ndarray) -> np.ndarray:
+            # Centered on the overall mean so that the sums of squares keep their precision.
+            masked = np.where(mask, values, 0)
+            return np.where(mask, masked - masked.sum(axis=0) / np.maximum(mask.sum(axis=0), 1), 0)
+
+        valid = ~np.isnan(values)
+        wins, losses = valid & (values > 0), valid & (values < 0)
+        x, y = centered(valid), centered(losses)
+        self.count, self.wins, self.losses = [reduce(np.add, a.astype(int)) for a in [valid, wins, losses]]
+        self.rows = np.broadcast_to(np.diff(np.append(starts, len(codes)))[:, None], self.count.shape)
+        self.total, self.centered, self.squares = [reduce(np.add, a) for a in [np.where(valid, values, 0), x, x * x]]
+        self.loss_total, self.loss_squares = reduce(np.add, np.where(losses, values, 0)), reduce(np.add, y * y)
+        self.loss_centered = reduce(np.add, y)
+        self.max = reduce(np.maximum, np.where(valid, values, -np.inf))
+        self.min = reduce(np.minimum, np.where(valid, values, np.inf))
+        growth = np.where(valid, 1 + values, 1)
+        self.growth = reduce(np.multiply, growth)
+        wealth = pd.DataFrame(growth).groupby(codes).cumprod()
+        peak = np.maximum(wealth.groupby(codes).cummax().values, 1)
+        self.drawdown = reduce(np.minimum, wealth.values / peak - 1)
+
+    @staticmethod
+    def _std(n: np.ndarray, centered: np.ndarray, squares: np.ndarray) -> np.ndarray:
+        return np.sqrt(np.maximum(squares - centered * centered / n, 0) / (n - 1))
+
+    def _values(self, name: str) -> np.ndarray:
+        n = self.count
+        rows = n if self.dropna else self.rows
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.total / n
+            if name == 'Count':
+                # Without dropna every group has rows, with it a series absent from a group has no count.
+                return np.where(rows > 0, rows, np.nan) if self.dropna else rows
+            if name == 'Sharpe':
+                value = np.sqrt(Statistics.ANNUAL) * mean / self._std(n, self.centered, self.squares)
+            elif name == 'Sortino':
+                std = self._std(self.losses, self.loss_centered, self.loss_squares)
+                value = np.sqrt(Statistics.ANNUAL) * mean / std
+            elif name == 'Win':
+                value = np.where((self.wins > 0) & (self.losses > 0), self.wins / (self.wins + self.losses), np.nan)
+            elif name == 'CAGR':
+                # Same definition as Statistics.cagr.
+                value = self.growth * Statistics.ANNUAL / rows - 1
+            elif name == 'Return':
+                value = np.round(self.total, 2) if self.notional else self.growth - 1
+            elif name == 'Drawdown':
+                value = self.drawdown
+            elif name in ('Max', 'Min'):
+                value = self.max if name == 'Max' else self.min
+            else:
+                raise ValueError(f'Unknown statistic {name}.')
+        return np.where(n > 0, value, np.nan)
+
+    def stat(self, name: str) -> Union[pd.Series, pd.DataFrame]:
+        """ One statistic, groups x series (a series indexed by group if data was a series). """
+        if isinstance(self.data, pd.Series):
+            return pd.Series(self._values(name)[:, 0], index=self.groups, name=name)
+        return pd.DataFrame(self._values(name), index=self.groups, columns=self.data.columns)
+
+    def table(self, stats: List[str] = STATS) -> pd.DataFrame:
+        """ Statistics as columns, grouped by series first, (series, statistic), if data was a frame. """
+        if isinstance(self.data, pd.Series):
+            return pd.DataFrame({name: self.stat(name) for name in stats}, index=self.groups)
+        return pd.concat([self.stat(name) for name in stats], axis=1, keys=stats).swaplevel(axis=1)\
+            .reindex(columns=pd.MultiIndex.from_product([self.data.columns, stats]))
+
+
 class Report:
 
     @staticmethod
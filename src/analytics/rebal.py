@@ -1,5 +1,7 @@
 import cvxpy as cp
-from multiprocessing import cpu_count, Pool
+from multiprocessing import cpu_count, Pool, shared_memory
+from src.analytics.rolling import RollingMoments
+from src.signals.optimizer import Template, factor, mean_variance_template
 from src.utils.logger import logger
 from src.utils.fe import *
 
@@ -9,42 +11,61 @@ MIN_WEIGHT = 0.25
 MAX_WEIGHT = 0.75
 WINDOW = 20
 
+# Return matrix published by rebalance, attached once per worker by _attach.
+_SHARED: Dict[str, Any] = dict()
 
-def fetch(data: Tuple[int, pd.DataFrame], solver: Union[str, None] = None) -> List[float]:
+
+def _attach(name: str, shape: Tuple[int, int]) -> None:
+    memory = shared_memory.SharedMemory(name=name)
+    _SHARED.update(memory=memory, rets=np.ndarray(shape, dtype=np.float64, buffer=memory.buf))
+
+
+def solve(template: Template, mu: np.ndarray, sigma: np.ndarray, solver: Optional[str] = None) -> Optional[np.ndarray]:
     """
-    Single-period re-balance intended for multiprocessing
-    :param data:
-    :param solver:
-    :return:
+    Single-period re-balance: re-solve the parameterized problem warm-started from the previous window and fall back
+    to DEFAULT_SOLVER only if that fails
     """
-    j, table = data
-    data = table.iloc[j: j + WINDOW]
-    N, rets = data.shape[1], np.array(data)
-    gamma = cp.Parameter(nonneg=True)
-    gamma.value = AVERSION
-    w = cp.Variable(N)
-    ret = rets.mean(0).reshape(N, -1).T * w
-    risk = cp.quad_form(w, np.cov(rets.T))
-    prob = cp.Problem(cp.Maximize(ret - gamma * risk), [cp.sum(w) == SUM_WEIGHT, w >= MIN_WEIGHT, w <= MAX_WEIGHT])
-    try:
-        prob.solve() if not solver else prob.solve(solver=solver)
-    except:
-        prob.solve(solver=DEFAULT_SOLVER)
-    finally:
-        prob.solve(solver='SCS')
-    ref = (prob.solution.__dict__['primal_vars'])
-    logger.info('{} complete'.format(data.index[-1]))
+    if not (np.isfinite(mu).all() and np.isfinite(sigma).all()):
+        return None
+    if not len(mu) * MIN_WEIGHT <= SUM_WEIGHT <= len(mu) * MAX_WEIGHT:
+        # Infeasible bounds, no solver can help.
+        return None
+    values = dict(F=np.sqrt(AVERSION) * factor(sigma), mu=mu, lb=MIN_WEIGHT, ub=MAX_WEIGHT)
     try:
-        ref = ref[list(ref.keys())[0]]
-        if len(ref) > 0:
-            return ref
-    except IndexError:
+        template.solve(solver=solver, **values)
+    except cp.SolverError:
         pass
+    if template.problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        logger.warning(f'Re-balance status {template.problem.status}, falling back to {DEFAULT_SOLVER}')
+        try:
+            template.problem.solve(solver=DEFAULT_SOLVER)
+        except cp.SolverError:
+            return None
+    if template.problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        return None
+    return template.w.value.copy()
 
 
-def rebalance(data: pd.DataFrame, window: int = WINDOW) -> pd.DataFrame:
+def fetch(start: int, stop: int, window: int = WINDOW, solver: Optional[str] = None) -> List[Optional[np.ndarray]]:
     """
-    MP-enabled optimization
+    Re-balance the contiguous block of windows [start, stop) of the shared return matrix
+    :param start: first window, covering rows start to start + window - 1
+    :param stop: end of the block (exclusive)
+    :param window: window length
+    :param solver: preferred cvxpy solver
+    :return: weights of each window, None if it could not be solved
+    """
+    rets = _SHARED['rets'][start: stop + window - 1]
+    template = mean_variance_template(rets.shape[1])
+    weights = [solve(template, mu, sigma, solver) for _, mu, sigma in RollingMoments(rets, window)]
+    logger.info(f'Windows {start} to {stop} complete')
+    return weights
+
+
+def rebalance(data: pd.DataFrame, window: int = WINDOW, processes: Optional[int] = None) -> pd.DataFrame:
+    """
+    MP-enabled optimization. The return matrix is published once through shared memory and every worker solves a
+    contiguous block of windows. Weights of each date are solved on the preceding window.
     Example:
     data = pd.DataFrame(np.random.rand(100,5), columns=['a', 'b', 'c', 'd', 'e'])
     data = (2 * data) - 1
@@ -52,9 +73,22 @@ def rebalance(data: pd.DataFrame, window: int = WINDOW) -> pd.DataFrame:
     :param data:
     :return:
     """
-
-    iterations = list(range(len(data) - window))
-    data_list = [tuple([iteration, data]) for iteration in iterations]
-    return pd.DataFrame([[1 / len(data.columns)] * len(data.columns) if v is None else v for v in
-                         Pool(cpu_count()).map(fetch, data_list)], columns=data.columns,
-                        index=list(data.index[WINDOW:])).round(3)
+    assert SUM_WEIGHT == 1, 'The mean variance template is fully invested.'
+    rets = np.ascontiguousarray(data.values, dtype=np.float64)
+    windows = max(len(data) - window, 0)
+    chunks = np.array_split(np.arange(windows), processes or cpu_count())
+    blocks = [(int(chunk[0]), int(chunk[-1]) + 1) for chunk in chunks if len(chunk)]
+    weights = []
+    if blocks:
+        memory = shared_memory.SharedMemory(create=True, size=rets.nbytes)
+        try:
+            np.ndarray(rets.shape, dtype=np.float64, buffer=memory.buf)[:] = rets
+            with Pool(len(blocks), initializer=_attach, initargs=(memory.name, rets.shape)) as pool:
+                weights = [w for block in pool.starmap(fetch, [(start, stop, window) for start, stop in blocks])
+                           for w in block]
+        finally:
+            memory.close()
+            memory.unlink()
+    N = len(data.columns)
+    return pd.DataFrame([[1 / N] * N if w is None else w for w in weights], columns=data.columns,
+                        index=list(data.index[window:]), dtype=float).round(3)
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from typing import *
+
+
+def sliding(values: np.ndarray, window: int) -> np.ndarray:
+    """ Zero-copy (len - window + 1, window, columns) view of the rolling windows over the rows of a 2D array. """
+    return np.lib.stride_tricks.sliding_window_view(values, window, axis=0).transpose(0, 2, 1)
+
+
+class RollingMoments:
+    """ Rolling mean and sample covariance over the rows of a 2D array, updated in O(columns^2) per step.
+
+        The window sum of outer products is updated by adding the new row and dropping the old one (a sliding
+        Welford update) and is recomputed exactly every `refresh` steps to bound floating point drift. Windows
+        containing a NaN row have NaN moments.
+
+        Usage:
+        >>> for j, mu, sigma in RollingMoments(returns.values, 20):
+        ...     weights[j] = solve(mu, sigma)
+    """
+
+    def __init__(self, values: np.ndarray, window: int, refresh: Optional[int] = None):
+        self.values = np.asarray(values, dtype=float)
+        self.window = window
+        self.refresh = refresh or window
+        self.windows = sliding(self.values, window)
+
+    def __len__(self) -> int:
+        return max(len(self.values) - self.window + 1, 0)
+
+    def _exact(self, j: int) -> Tuple[np.ndarray, np.ndarray]:
+        x = self.windows[j]
+        mean = x.mean(axis=0)
+        centered = x - mean
+        return mean, centered.T @ centered
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """ Yield (window index, mean, covariance) where window j covers rows j to j + window - 1. """
+        w, n = self.window, self.values.shape[1]
+        missing = np.isnan(self.values).any(axis=1)
+        # Number of NaN rows in each window.
+        bad = np.convolve(missing, np.ones(w, dtype=int), mode='valid') if len(self) else np.array([], dtype=int)
+        nan_mean, nan_cov = np.full(n, np.nan), np.full((n, n), np.nan)
+        mean, m2, steps = None, None, 0
+        for j in range(len(self)):
+            if bad[j]:
+                mean = None
+                yield j, nan_mean.copy(), nan_cov.copy()
+                continue
+            if mean is None or steps >= self.refresh:
+                mean, m2 = self._exact(j)
+                steps = 0
+            else:
+                new, old = self.values[j + w - 1], self.values[j - 1]
+                updated = mean + (new - old) / w
+                m2 = m2 + np.outer(new - mean, new - updated) - np.outer(old - mean, old - updated)
+                mean = updated
+                steps += 1
+            yield j, mean.copy(), (m2 + m2.T) / (2 * (w - 1))
+
+
+def window_sums(values: np.ndarray, window: Optional[int]) -> np.ndarray:
+    """ Rolling (or expanding if window is None) sums along the first axis from one cumulative sum. """
+    cum = np.cumsum(values, axis=0)
+    if window is not None:
+        cum[window:] = cum[window:] - cum[:-window].copy()
+    return cum
+
+
+def window_moments(left: np.ndarray, right: np.ndarray, window: Optional[int]) -> Tuple[np.ndarray, ...]:
+    """ Count, means, co-moment and moments (sums of centered products) of every column pair of left and right over
+        rolling (or expanding) windows, from running sums of x, y, xy, xx and yy. A row enters a pair's windows only
+        if both values are present. Each pair is centered on its overall mean first so that the running sums keep
+        their precision on price levels.
+
+        :return: n, mean_x, mean_y, cov, var_x, var_y, each shaped like left
+    """
+    valid = ~(np.isnan(left) | np.isnan(right))
+    count = np.maximum(valid.sum(axis=0), 1)
+    mx, my = np.where(valid, left, 0).sum(axis=0) / count, np.where(valid, right, 0).sum(axis=0) / count
+    x, y = np.where(valid, left - mx, 0), np.where(valid, right - my, 0)
+    sums = window_sums(np.stack([valid, x, y, x * y, x * x, y * y], axis=1).astype(float), window)
+    n, sx, sy, sxy, sxx, syy = sums.transpose(1, 0, 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return n, mx + sx / n, my + sy / n, sxy - sx * sy / n, sxx - sx * sx / n, syy - sy * sy / n
+
+
+def rolling_corr(data: pd.DataFrame,
+                 pairs: Iterable[Tuple[Any, Any]],
+                 window: int,
+                 min_periods: Optional[int] = None) -> pd.DataFrame:
+    """ Rolling Pearson correlation of only the requested column pairs, from running sums of x, y, xy, xx and yy.
+        Like DataFrame.rolling(window).corr(), a row enters a pair's window only if both values are present and the
+        correlation needs min_periods (default window) such rows.
+
+        Usage:
+        >>> rolling_corr(returns, [('UBT', 'TMF')], 252)[('UBT', 'TMF')]
+    """
+    pairs = [tuple(pair) for pair in pairs]
+    min_periods = window if min_periods is None else min_periods
+    left = data[[a for a, _ in pairs]].values.astype(float)
+    right = data[[b for _, b in pairs]].values.astype(float)
+    n, _, _, cov, var_x, var_y = window_moments(left, right, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < max(min_periods, 1)) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return pd.DataFrame(np.clip(corr, -1, 1), index=data.index, columns=pd.MultiIndex.from_tuples(pairs))
@@ -1,7 +1,10 @@
 import cvxpy as cp
 import matplotlib.pyplot as plt
-from src.analytics.performance import Statistics
+from src.analytics.performance import GroupStats, Statistics
+from src.analytics.rolling import RollingMoments, sliding
+from src.analytics.sweep import sweep
 from src.analytics.ts import TimeSeries
+from src.signals.optimizer import factor, mean_variance, min_variance_template
 from src.utils.fe import *
 
 __author__ = 'kqureshi'
@@ -130,18 +133,21 @@ class Combination:
         """
         Minimum variance signal combination, single-period
         """
-
-        mu = np.mean((np.array(signals)), 0).reshape(signals.shape[1], 1)
+        mu = np.mean((np.array(signals)), 0)
         sigma = np.array(signals.cov())
-        w = cp.Variable(signals.shape[1])
-        gamma = cp.Parameter(nonneg=(aversion >= 0))
-        gamma.value = aversion
-        prob = cp.Problem(cp.Maximize(mu.T * w - (gamma * cp.quad_form(w, sigma.T.dot(sigma)))),
-                          [cp.sum(w) == 1, w >= min_weight, w <= max_weight]) if style == 'sharpe' else cp.Problem(
-            (cp.Minimize(cp.quad_form(w, sigma))),
-            [cp.sum(w) == 1, mu.T * w >= min_ret, w >= min_weight, w <= max_weight])
-        prob.solve()
-        return pd.Series(w.value, index=signals.columns)
+        return pd.Series(cls._spo(mu, sigma, style, aversion, min_ret, min_weight, max_weight), index=signals.columns)
+
+    @staticmethod
+    def _spo(mu: np.ndarray, sigma: np.ndarray, style: str = 'sharpe', aversion: float = 1,
+             min_ret: Optional[float] = 0.05, min_weight: Optional[float] = 0,
+             max_weight: Optional[float] = 1) -> np.ndarray:
+        """
+        spo on the mean vector and covariance matrix of the signals
+        """
+        if style == 'sharpe':
+            return mean_variance(mu, sigma.T.dot(sigma), aversion, min_weight, max_weight)
+        template = min_variance_template(len(mu), min_ret=True)
+        return template.solve(F=factor(sigma), mu=mu, r=min_ret, lb=min_weight, ub=max_weight)
 
     @classmethod
     def info_rate(cls, signals: pd.DataFrame) -> pd.Series:
@@ -153,14 +159,26 @@ class Combination:
             track['w{}'.format(j)] = track['t{}'.format(j)] / track.filter(regex='t').abs().sum(axis=1)
         return (track.w0 * signals[signals.columns[0]] + track.w1 * signals[signals.columns[1]]).dropna()
 
+    @staticmethod
+    def _win_grid(signal_1: np.ndarray, signal_2: np.ndarray, partitions: int = 20) -> np.ndarray:
+        """
+        Weight of signal_1 maximizing the win rate of the blend, for a batch of windows at once.
+        :param signal_1: (..., window) values
+        :param signal_2: (..., window) values
+        :return: (...) optimal weights, the smallest one on ties and NaN if no weight has a win rate
+        """
+        weights = np.array([(1 / partitions) * j for j in list(range(1, partitions + 1))])
+        shape = (-1,) + (1,) * signal_1.ndim
+        blend = weights.reshape(shape) * signal_1 + (1 - weights).reshape(shape) * signal_2
+        pos, neg = (blend > 0).sum(axis=-1), (blend < 0).sum(axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.where((pos > 0) & (neg > 0), pos / (pos + neg), -np.inf)
+        best = rate.argmax(axis=0)
+        return np.where(np.isfinite(rate.max(axis=0)), weights[best], np.nan)
+
     @classmethod
     def _win_weights(cls, signal_1: pd.Series, signal_2: pd.Series, partitions: int = 20) -> List[float]:
-        vec = {}
-        weights = [(1 / partitions) * j for j in list(range(1, partitions + 1))]
-        for weight in weights:
-            weight_1, weight_2 = weight, 1 - weight
-            vec[weight] = Statistics().win_rate((weight_1 * signal_1) + (weight_2 * signal_2))
-        opt_weight = pd.Series(vec).idxmax()
+        opt_weight = float(cls._win_grid(signal_1.values, signal_2.values, partitions))
         return [opt_weight, 1 - opt_weight]
 
     @classmethod
@@ -175,8 +193,9 @@ class Combination:
 
     @classmethod
     def win_weights(cls, signals: pd.DataFrame, window: int = 20) -> pd.Series:
-        opt_weight = pd.DataFrame([Combination._win_weights(data[data.columns[0]], data[data.columns[1]]) for data in
-                                   Combination._window(signals, window)], index=signals.index[window - 1:])
+        windows = sliding(signals.values[:, :2].astype(float), window)
+        weight = cls._win_grid(windows[:, :, 0], windows[:, :, 1])
+        opt_weight = pd.DataFrame(np.stack([weight, 1 - weight], axis=1), index=signals.index[window - 1:])
         opt_weight.columns = signals.columns
         return opt_weight.mul(signals, axis=1).sum(axis=1)
 
@@ -194,11 +213,15 @@ class Combination:
     @classmethod
     def mvo(cls, signals: pd.DataFrame, window: int = 20, min_weight: float = 0.2) -> pd.Series:
         """
-
+        Rolling spo on the previous window of signals. Moments are updated incrementally over strided windows;
+        windows with missing values get no weights.
         """
-        weights = pd.concat([Combination.spo(signals=data, min_weight=min_weight, aversion=1000)
-                             for data in Combination._window(signals.shift(), window)], axis=1,
-                            keys=signals.shift().index[window - 1:]).T
+        shifted = signals.shift()
+        weights = np.full((max(len(signals) - window + 1, 0), signals.shape[1]), np.nan)
+        for j, mu, sigma in RollingMoments(shifted.values, window):
+            if np.isfinite(mu).all():
+                weights[j] = cls._spo(mu, sigma, min_weight=min_weight, aversion=1000)
+        weights = pd.DataFrame(weights, index=shifted.index[window - 1:], columns=signals.columns)
         return signals.mul(weights).sum(axis=1)
 
     @classmethod
@@ -225,11 +248,17 @@ class Combination:
         ...
 
 
+def _smoothed_returns(data: Tuple[pd.DataFrame, pd.DataFrame], halflife: int) -> pd.Series:
+    holdings, returns = data
+    return TimeSeries.ewma(holdings.fillna(0), halflife=halflife).mul(returns).sum(axis=1)
+
+
 class Smoothing:
 
     @staticmethod
     def by_halflife(holdings: pd.DataFrame, returns: pd.DataFrame, criteria: List[str] = ['Sharpe'],
-                    lb: Optional[float] = 5, ub: Optional[float] = 120, freq: str = 'yearly') -> pd.DataFrame:
+                    lb: Optional[float] = 5, ub: Optional[float] = 120, freq: str = 'yearly',
+                    processes: Optional[int] = None, name: Optional[str] = None) -> pd.DataFrame:
         """
         Performance by halflife
         :param holdings:
@@ -237,16 +266,15 @@ class Smoothing:
         :param criteria:
         :param lb:
         :param ub:
+        :param processes: number of worker processes for the halflife sweep
+        :param name: cache the smoothed returns of each halflife on disk under this name
         :return:
         """
-        perf = {}
         halflifes = [2 ** j for j in range(int(np.log(lb)), int(np.log(ub)) + 1)]
-        for halflife in halflifes:
-            hds = pd.concat([TimeSeries.ewma(holdings[col].fillna(0), halflife=halflife) for col in holdings.columns],
-                            axis=1)
-            result = hds.mul(returns).sum(axis=1)
-            if freq == 'yearly':
-                perf[halflife] = Statistics().yearly_stats(result.replace(0, np.nan).dropna())[criteria]
-            else:
-                perf[halflife] = Statistics().basic_stats(result.replace(0, np.nan).dropna())[criteria]
+        results = sweep(_smoothed_returns, {'halflife': halflifes}, (holdings, returns), name=name, processes=processes)
+        if freq == 'yearly':
+            data = pd.concat([result.replace(0, np.nan) for _, result in results], axis=1, keys=halflifes)
+            return GroupStats(data, data.index.year, dropna=True).table(criteria).dropna(how='all')
+        perf = {point['halflife']: Statistics().basic_stats(result.replace(0, np.nan).dropna())[criteria]
+                for point, result in results}
         return pd.concat([pd.DataFrame(perf[key]) for key in perf.keys()], axis=1, keys=halflifes)
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import itertools
+import numpy as np
+import pandas as pd
+
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from typing import *
+
+from src.analytics.performance import Statistics
+from src.config import DATA_DIR
+from src.utils.logger import logger
+
+SWEEP_CACHE_DIR = Path(DATA_DIR) / 'sweeps'
+
+# Read-only data shared by the sweep workers, set once per process by _init.
+_SHARED: Dict[str, Any] = dict()
+
+
+def grid_points(grid: Dict[str, Iterable[Any]]) -> List[Dict[str, Any]]:
+    """ Cartesian product of a parameter grid, e.g. {'a': [1, 2], 'b': [3]} -> [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]. """
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[list(grid[key]) for key in keys])]
+
+
+def fingerprint(data: Any) -> str:
+    """ Content hash of the shared data so that cached points are invalidated when the data changes. """
+    sha = hashlib.sha1()
+    for item in data if isinstance(data, (list, tuple)) else [data]:
+        if isinstance(item, (pd.Series, pd.DataFrame)):
+            sha.update(pd.util.hash_pandas_object(item).values.tobytes())
+            sha.update(repr(list(getattr(item, 'columns', [item.name]))).encode())
+        else:
+            sha.update(repr(item).encode())
+    return sha.hexdigest()
+
+
+def _key(func: Callable, point: Dict[str, Any], data_key: str) -> str:
+    name = getattr(func, 'func', func)
+    params = sorted(getattr(func, 'keywords', {}).items())
+    text = repr((getattr(name, '__qualname__', repr(name)), params, sorted(point.items()), data_key))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _cached(func: Callable, points: List[Dict[str, Any]], data: Any, name: Optional[str],
+            cache_dir: Union[str, Path]) -> Tuple[List[str], Dict[str, Any], Optional[Path]]:
+    """ Cache key of every point, the results already pickled under cache_dir/name and that directory. """
+    path = Path(cache_dir) / name if name else None
+    data_key = fingerprint(data) if path else ''
+    keys = [_key(func, point, data_key) for point in points]
+    results = dict()
+    if path:
+        path.mkdir(parents=True, exist_ok=True)
+        results = {key: pd.read_pickle(path / f'{key}.pkl') for key in keys if (path / f'{key}.pkl').exists()}
+    label = name or getattr(getattr(func, 'func', func), '__name__', 'sweep')
+    logger.info(f'Sweep {label}: {len(results)} cached, {len(points) - len(results)} to evaluate.')
+    return keys, results, path
+
+
+def _init(shared: Dict[str, Any]) -> None:
+    _SHARED.update(shared)
+
+
+def _call(func: Callable, point: Dict[str, Any]) -> Any:
+    return func(_SHARED['data'], **point)
+
+
+def sweep(func: Callable,
+          grid: Dict[str, Iterable[Any]],
+          data: Any = None,
+          name: Optional[str] = None,
+          processes: Optional[int] = None,
+          cache_dir: Union[str, Path] = SWEEP_CACHE_DIR) -> List[Tuple[Dict[str, Any], Any]]:
+    """ Evaluate func(data, **point) for every point of the grid in a process pool.
+        data is handed to each worker once. If a name is given, finished points are pickled under cache_dir/name as
+        they complete, keyed by the point, func and a fingerprint of data, so a repeated or interrupted sweep only
+        evaluates the missing points.
+
+    :param func: module level function (or partial of one) taking the shared data and the point parameters
+    :param grid: parameter name -> values
+    :param data: read-only data shared by every point
+    :param name: cache name, no disk cache if None
+    :param processes: number of worker processes (default cpu count), 1 evaluates in this process
+    :return: list of (point, result) in grid order
+    """
+    points = grid_points(grid)
+    keys, results, path = _cached(func, points, data, name, cache_dir)
+    missing = [(key, point) for key, point in zip(keys, points) if key not in results]
+
+    def collect(items: Iterable[Any]) -> None:
+        for (key, point), result in zip(missing, items):
+            results[key] = result
+            if path:
+                pd.to_pickle(result, path / f'{key}.pkl')
+
+    if missing and processes == 1:
+        _init(dict(data=data))
+        collect(_call(func, point) for _, point in missing)
+    elif missing:
+        with Pool(processes, initializer=_init, initargs=(dict(data=data),)) as pool:
+            collect(pool.imap(partial(_call, func), [point for _, point in missing]))
+    return [(point, results[key]) for key, point in zip(keys, points)]
+
+
+def turnover(weights: pd.DataFrame) -> float:
+    """ Annualized turnover, the average daily sum of absolute weight changes times the number of trading days. """
+    return float(weights.fillna(0).diff().abs().sum(axis=1).iloc[1:].mean() * Statistics.ANNUAL)
+
+
+def cagr(returns: pd.Series) -> float:
+    return float((1 + returns).prod() ** (Statistics.ANNUAL / len(returns)) - 1) if len(returns) else np.nan
+
+
+def summarize(results: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> pd.DataFrame:
+    """ Tidy frame with one row per point: the parameters followed by Sharpe, CAGR and Turnover. """
+    rows = [dict(**point,
+                 Sharpe=Statistics.sharpe(result['returns']),
+                 CAGR=cagr(result['returns']),
+                 Turnover=turnover(result['weights']))
+            for point, result in results]
+    return pd.DataFrame(rows)
+
+
+async def evaluate_signal(prices: pd.DataFrame, signal_cls: Type, notional: float, params: Dict[str, Any],
+                          **point: Any) -> Dict[str, Any]:
+    """ Update one signal on already fetched prices and keep its returns and weights. """
+    signal = signal_cls(**params, **point)
+    signal.prices = prices
+    await signal.update(notional)
+    return dict(returns=signal.returns, weights=signal.weights)
+
+
+def run_signal(prices: pd.DataFrame, signal_cls: Type, notional: float, params: Dict[str, Any],
+               **point: Any) -> Dict[str, Any]:
+    """ evaluate_signal in a pool worker, which has no event loop of its own. """
+    return asyncio.run(evaluate_signal(prices, signal_cls, notional, params, **point))
+
+
+class SignalSweep:
+    """ Sweep the constructor parameters of a daily signal, fetching its prices once.
+
+        Usage:
+        >>> sweep = SignalSweep(Patience, {'threshold': [-0.1, -0.2]}, ticker='QQQ')
+        >>> await sweep.run()
+    """
+
+    def __init__(self,
+                 signal_cls: Type,
+                 grid: Dict[str, Iterable[Any]],
+                 notional: float = 10000,
+                 name: Optional[str] = None,
+                 processes: Optional[int] = None,
+                 **params: Any):
+        self.signal_cls = signal_cls
+        self.grid = grid
+        self.notional = notional
+        self.name = name
+        self.processes = processes
+        self.params = params
+        self.results: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+
+    async def run(self, prices: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """ Evaluate every point and return the summary. Prices are fetched once unless given. """
+        if prices is None:
+            signal = self.signal_cls(**self.params, **grid_points(self.grid)[0])
+            await signal.fetch()
+            prices = signal.prices
+        func = partial(run_signal, signal_cls=self.signal_cls, notional=self.notional, params=self.params)
+        if self.processes != 1:
+            self.results = sweep(func, self.grid, prices, name=self.name, processes=self.processes)
+            return self.summary()
+        # The event loop of this coroutine is already running, so each point is awaited here instead.
+        points = grid_points(self.grid)
+        keys, results, path = _cached(func, points, prices, self.name, SWEEP_CACHE_DIR)
+        for key, point in zip(keys, points):
+            if key not in results:
+                results[key] = await evaluate_signal(prices, self.signal_cls, self.notional, self.params, **point)
+                if path:
+                    pd.to_pickle(results[key], path / f'{key}.pkl')
+        self.results = [(point, results[key]) for key, point in zip(keys, points)]
+        return self.summary()
+
+    def summary(self) -> pd.DataFrame:
+        return summarize(self.results)
+
+    def returns(self) -> pd.DataFrame:
+        """ Returns of every point, one column per point labelled by its parameter values. """
+        return pd.concat([result['returns'].rename(', '.join(map(str, point.values())))
+                          for point, result in self.results], axis=1)
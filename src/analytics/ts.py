@@ -1,24 +1,150 @@
 import pandas_market_calendars as mcal
+
+from scipy.signal import lfilter
 from src.utils.fe import *
 
 ArrayLike: Union[np.array, pd.Series, List]
+Frame = Union[np.ndarray, pd.Series, pd.DataFrame]
 
 __author__ = 'kqureshi'
 
+# Below this log scale the adjust=False gap weights would underflow, such series use the step by step recursion.
+MIN_LOG_SCALE = -600.0
+
+
+def _log_scales(valid: np.ndarray, decay: float) -> np.ndarray:
+    """
+    Log of the scale adjust=False observations enter with. pandas renormalizes after every observation, so after a
+    gap of g NaNs the older average counts decay^(g + 1) against 1 - decay for the new one. Scaling each new weight by
+    the running product of the factors decay^(g + 1) + 1 - decay seen before it (all 1 without gaps) gives the same
+    averages with a constant coefficient filter.
+    """
+    steps = np.arange(valid.shape[1])
+    last = np.maximum.accumulate(np.where(valid, steps, -1), axis=1)
+    previous = np.concatenate([np.full((len(valid), 1), -1), last[:, :-1]], axis=1)
+    factors = np.log(np.where(valid & (previous >= 0), decay ** (steps - previous) + 1 - decay, 1.0))
+    return np.cumsum(factors, axis=1) - factors
+
+
+def _weights(valid: np.ndarray, decay: float, adjust: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weight each observation enters the exponentially weighted sums with: 1 (adjust) or 1 - decay scaled for the gaps
+    before it, the first one of each series always 1. NaNs enter with weight 0 while the older weights keep decaying.
+    Also returns the series whose scales underflow.
+    """
+    weights = valid * (1.0 if adjust else 1 - decay)
+    underflows = np.zeros(len(valid), dtype=bool)
+    if not adjust:
+        scales = _log_scales(valid, decay)
+        underflows = scales.min(axis=1, initial=0) < MIN_LOG_SCALE
+        weights = weights * np.exp(np.maximum(scales, MIN_LOG_SCALE))
+    rows = np.flatnonzero(valid.any(axis=1))
+    weights[rows, valid[rows].argmax(axis=1)] = 1.0
+    return weights, underflows
+
+
+def _decayed(arrays: List[np.ndarray], decay: float) -> List[np.ndarray]:
+    """
+    Exponentially decayed sums s_t = decay * s_t-1 + x_t along the last axis, one series per row. The first order
+    recursion never forms powers of the decay.
+    """
+    return list(lfilter([1.0], [1.0, -decay], np.stack(arrays), axis=-1))
+
+
+def _renormalized(values: np.ndarray, decay: float, bias: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean and variance of pandas' adjust=False recursion, one step per date over all series at once. Only used for
+    series with so many gaps that the scaled weights of _weights underflow.
+    """
+    n, periods = values.shape
+    new = 1 - decay
+    mean, cov = np.full(n, np.nan), np.zeros(n)
+    total, squares, old = np.ones(n), np.ones(n), np.ones(n)
+    means, variances = np.full((n, periods), np.nan), np.full((n, periods), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for t in range(periods):
+            x = values[:, t]
+            observed, started = ~np.isnan(x), ~np.isnan(mean)
+            total, squares, old = [np.where(started, a * f, a) for a, f in
+                                   [(total, decay), (squares, decay * decay), (old, decay)]]
+            step = started & observed
+            updated = np.where(step, (old * mean + new * x) / (old + new), mean)
+            cov = np.where(step, (old * (cov + (mean - updated) ** 2) + new * (x - updated) ** 2) / (old + new), cov)
+            total = np.where(step, (total + new) / (old + new), total)
+            squares = np.where(step, (squares + new * new) / (old + new) ** 2, squares)
+            old = np.where(step, 1.0, old)
+            mean = np.where(~started & observed, x, updated)
+            means[:, t] = mean
+            if bias:
+                variances[:, t] = np.where(np.isnan(mean), np.nan, cov)
+            else:
+                denominator = total * total - squares
+                variances[:, t] = np.where(denominator > 0, total * total / denominator * cov, np.nan)
+    return means, variances
+
+
+def _series(data: Frame) -> np.ndarray:
+    """ The columns of data as contiguous rows, the layout the kernels below work in. """
+    values = np.asarray(data, dtype=float)
+    return np.ascontiguousarray(values.reshape(len(values), -1).T)
+
+
+def _like(values: np.ndarray, data: Frame) -> Frame:
+    values = values.T
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(values, index=data.index, columns=data.columns)
+    if isinstance(data, pd.Series):
+        return pd.Series(values[:, 0], index=data.index, name=data.name)
+    return values if np.ndim(data) == 2 else values[:, 0]
+
+
 class TimeSeries:
     @staticmethod
-    def ewma(data: np.array, halflife: float) -> np.array:
+    def ewma(data: Frame, halflife: float, adjust: bool = False) -> Frame:
         """
-        Simple ewma
+        Exponentially weighted moving average of every column at once, returned in the shape and type of data.
+        Equal to data.ewm(halflife=halflife, adjust=adjust).mean(): each column starts at its first observation and
+        NaNs carry the last average forward, renormalized after gaps like pandas does with adjust=False.
         """
+        values = _series(data)
+        decay = np.exp(np.log(0.5) / halflife)
+        valid = ~np.isnan(values)
+        weights, underflows = _weights(valid, decay, adjust)
+        total, weights = _decayed([np.where(valid, values, 0) * weights, weights], decay)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(weights > 0, total / weights, np.nan)
+        if underflows.any():
+            mean[underflows] = _renormalized(values[underflows], decay)[0]
+        return _like(mean, data)
 
-        alpha = 1 - np.exp(np.log(0.5) / halflife)
-        alpha_reverse = 1 - alpha
-        n = data.shape[0]
-        powers = alpha_reverse ** (np.arange(n + 1))
-        scale_arr = 1 / powers[:-1]
-        return (data[0] * powers[1:]) + ((data * (alpha * alpha_reverse ** (n - 1)) *
-                                          scale_arr).cumsum() * scale_arr[::-1])
+    @staticmethod
+    def ewvar(data: Frame, halflife: float, adjust: bool = False, bias: bool = False) -> Frame:
+        """
+        Exponentially weighted variance of every column at once, equal to data.ewm(halflife, adjust=adjust).var(bias)
+        with the same NaN handling as ewma. The sum of squared deviations follows the weighted Welford update
+        M_t = decay * M_t-1 + W' * w / W * (x_t - mean_t-1)^2, with W' the decayed weight of the older observations and
+        W = W' + w, so it is built from local deviations and never from differences of large sums.
+        """
+        values = _series(data)
+        decay = np.exp(np.log(0.5) / halflife)
+        valid = ~np.isnan(values)
+        weights, underflows = _weights(valid, decay, adjust)
+        values = np.where(valid, values, 0)
+        total, sums = _decayed([values * weights, weights], decay)
+        squares, = _decayed([weights * weights], decay * decay)
+        prior, delta = np.zeros_like(values), np.zeros_like(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prior[:, 1:] = decay * sums[:, :-1]
+            delta[:, 1:] = values[:, 1:] - total[:, :-1] / sums[:, :-1]
+            deviations, = _decayed([np.where(prior > 0, prior * weights / sums * delta * delta, 0)], decay)
+            var = deviations / sums
+            if not bias:
+                denominator = sums * sums - squares
+                var = np.where(denominator > 0, var * sums * sums / denominator, np.nan)
+        var = np.where(sums > 0, var, np.nan)
+        if underflows.any():
+            var[underflows] = _renormalized(np.where(valid, values, np.nan)[underflows], decay, bias)[1]
+        return _like(var, data)
 
     @staticmethod
     def sparse_padding(ts: pd.Series, pad: bool = True, exchange: str = 'NYSE') -> pd.Series:
@@ -14,6 +14,12 @@ EQUITY_TICKER_PATH = 'data/equity.csv.gz'
 DATA_DIR = str(os.getenv('DATA_DIR', Path.home() / 'data'))
 OPTION_DATA_DIR = os.getenv('OPTION_DATA_DIR', '~/data')
 
+# Opt-in compact price panels (float32 values and categorical column index)
+COMPACT_PRICES = os.getenv('COMPACT_PRICES', 'false').lower() in ('1', 'true')
+
+# Opt-in on-disk NYSE session table (DATA_DIR/calendar)
+PERSIST_SESSIONS = os.getenv('PERSIST_SESSIONS', 'false').lower() in ('1', 'true')
+
 # Email
 EMAIL_USER = os.getenv('EMAIL_USER', '')
 EMAIL_PW = os.getenv('EMAIL_PW', '')
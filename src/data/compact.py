@@ -0,0 +1,91 @@
+import gc
+import numpy as np
+import pandas as pd
+import time
+
+from typing import *
+
+from src.utils.logger import logger
+
+# Maximum relative pnl drift tolerated between float32 and float64 runs.
+DRIFT_TOLERANCE = 1e-4
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """ Downcast float64 prices to float32 and turn the column index into a categorical index.
+
+        Usage:
+        >>> df = compact(await Yahoo().daily(['AAPL', 'FB']))
+    """
+    if df is None:
+        return df
+    df = df.astype({col: np.float32 for col, dtype in df.dtypes.items() if dtype == np.float64})
+    if not isinstance(df.columns, (pd.MultiIndex, pd.CategoricalIndex)):
+        df.columns = pd.CategoricalIndex(df.columns)
+    return df
+
+
+def expand(df: pd.DataFrame) -> pd.DataFrame:
+    """ Inverse of compact: float64 values with a plain column index. """
+    if df is None:
+        return df
+    df = df.astype({col: np.float64 for col, dtype in df.dtypes.items() if dtype == np.float32})
+    if isinstance(df.columns, pd.CategoricalIndex):
+        df.columns = pd.Index(df.columns.astype(object))
+    return df
+
+
+def memory(df: pd.DataFrame) -> int:
+    """ Total memory usage in bytes including the index and the column index. """
+    return int(df.memory_usage(deep=True, index=True).sum() + df.columns.memory_usage(deep=True))
+
+
+def drift(result: Union[pd.Series, pd.DataFrame], expected: Union[pd.Series, pd.DataFrame]) -> float:
+    """ Maximum absolute difference relative to the largest absolute expected value. """
+    result, expected = expand(pd.DataFrame(result)), expand(pd.DataFrame(expected))
+    result, expected = result.align(expected, join='outer')
+    diff = np.abs(result.values - expected.values)
+    diff[np.isnan(result.values) & np.isnan(expected.values)] = 0
+    if np.isnan(diff).any():
+        return np.inf
+    scale = np.abs(np.nan_to_num(expected.values)).max(initial=0)
+    value = diff.max(initial=0)
+    return float(value / scale) if scale else float(value)
+
+
+def validate(result: Union[pd.Series, pd.DataFrame],
+             expected: Union[pd.Series, pd.DataFrame],
+             tolerance: float = DRIFT_TOLERANCE) -> float:
+    """ Raise if the compact result drifts from the float64 result by more than tolerance. """
+    value = drift(result, expected)
+    if value > tolerance:
+        raise ValueError(f'Compact mode drift {value:.2e} exceeds tolerance {tolerance:.2e}')
+    return value
+
+
+async def benchmark(signals: List[Any], notional: float = 10000) -> pd.DataFrame:
+    """ Run each signal's update with float64 and with compact prices and report memory, runtime and pnl drift.
+
+        Usage:
+        >>> from src.execution.signals import Cubby, Bias
+        >>> await benchmark([Cubby(), Bias()])
+    """
+    rows = []
+    for signal in signals:
+        await signal.fetch()
+        prices = expand(signal.prices)
+        row = dict(signal=signal.name)
+        pnl = dict()
+        for mode, data in [('float64', prices), ('float32', compact(prices))]:
+            signal.prices = data
+            gc.collect()
+            start = time.perf_counter()
+            await signal.update(notional)
+            row[f'{mode}_seconds'] = round(time.perf_counter() - start, 4)
+            row[f'{mode}_mb'] = round(memory(data) / 2 ** 20, 3)
+            pnl[mode] = signal.pnl
+        row['drift'] = drift(pnl['float32'], pnl['float64'])
+        logger.info(f'Compact benchmark {row}')
+        rows.append(row)
+        signal.prices = prices
+    return pd.DataFrame(rows).set_index('signal')
@@ -10,6 +10,9 @@ import pyarrow.parquet as pq
 from multiprocessing import Pool, cpu_count
 from pandas_datareader.famafrench import get_available_datasets
 from typing import Dict, List, Optional, Tuple, Union
+from pathlib import Path
+from src.config import COMPACT_PRICES, DATA_DIR
+from src.data.compact import compact as to_compact
 from src.utils.tools.files import Git, Parquet
 from src.utils.fe import *
 
@@ -19,6 +22,8 @@ LOGGER.setLevel(logging.INFO)
 
 __author__ = 'kqureshi'
 
+FAMA_FRENCH_CACHE = Path(DATA_DIR) / 'factors' / 'fama_french_daily.parquet'
+
 
 class Stock:
 
@@ -54,18 +59,53 @@ class Stock:
 class Factor:
 
     @staticmethod
-    def fama_french_factors() -> pd.DataFrame:
+    def fama_french_factors(refresh: bool = False, cache: Union[str, Path] = FAMA_FRENCH_CACHE) -> pd.DataFrame:
         """
         Fetch 4 FF Factors
+        The parsed table is cached on disk and checked for new rows at most once a day. Only rows after the last
+        cached date are merged in. If the download fails the cached table is returned as is.
+        :param refresh: check for new rows even if the cache was already checked today
+        :param cache: path of the parquet cache
         :return:
         """
-        research_factors = web.DataReader('F-F_Research_Data_Factors_daily', 'famafrench', start=START)[0]
-        momentum_factor = web.DataReader('F-F_Momentum_Factor_daily', 'famafrench', start=START)[0]
+        cache = Path(cache)
+        cached = Factor._read_cache(cache)
+        if cached is not None and not refresh and \
+                datetime.date.fromtimestamp(cache.stat().st_mtime) == datetime.date.today():
+            return cached
+        start = START if cached is None else cached.index[-1]
+        try:
+            df = Factor._download(start)
+        except Exception as e:
+            if cached is None:
+                raise
+            LOGGER.warning('Fama French download failed, serving cached factors: {}'.format(e))
+            return cached
+        if cached is not None:
+            df = pd.concat([cached, df[df.index > cached.index[-1]]])
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        out = df.copy()
+        out.index = pd.to_datetime(out.index)
+        out.to_parquet(cache)
+        return df
+
+    @staticmethod
+    def _download(start: Union[str, datetime.date]) -> pd.DataFrame:
+        research_factors = web.DataReader('F-F_Research_Data_Factors_daily', 'famafrench', start=start)[0]
+        momentum_factor = web.DataReader('F-F_Momentum_Factor_daily', 'famafrench', start=start)[0]
         df = (research_factors.join(momentum_factor).dropna()) / 100
         df.index = df.index.tz_localize('utc').date
         df.columns = df.columns.str.strip()
         return df
 
+    @staticmethod
+    def _read_cache(cache: Path) -> Optional[pd.DataFrame]:
+        if not cache.exists():
+            return None
+        df = pd.read_parquet(cache)
+        df.index = pd.to_datetime(df.index).date
+        return df
+
     def list_ff_datasets(self) -> List[str]:
         return get_available_datasets()
 
@@ -112,16 +152,21 @@ class Data:
             pass
 
     def build_binance(self, syms: Union[None, List[str]] = None, cache: bool = True,
-                      field: str = 'close') -> pd.DataFrame:
+                      field: str = 'close', compact: bool = COMPACT_PRICES) -> pd.DataFrame:
         """
         Rebuild wide dataframes per field for cross-sectional signal generation
+        Set compact = True to store float32 values
         """
         syms = [ele.split('/')[-1].split('.')[0].replace('_data', '') for ele in
                 glob.glob(self.src.replace('{}', '*'))] if not syms else syms
         data = list(zip(syms, [field] * len(syms)))
         data = pd.concat(Pool(cpu_count()).imap(self._read, data), axis=1, keys=syms).fillna(np.nan)
+        if compact:
+            data = to_compact(data)
         if cache:
-            pq.write_table(pa.Table.from_pandas(data, preserve_index=True), self.src.format(field), compression='gzip')
+            # Parquet cannot restore a categorical column index, load compacts the columns again.
+            table = data.set_axis(pd.Index(data.columns.astype(object)), axis=1)
+            pq.write_table(pa.Table.from_pandas(table, preserve_index=True), self.src.format(field), compression='gzip')
         else:
             return data
 
@@ -154,17 +199,19 @@ class Data:
         [self.build(field=field) for field in [self.close, self.volume, self.trades, self.high, self.low, self.open]]
 
     def load(self, syms: Union[None, List[str]] = None, field: str = 'close', start: Union[None, Timestamp] = None,
-             end: Union[None, Timestamp] = None) -> pd.DataFrame:
+             end: Union[None, Timestamp] = None, compact: bool = COMPACT_PRICES) -> pd.DataFrame:
 
         """
         End-user method to access feature
         Example: Data().load(syms=['BTCTUSD', 'DASHBUSD'], field = 'close')
+        Set compact = True for float32 values with a categorical column index
         """
-        data = pq.read_table(self.src.format(field)).to_pandas()
+        data = pq.read_pandas(self.src.format(field), columns=syms).to_pandas()
         syms = list(data.columns) if not syms else syms
         start = data.index[0] if not start else start
         end = data.index[-1] if not end else end
-        return data[syms].loc[start:end]
+        data = data[syms].loc[start:end]
+        return to_compact(data) if compact else data
 
 
 def _read(path: str, cols: List[str] = [CLOSE]) -> pd.DataFrame:
@@ -1,7 +1,10 @@
+import aiohttp
+import asyncio
 import chromedriver_autoinstaller
 import humanize
 import pandas as pd
 
+from html.parser import HTMLParser
 from selenium import webdriver
 from selenium.common.exceptions import NoSuchElementException
 from src.constant import *
@@ -10,8 +13,76 @@ from src.utils.email import Email
 from src.utils.logger import logger
 
 URL = 'https://www.nyse.com/ipo-center/filings'
-XPATH = '/html/body/div[1]/div[4]/div[1]/div/div/div[7]/div/table[1]/tbody/tr[{}]/td[{}]'
+URLS = [URL]
+TABLE_XPATH = '/html/body/div[1]/div[4]/div[1]/div/div/div[7]/div/table[1]'
 COLUMNS = [DATE, ISSUER, TICKER, SECTOR, BOOKRUNNER, EXCHANGE, MARKET_CAP, OUTSTANDING_SHARES, PRICE_RANGE]
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) ' \
+             'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.79 Safari/537.36'
+TIMEOUT = 30
+
+
+class TableParser(HTMLParser):
+    """ Collect the text of every body row of every <table> in a html document. """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tables: List[List[List[str]]] = []
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+        self._header = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag == 'table':
+            self.tables.append([])
+        elif tag == 'thead':
+            self._header = True
+        elif tag == 'tr' and self.tables and not self._header:
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == 'thead':
+            self._header = False
+        elif tag in ('td', 'th') and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if self._row and any(self._row):
+                self.tables[-1].append(self._row)
+            self._row = None
+
+    def handle_data(self, data: str) -> None:
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse(html: str) -> pd.DataFrame:
+    """ Parse the first IPO calendar table of the given html page. """
+    parser = TableParser()
+    parser.feed(html)
+    for table in parser.tables:
+        rows = [row for row in table if len(row) >= len(COLUMNS)]
+        if rows:
+            return pd.DataFrame([row[:len(COLUMNS)] for row in rows], columns=COLUMNS)
+    return pd.DataFrame(columns=COLUMNS)
+
+
+async def fetch_pages(urls: List[str] = URLS) -> List[str]:
+    """ Fetch all calendar pages concurrently. """
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+    async with aiohttp.ClientSession(headers={'User-Agent': USER_AGENT}, timeout=timeout) as session:
+        async def get(url: str) -> str:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                return await resp.text()
+        return await asyncio.gather(*[get(url) for url in urls])
+
+
+async def fetch_http(urls: List[str] = URLS) -> pd.DataFrame:
+    pages = await fetch_pages(urls)
+    df = pd.concat([parse(page) for page in pages], ignore_index=True)
+    return df.drop_duplicates().reset_index(drop=True)
 
 
 def get_driver() -> webdriver.Chrome:
@@ -20,26 +91,30 @@ def get_driver() -> webdriver.Chrome:
     options.add_argument('--headless')
     options.add_argument('--no-sandbox')
     options.add_argument('window-size=1024x1366')  # iPad Pro
-    options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                         'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.79 Safari/537.36')
+    options.add_argument(f'user-agent={USER_AGENT}')
     return webdriver.Chrome(options=options)
 
 
 def fetch(driver: webdriver.Chrome) -> pd.DataFrame:
-    row = 1
-    data = []
-    while True:
-        try:
-            entry = []
-            for col in range(len(COLUMNS)):
-                xpath = XPATH.format(row, col + 1)
-                entry.append(driver.find_element_by_xpath(xpath).text)
-            data.append(entry)
-            logger.info(f'Fetched: {entry}')
-            row += 1
-        except NoSuchElementException:
-            break
-    return pd.DataFrame(data, columns=COLUMNS)
+    """ Selenium fallback for pages rendered by javascript. Reads the whole table once instead of cell by cell. """
+    try:
+        html = driver.find_element_by_xpath(TABLE_XPATH).get_attribute('outerHTML')
+    except NoSuchElementException:
+        return pd.DataFrame(columns=COLUMNS)
+    return parse(html)
+
+
+def fetch_selenium(urls: List[str] = URLS) -> pd.DataFrame:
+    driver = get_driver()
+    driver.implicitly_wait(10)  # seconds
+    try:
+        dfs = []
+        for url in urls:
+            driver.get(url)
+            dfs.append(fetch(driver))
+        return pd.concat(dfs, ignore_index=True).drop_duplicates().reset_index(drop=True)
+    finally:
+        driver.quit()
 
 
 def report(df: pd.DataFrame) -> None:
@@ -53,9 +128,14 @@ def report(df: pd.DataFrame) -> None:
     email.send()
 
 
-def run():
-    driver = get_driver()
-    driver.implicitly_wait(10)  # seconds
-    driver.get(URL)
-    df = fetch(driver)
+def run(urls: List[str] = URLS):
+    try:
+        df = asyncio.run(fetch_http(urls))
+    except Exception as e:
+        logger.warning(f'IPO http fetch failed: {e}')
+        df = pd.DataFrame(columns=COLUMNS)
+    if df.empty:
+        logger.info('IPO calendar not found in static html. Falling back to selenium.')
+        df = fetch_selenium(urls)
+    logger.info(f'Fetched {len(df)} upcoming IPOs')
     report(df)
@@ -1,38 +1,117 @@
 import numpy as np
 import pandas as pd
 
+from functools import lru_cache
+
 from src.config import OPTION_DATA_DIR
 from src.constant import *
 from src.utils.logger import logger
 
+# Number of (ticker, predicate) chains kept decoded in memory per process.
+CACHE_SIZE = 8
+
 
 class Option:
     """ Option data loader
 
+        Date, expiry and delta predicates are pushed down to the parquet reader so that only the matching row groups
+        are decoded, and recently loaded chains are kept in a per-process LRU cache.
+
         Usage:
         >>> data = Option().daily('SPY', right=CALL)
+        >>> data = Option().daily('SPY', right=PUT, start='2020-01-01', max_dte=30, min_delta=-0.6, max_delta=-0.1)
     """
 
-    def daily(self, ticker: str, right: str = CALL, start: Optional[str] = None) -> pd.DataFrame:
-        df = pd.read_parquet(OPTION_DATA_DIR + f'/{ticker}.parquet.gz')
-        logger.debug(f'Parquet data loaded for {ticker}')
+    def daily(self,
+              ticker: str,
+              right: str = CALL,
+              start: Optional[str] = None,
+              end: Optional[str] = None,
+              exp_start: Optional[str] = None,
+              exp_end: Optional[str] = None,
+              min_dte: Optional[int] = None,
+              max_dte: Optional[int] = None,
+              min_delta: Optional[float] = None,
+              max_delta: Optional[float] = None) -> pd.DataFrame:
+        """ Load daily option chain of the given ticker.
+
+        :param ticker: underlying ticker
+        :param right: CALL or PUT
+        :param start: first trade date (inclusive)
+        :param end: last trade date (inclusive)
+        :param exp_start: first expiration date (inclusive)
+        :param exp_end: last expiration date (inclusive)
+        :param min_dte: minimum business days to expiration (inclusive)
+        :param max_dte: maximum business days to expiration (inclusive)
+        :param min_delta: minimum delta of the given right, i.e. negative for PUT (inclusive)
+        :param max_delta: maximum delta of the given right, i.e. negative for PUT (inclusive)
+        """
+        filters = Option._filters(right, start, end, exp_start, exp_end, min_delta, max_delta)
+        df = Option._read(ticker, filters)
+        df = Option._clean(df, right)
+        if min_dte is not None:
+            df = df[df[DTE] >= min_dte]
+        if max_dte is not None:
+            df = df[df[DTE] <= max_dte]
+        return df.reset_index(drop=True)
+
+    @staticmethod
+    def clear_cache() -> None:
+        """ Drop all the cached option chains. """
+        Option._read.cache_clear()
+
+    @staticmethod
+    @lru_cache(maxsize=CACHE_SIZE)
+    def _read(ticker: str, filters: Tuple[Tuple[str, str, Any], ...]) -> pd.DataFrame:
+        df = pd.read_parquet(OPTION_DATA_DIR + f'/{ticker}.parquet.gz', filters=list(filters) or None)
+        logger.debug(f'Parquet data loaded for {ticker} {filters}: {df.shape}')
+        return df
+
+    @staticmethod
+    def _filters(right: str,
+                 start: Optional[str] = None,
+                 end: Optional[str] = None,
+                 exp_start: Optional[str] = None,
+                 exp_end: Optional[str] = None,
+                 min_delta: Optional[float] = None,
+                 max_delta: Optional[float] = None) -> Tuple[Tuple[str, str, Any], ...]:
+        """ Build hashable pyarrow filters. Raw delta is the call delta so put bounds are shifted by one. """
+        shift = 1 if right == PUT else 0
+        filters = []
         if start is not None:
-            df = df[df['tradeDate'] >= start]
-        return Option._clean(df, right)
+            filters.append(('tradeDate', '>=', Option._fmt_date(start)))
+        if end is not None:
+            filters.append(('tradeDate', '<=', Option._fmt_date(end)))
+        if exp_start is not None:
+            filters.append(('expirDate', '>=', Option._fmt_date(exp_start)))
+        if exp_end is not None:
+            filters.append(('expirDate', '<=', Option._fmt_date(exp_end)))
+        if min_delta is not None:
+            filters.append(('delta', '>=', float(min_delta) + shift))
+        if max_delta is not None:
+            filters.append(('delta', '<=', float(max_delta) + shift))
+        return tuple(filters)
+
+    @staticmethod
+    def _fmt_date(date: Union[str, datetime]) -> str:
+        return pd.Timestamp(date).strftime('%Y-%m-%d')
 
     @staticmethod
     def _clean(df: pd.DataFrame, right: str) -> pd.DataFrame:
-        df = df.copy().reset_index(drop=True)
-        df[TICKER] = df['ticker']
-        df[DATE] = pd.to_datetime(df['tradeDate'])
-        df[EXP] = pd.to_datetime(df['expirDate'])
-        df[STRIKE] = df['strike']
-        df[DTE] = np.busday_count([d.date() for d in df[DATE]], [d.date() for d in df[EXP]])
-        df[STOCK_PRICE] = df['stockPrice']
+        df = df.reset_index(drop=True)
+        trade_date = pd.to_datetime(df['tradeDate'])
+        exp = pd.to_datetime(df['expirDate'])
+        out = pd.DataFrame({
+            DATE: trade_date,
+            EXP: exp,
+            STRIKE: df['strike'],
+            DTE: np.busday_count(trade_date.values.astype('datetime64[D]'), exp.values.astype('datetime64[D]')),
+        })
         if right == CALL:
-            df[PRICE] = df['callValue']
-            df[DELTA] = df['delta']
+            out[DELTA] = df['delta']
+            out[PRICE] = df['callValue']
         elif right == PUT:
-            df[PRICE] = df['putValue']
-            df[DELTA] = df['delta'] - 1
-        return df[[DATE, EXP, STRIKE, DTE, DELTA, PRICE, STOCK_PRICE]]
+            out[DELTA] = df['delta'] - 1
+            out[PRICE] = df['putValue']
+        out[STOCK_PRICE] = df['stockPrice']
+        return out[[DATE, EXP, STRIKE, DTE, DELTA, PRICE, STOCK_PRICE]]
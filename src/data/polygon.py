@@ -2,7 +2,8 @@
 This class is deprecated. Polygon now cannot be accessed via Alpaca.
 """
 import aiohttp
-import datetime
+import asyncio
+import datetime as dt
 import dateutil.parser
 import pandas as pd
 
@@ -13,9 +14,10 @@ from alpaca_trade_api.polygon.entity import (
 )
 from alpaca_trade_api.common import URL, DATE
 
-from src.config import AlpacaConfig
+from src.config import AlpacaConfig, QUOTES, TRADES
 from src.constant import *
 from src.data.base import Data
+from src.data.ticks import MAX_LIMIT, TickStore, compact, paginate
 from src.utils.logger import logger
 
 Exchanges = List[Exchange]
@@ -41,9 +43,9 @@ def format_date_for_api_call(date):
     - pd.Timestamp
     that gives the user the freedom to use the API in a very flexible way
     """
-    if isinstance(date, datetime.datetime):
+    if isinstance(date, dt.datetime):
         return date.date().isoformat()
-    elif isinstance(date, datetime.date):
+    elif isinstance(date, dt.date):
         return date.isoformat()
     elif isinstance(date, str):  # string date
         return dateutil.parser.parse(date).date().isoformat()
@@ -69,9 +71,9 @@ def fix_daily_bar_date(date, timespan):
     """
     if timespan == 'day':
         date = dateutil.parser.parse(date)
-        today = datetime.datetime.utcnow().date()
+        today = dt.datetime.utcnow().date()
         if today != date.date():
-            date = date + datetime.timedelta(days=1)
+            date = date + dt.timedelta(days=1)
         date = date.date().isoformat()
     return date
 
@@ -137,6 +139,22 @@ class Polygon:
         df = df.set_index('timestamp')
         return df[[PRICE, SIZE, EXCHANGE]]
 
+    async def all_trades(self, symbol: str, date: DATE, limit: int = MAX_LIMIT) -> pd.DataFrame:
+        """ Return all the historical trades for symbol on date by following the timestamp cursor.
+            Timestamps are int64 nanoseconds, prices float32 and exchanges categorical.
+        """
+        if not self.is_connected():
+            await self.connect()
+        rows = await paginate(self.historic_trades_v2, symbol, format_date_for_api_call(date), limit)
+        return compact(rows, TRADES)
+
+    async def all_quotes(self, symbol: str, date: DATE, limit: int = MAX_LIMIT) -> pd.DataFrame:
+        """ Return all the historical quotes for symbol on date by following the timestamp cursor. """
+        if not self.is_connected():
+            await self.connect()
+        rows = await paginate(self.historic_quotes_v2, symbol, format_date_for_api_call(date), limit)
+        return compact(rows, QUOTES)
+
     async def _request(self, method: str, path: str, params: dict = None, version: str = 'v1'):
         """
         :param method: GET, POST, ...
@@ -313,3 +331,58 @@ class Polygon:
         path = '/snapshot/locale/us/markets/stocks/{}'.format(direction)
         raw = await self.get(path, version='v2')
         return [Ticker(ticker) for ticker in raw['tickers']]
+
+
+class TickDownloader:
+    """ Download full-day trades or quotes for many symbol-days concurrently into a TickStore.
+
+        Usage:
+        >>> downloader = TickDownloader()
+        >>> await downloader.run(['SPY', 'QQQ'], ['2021-01-04', '2021-01-05'], kind=TRADES)
+        >>> df = downloader.store.read('SPY', kind=TRADES)
+
+        A Polygon client passed in stays connected after run, closing it is up to the caller.
+    """
+
+    def __init__(self, store: Optional[TickStore] = None, concurrency: int = 8, polygon: Optional[Polygon] = None):
+        self.store = store or TickStore()
+        self.concurrency = concurrency
+        self.polygon = polygon or Polygon()
+        # Only a client created here is disconnected at the end of run.
+        self._owns_polygon = polygon is None
+
+    async def run(self,
+                  symbols: List[str],
+                  dates: List[DATE],
+                  kind: str = TRADES,
+                  overwrite: bool = False) -> Dict[Tuple[str, str], int]:
+        """ Download every symbol-day and return the number of rows stored for each. Failed days are logged
+            and reported as -1 so that a rerun only retries what is missing.
+        """
+        if not self.polygon.is_connected():
+            await self.polygon.connect()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        jobs = [(symbol, format_date_for_api_call(date)) for symbol in symbols for date in dates]
+        jobs = [job for job in jobs if overwrite or not self.store.exists(*job, kind)]
+        logger.info(f'Downloading {kind} for {len(jobs)} symbol-days with concurrency {self.concurrency}')
+        try:
+            counts = await asyncio.gather(*[self._download(semaphore, symbol, date, kind) for symbol, date in jobs])
+        finally:
+            if self._owns_polygon:
+                await self.polygon.disconnect()
+        return dict(zip(jobs, counts))
+
+    async def _download(self, semaphore: asyncio.Semaphore, symbol: str, date: str, kind: str) -> int:
+        async with semaphore:
+            try:
+                if kind == TRADES:
+                    df = await self.polygon.all_trades(symbol, date)
+                else:
+                    df = await self.polygon.all_quotes(symbol, date)
+            except Exception as e:
+                logger.error(f'Failed to download {kind} for {symbol} {date}: {e}')
+                return -1
+        # Stream each symbol-day to disk as soon as it completes instead of holding the whole run in memory.
+        self.store.write(df, symbol, date, kind)
+        logger.info(f'Stored {df.shape[0]} {kind} for {symbol} {date}')
+        return df.shape[0]
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from src.config import DATA_DIR, QUOTES, TRADES
+from src.constant import *
+from src.utils.logger import logger
+
+# Polygon v2 tick endpoints return at most this many rows per request.
+MAX_LIMIT = 50000
+
+SIP_TIMESTAMP = 'sip_timestamp'
+SEQUENCE_NUMBER = 'sequence_number'
+
+# Compact on-disk dtypes per tick type. Timestamps are kept as int64 nanoseconds since epoch.
+DTYPES = {
+    TRADES: {TIMESTAMP: 'int64', PRICE: 'float32', SIZE: 'int32', EXCHANGE: 'category'},
+    QUOTES: {TIMESTAMP: 'int64', BID_PRICE: 'float32', BID_SIZE: 'int32', BID_EXCHANGE: 'category',
+             ASK_PRICE: 'float32', ASK_SIZE: 'int32', ASK_EXCHANGE: 'category'},
+}
+
+
+async def paginate(fetch: Callable[..., Awaitable[List[Any]]],
+                   symbol: str,
+                   date: str,
+                   limit: int = MAX_LIMIT) -> List[Dict]:
+    """ Follow the timestamp cursor of a Polygon v2 tick endpoint until the whole day is fetched.
+
+        The cursor is inclusive, so rows sharing the boundary timestamp are returned again on the next page and
+        are dropped by sequence number.
+
+    :param fetch: historic_trades_v2 or historic_quotes_v2
+    :param symbol: ticker symbol
+    :param date: date in YYYY-MM-DD
+    :param limit: page size
+    :return: raw rows
+    """
+    rows = []
+    timestamp, boundary = None, set()
+    while True:
+        page = await fetch(symbol, date, timestamp=timestamp, limit=limit)
+        raw = [item._raw for item in page]
+        new = [row for row in raw if row[SEQUENCE_NUMBER] not in boundary]
+        rows.extend(new)
+        if len(raw) < limit:
+            break
+        if not new or new[-1][SIP_TIMESTAMP] == timestamp:
+            logger.warning(f'More than {limit} ticks share timestamp {timestamp} for {symbol} {date}. Stop paging.')
+            break
+        timestamp = new[-1][SIP_TIMESTAMP]
+        boundary = {row[SEQUENCE_NUMBER] for row in new if row[SIP_TIMESTAMP] == timestamp}
+    logger.debug(f'Fetched {len(rows)} ticks for {symbol} {date}')
+    return rows
+
+
+def compact(rows: List[Dict], kind: str = TRADES) -> pd.DataFrame:
+    """ Convert raw Polygon tick rows to a frame with compact dtypes. """
+    dtypes = DTYPES[kind]
+    if not rows:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in dtypes.items()})
+    df = pd.DataFrame(rows).rename(columns={SIP_TIMESTAMP: TIMESTAMP})
+    df = df.sort_values(TIMESTAMP, kind='mergesort')
+    return df[list(dtypes)].astype(dtypes).reset_index(drop=True)
+
+
+class TickStore:
+    """ Partitioned parquet store for tick data, one file per symbol-day:
+
+        {root}/{kind}/symbol={symbol}/date={date}.parquet
+
+        Usage:
+        >>> store = TickStore()
+        >>> df = store.read('SPY', start='2021-01-04', end='2021-01-08', kind=TRADES)
+    """
+
+    def __init__(self, root: Union[str, Path] = Path(DATA_DIR) / 'ticks') -> None:
+        self.root = Path(root)
+
+    def path(self, symbol: str, date: str, kind: str = TRADES) -> Path:
+        return self.root / kind / f'symbol={symbol}' / f'date={date}.parquet'
+
+    def exists(self, symbol: str, date: str, kind: str = TRADES) -> bool:
+        return self.path(symbol, date, kind).exists()
+
+    def dates(self, symbol: str, kind: str = TRADES) -> List[str]:
+        folder = self.root / kind / f'symbol={symbol}'
+        return sorted(path.stem.split('=')[1] for path in folder.glob('date=*.parquet'))
+
+    def write(self, df: pd.DataFrame, symbol: str, date: str, kind: str = TRADES) -> Path:
+        path = self.path(symbol, date, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so that an interrupted download never leaves a partial partition.
+        tmp = path.with_suffix('.tmp')
+        df.to_parquet(tmp, index=False)
+        tmp.replace(path)
+        return path
+
+    def read(self,
+             symbol: str,
+             start: Optional[str] = None,
+             end: Optional[str] = None,
+             kind: str = TRADES,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """ Read ticks of symbol between start and end dates (inclusive) indexed by timestamp. """
+        dates = [date for date in self.dates(symbol, kind)
+                 if (start is None or date >= start) and (end is None or date <= end)]
+        dfs = [pd.read_parquet(self.path(symbol, date, kind), columns=columns and [TIMESTAMP] + columns)
+               for date in dates]
+        if not dfs:
+            return compact([], kind).set_index(TIMESTAMP)
+        df = pd.concat(dfs, ignore_index=True)
+        for col, dtype in DTYPES[kind].items():
+            # Categories can differ between days, so concat falls back to object.
+            if dtype == 'category' and col in df:
+                df[col] = df[col].astype('category')
+        df.index = pd.to_datetime(df.pop(TIMESTAMP).values.astype(np.int64), utc=True)
+        df.index.name = TIMESTAMP
+        return df
@@ -2,7 +2,9 @@ import pandas as pd
 
 from typing import List, Optional, Union
 
+from src.config import COMPACT_PRICES
 from src.data.base import Data
+from src.data.compact import compact as to_compact
 from src.data.helpers.async_yahoo import YahooDailyReader
 from src.utils.time import timeit, today
 from src.utils.fe import START
@@ -14,6 +16,7 @@ class Yahoo(Data):
         >>> df = await Yahoo().daily(['AAPL', 'FB'])
         >>> df['AAPL']
         >>> df = await Yahoo().daily('AAPL', start='2018-01-02', end='2018-12-31', field=Yahoo.CLOSE)
+        >>> df = await Yahoo().daily(['AAPL', 'FB'], compact=True)  # float32 prices
     """
 
     OPEN: str = 'Open'
@@ -29,13 +32,16 @@ class Yahoo(Data):
                     tickers: Union[str, List[str]],
                     start: str = START,
                     end: str = today(),
-                    field: Optional[Union[str, List[str]]] = ADJ_CLOSE) -> pd.DataFrame:
+                    field: Optional[Union[str, List[str]]] = ADJ_CLOSE,
+                    compact: bool = COMPACT_PRICES) -> pd.DataFrame:
         df = await YahooDailyReader(tickers, start, end, chunksize=300).read()
         df = df.reset_index()
         df = df.set_index(Yahoo.DATE)
         df = df[~df.index.duplicated(keep='last')]
         if field is not None:
             df = df[field]
+        if compact and isinstance(df, pd.DataFrame):
+            df = to_compact(df)
         return df
 
     async def minute(self,
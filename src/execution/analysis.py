@@ -1,38 +1,23 @@
 import numpy as np
 import pandas as pd
 
-from src.analytics.performance import Statistics
+from src.analytics.performance import GroupStats, Statistics
 from src.constant import *
 
 
 class Analysis:
+    STATS = ['Sharpe', 'Sortino', 'Win', 'Max', 'Min', 'Return', 'Count']
+
     @staticmethod
-    def yearly_stats(data: pd.Series, notional: bool = False) -> pd.DataFrame:
-        df = pd.DataFrame(data.groupby(data.index.year).agg(
-            Sharpe=Statistics.sharpe,
-            Sortino=Statistics.sortino,
-            Win=Statistics.win_rate,
-            Max=np.max,
-            Min=np.min,
-            Return=lambda x: Statistics.cumulative_returns(x, history=False, notional=notional),
-            Count=np.size
-        )).round(4)
-        df.index.name = 'Year'
-        return df
+    def yearly_stats(data: Union[pd.Series, pd.DataFrame], notional: bool = False) -> pd.DataFrame:
+        """ Stats per year, one block of columns per series if data is a frame. """
+        years = pd.Index(data.index.year, name='Year')
+        return GroupStats(data, years, notional=notional).table(Analysis.STATS).round(4)
 
     @staticmethod
-    def monthly_stats(data: pd.Series, notional: bool = False) -> pd.DataFrame:
-        df = pd.DataFrame(data.groupby([data.index.year, data.index.month]).agg(
-            Sharpe=Statistics.sharpe,
-            Sortino=Statistics.sortino,
-            Win=Statistics.win_rate,
-            Max=np.max,
-            Min=np.min,
-            Return=lambda x: Statistics.cumulative_returns(x, history=False, notional=notional),
-            Count=np.size
-        )).round(4)
-        df.index.set_names(['Year', 'Month'], inplace=True)
-        return df
+    def monthly_stats(data: Union[pd.Series, pd.DataFrame], notional: bool = False) -> pd.DataFrame:
+        keys = [pd.Index(data.index.year, name='Year'), pd.Index(data.index.month, name='Month')]
+        return GroupStats(data, keys, notional=notional).table(Analysis.STATS).round(4)
 
     @staticmethod
     def summarize(returns: pd.Series, notional: bool = False) -> pd.DataFrame:
@@ -47,51 +32,62 @@ class Analysis:
         return summary.set_index('window').drop('index', axis=1)
 
     @staticmethod
-    def underwater(returns: pd.Series) -> pd.Series:
-        """ Returns here must be cumulative returns. """
-        cr = Statistics.cumulative_returns(returns)
-        running_max = np.maximum.accumulate(cr.copy())
-        return cr / running_max - 1
+    def underwater(returns: Union[pd.Series, pd.DataFrame]) -> Union[pd.Series, pd.DataFrame]:
+        """ Distance of the compounded wealth from its running peak, 0 at a new high. """
+        wealth = 1 + Statistics.cumulative_returns(returns)
+        return wealth / wealth.cummax() - 1
 
     @staticmethod
-    def drawdowns(returns: pd.Series, top: int = 5) -> pd.DataFrame:
-        cr = Statistics.cumulative_returns(returns)
-        uw = Analysis.underwater(returns)
-        drawdowns = []
-        for _ in range(top):
-            valley = uw.idxmin()
-            peak = uw[:valley][uw[:valley] == 0].index[-1]
-            try:
-                recovery = uw[valley:][uw[valley:] == 0].index[0]
-            except IndexError:
-                recovery = np.nan
-            if not pd.isnull(recovery):
-                uw.drop(uw[peak:recovery].index[1:-1], inplace=True)
-            else:
-                # drawdown has not ended yet
-                uw = uw.loc[:peak]
-            drawdowns.append((peak, valley, recovery))
-            if len(returns) == 0 or len(uw) == 0 or np.min(uw) == 0:
-                break
-        df = pd.DataFrame(index=list(range(top)),
-                          columns=['Percent Drawdown', PEAK, VALLEY, RECOVERY, DURATION])
-        for i, (peak, valley, recovery) in enumerate(drawdowns):
-            if pd.isnull(recovery):
-                df.loc[i, DURATION] = np.nan
-            else:
-                df.loc[i, DURATION] = len(pd.date_range(peak, recovery, freq='B'))
-            df.loc[i, PEAK] = (peak.to_pydatetime().strftime('%Y-%m-%d'))
-            df.loc[i, VALLEY] = (valley.to_pydatetime().strftime('%Y-%m-%d'))
-            if isinstance(recovery, float):
-                df.loc[i, RECOVERY] = recovery
-            else:
-                df.loc[i, RECOVERY] = (recovery.to_pydatetime().strftime('%Y-%m-%d'))
-            df.loc[i, 'Percent Drawdown'] = ((cr.loc[peak] - cr.loc[valley]) / cr.loc[peak]) * 100
+    def drawdown_episodes(returns: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
+        """ Every peak -> valley -> recovery episode of one or many return series, found in one linear pass.
+
+        An episode is a run of rows under water. Its peak is the row before the run, its valley the deepest row and
+        its recovery the first row back at the peak, NaT if the series has not recovered yet. Duration counts the
+        business days from peak to recovery and Recovery Time those from valley to recovery, both inclusive.
 
-        df[PEAK] = pd.to_datetime(df[PEAK])
-        df[VALLEY] = pd.to_datetime(df[VALLEY])
-        df[RECOVERY] = pd.to_datetime(df[RECOVERY])
-        return df
+        :return: one row per episode, deepest first (within each series, named in a Series column, for a frame)
+        """
+        frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+        n = len(frame)
+        # Column-major so that runs never cross series: the first row of every series is at its peak.
+        uw = Analysis.underwater(frame.fillna(0)).values.T.ravel()
+        under = np.concatenate([[False], uw < 0, [False]])
+        first = under[1:-1] & ~under[:-2]
+        starts, ends = np.flatnonzero(first), np.flatnonzero(under[:-1] & ~under[1:])
+        # Rows between two runs are at 0, so the minimum from one start to the next is the depth of the run.
+        depth = np.minimum.reduceat(uw, starts) if len(starts) else np.zeros(0)
+        run = np.cumsum(first) - 1
+        hits = np.flatnonzero((run >= 0) & (uw == np.append(depth, np.nan)[run]))
+        valleys = hits[np.diff(run[hits], prepend=-1) != 0]
+        series, peaks = np.divmod(starts - 1, n)
+        recovered = ends % n != 0
+        dates = frame.index.values.astype('datetime64[D]')
+        peak, valley, recovery = dates[peaks], dates[valleys % n], dates[np.where(recovered, ends % n, 0)]
+        with np.errstate(invalid='ignore'):
+            duration = np.where(recovered, np.busday_count(peak, recovery + 1), np.nan)
+            recovery_time = np.where(recovered, np.busday_count(valley, recovery + 1), np.nan)
+        order = np.lexsort((depth, series))
+        df = pd.DataFrame({
+            'Series': frame.columns[series],
+            'Percent Drawdown': -depth * 100,
+            PEAK: frame.index[peaks],
+            VALLEY: frame.index[valleys % n],
+            RECOVERY: pd.DatetimeIndex(np.where(recovered, recovery, np.datetime64('NaT'))),
+            DURATION: duration,
+            'Recovery Time': recovery_time,
+        }).iloc[order].reset_index(drop=True)
+        return df.drop(columns='Series') if isinstance(returns, pd.Series) else df
+
+    @staticmethod
+    def drawdowns(returns: Union[pd.Series, pd.DataFrame], top: int = 5) -> pd.DataFrame:
+        """ The top deepest drawdown episodes, rows 0 to top - 1 (per series if returns is a frame). """
+        episodes = Analysis.drawdown_episodes(returns)
+        columns = ['Percent Drawdown', PEAK, VALLEY, RECOVERY, DURATION]
+        if isinstance(returns, pd.Series):
+            return episodes[columns].head(top).reindex(range(top))
+        episodes = episodes.groupby('Series', sort=False).head(top)
+        episodes.index = [episodes.Series, episodes.groupby('Series', sort=False).cumcount()]
+        return episodes[columns].reindex(pd.MultiIndex.from_product([returns.columns, range(top)]))
 
     @staticmethod
     def turnover(positions: pd.DataFrame, window: int = 10) -> None:
@@ -0,0 +1,111 @@
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import *
+
+from src.data import Yahoo
+from src.utils.fe import START
+from src.utils.logger import logger
+
+PRICES = 'prices'
+YAHOO = 'yahoo'
+STORAGE = 'storage'
+
+
+@dataclass(frozen=True)
+class Requirement:
+    """ One input a signal needs before it computes anything.
+
+        Yahoo inputs are a field of some tickers from a start date, storage inputs are a parquet file.
+        The requirement named PRICES becomes the signal prices.
+
+        Usage:
+        >>> Requirement(PRICES, ['SPXL', 'TMF'])
+        >>> Requirement('High', ['SPXL'], field=Yahoo.HIGH, start='2015-01-01')
+        >>> Requirement('cef', source=STORAGE, path='data/signals/closure/cef_close.parquet.gz')
+    """
+    name: str = PRICES
+    tickers: Tuple[str, ...] = ()
+    field: str = Yahoo.ADJ_CLOSE
+    start: str = START
+    source: str = YAHOO
+    path: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'tickers', tuple(self.tickers))
+
+
+class DataLoader:
+    """ Resolves the requirements of many signals into one planned load and serves each signal its slice.
+
+        All missing Yahoo tickers are read in a single request with every field, from the earliest start any
+        requirement asks for, and each storage file is read once. Loaded data is cached on the loader, so only what
+        is not cached yet is fetched by a later load.
+
+        Usage:
+        >>> loader = DataLoader()
+        >>> await loader.load(flatten([signal.requirements for signal in signals]))
+        >>> signal.data = loader.slice(signal.requirements)
+    """
+
+    def __init__(self, storage: Any = None) -> None:
+        self.storage = storage
+        self._fields: Dict[str, pd.DataFrame] = dict()
+        self._files: Dict[str, pd.DataFrame] = dict()
+        # Earliest start each ticker is loaded from.
+        self._starts: Dict[str, pd.Timestamp] = dict()
+
+    def _missing(self, requirements: List[Requirement]) -> Tuple[List[str], Optional[pd.Timestamp]]:
+        """ Yahoo tickers to fetch, in order, and the earliest start they are needed from. """
+        tickers, start = dict(), None
+        for requirement in requirements:
+            if requirement.source != YAHOO:
+                continue
+            begin = pd.Timestamp(requirement.start)
+            for ticker in requirement.tickers:
+                # Every field of a ticker comes with the same request.
+                if ticker not in self._starts or self._starts[ticker] > begin:
+                    tickers[ticker] = None
+                    start = begin if start is None else min(start, begin)
+        return list(tickers), start
+
+    async def load(self, requirements: Iterable[Requirement]) -> None:
+        """ Fetch everything the requirements need that is not cached yet. """
+        requirements = list(requirements)
+        tickers, start = self._missing(requirements)
+        if tickers:
+            logger.info(f'Loading {len(tickers)} tickers from {start.date()}')
+            # A list always comes back with (field, ticker) columns, even for a single ticker.
+            data = await Yahoo().daily(tickers=tickers, start=str(start.date()), field=None)
+            for field in data.columns.get_level_values(0).unique():
+                frame = data[field]
+                cached = self._fields.get(field)
+                if cached is not None:
+                    frame = pd.concat([cached.drop(columns=frame.columns, errors='ignore'), frame], axis=1)
+                self._fields[field] = frame
+            self._starts.update({ticker: start for ticker in tickers})
+        for requirement in requirements:
+            if requirement.source == STORAGE and requirement.path not in self._files:
+                if self.storage is None:
+                    from src.storage import GCS
+                    self.storage = GCS()
+                logger.info(f'Loading {requirement.path}')
+                self._files[requirement.path] = self.storage.read_parquet(requirement.path)
+
+    def get(self, requirement: Requirement) -> pd.DataFrame:
+        """ The loaded data of a requirement. """
+        if requirement.source == STORAGE:
+            return self._files[requirement.path]
+        if not requirement.tickers:
+            return pd.DataFrame()
+        frame = self._fields[requirement.field][list(requirement.tickers)]
+        return frame.loc[frame.index >= pd.Timestamp(requirement.start)]
+
+    def slice(self, requirements: Iterable[Requirement]) -> Dict[str, pd.DataFrame]:
+        return {requirement.name: self.get(requirement) for requirement in requirements}
+
+    async def resolve(self, requirements: Iterable[Requirement]) -> Dict[str, pd.DataFrame]:
+        """ Load and slice in one go. """
+        requirements = list(requirements)
+        await self.load(requirements)
+        return self.slice(requirements)
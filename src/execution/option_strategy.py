@@ -8,7 +8,7 @@ from scipy.stats import skew, kurtosis
 from src.constant import *
 from src.analytics.performance import Statistics
 from src.utils.logger import logger
-from src.utils.time import NYSE
+from src.utils.time import MarketCalendar
 
 MULTIPLIER = 100
 LONG = '_long'
@@ -92,7 +92,7 @@ class OptionStrategy:
         end = options[DATE].max()
         df = pd.DataFrame()
         df[DATE] = pd.bdate_range(start, end)
-        market_open = NYSE.schedule(start, end).index
+        market_open = MarketCalendar.open_dates(start, end)
         df[HOLIDAY] = ~df[DATE].isin(market_open)
         df[DOW] = df[DATE].dt.day_name()
         df = df[df[DOW] == dow]
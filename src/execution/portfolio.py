@@ -1,5 +1,10 @@
-from src.data import Yahoo
+import copy
+import pickle
+import time
+
+from multiprocessing import Pool, shared_memory
 from src.execution.analysis import Analysis
+from src.execution.loader import PRICES, DataLoader, Requirement
 from src.execution.plotting import *
 from src.execution.signal import DailySignal, Long
 from src.execution.utils import *
@@ -11,6 +16,57 @@ PORTFOLIO = 'Portfolio'
 PORTFOLIO_NET = 'Portfolio_Net'
 TCOST = 'TCost'
 
+# Portfolio prices and pickled signals published by Portfolio.update, attached once per worker by _attach.
+_SHARED: Dict[str, Any] = dict()
+
+
+def _attach(name: str, shape: Tuple[int, int], dtype: np.dtype, index: pd.Index, columns: pd.Index,
+            signals: List[bytes]) -> None:
+    memory = shared_memory.SharedMemory(name=name)
+    prices = pd.DataFrame(np.ndarray(shape, dtype=dtype, buffer=memory.buf), index=index, columns=columns, copy=False)
+    _SHARED.update(memory=memory, prices=prices, signals=signals)
+
+
+def _pack(frame: Any, index: pd.Index) -> Any:
+    """ A frame on a subset of index as (row positions, columns, values), anything else as is. """
+    if not isinstance(frame, pd.DataFrame) or not index.is_unique or frame.dtypes.nunique() > 1:
+        return frame
+    rows = index.get_indexer(frame.index)
+    if (rows < 0).any():
+        return frame
+    return rows.astype(np.int32), frame.columns, frame.values
+
+
+def _unpack(packed: Any, index: pd.Index) -> Any:
+    if not isinstance(packed, tuple):
+        return packed
+    rows, columns, values = packed
+    # A contiguous block is sliced so that the index keeps its frequency.
+    contiguous = len(rows) and rows[-1] - rows[0] == len(rows) - 1 and (np.diff(rows) == 1).all()
+    index = index[rows[0]:rows[-1] + 1] if contiguous else index[rows]
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def _update_signal(i: int, notional: float, incremental: bool) -> Dict[str, Any]:
+    """ Update the i-th published signal on its columns of the shared prices. """
+    start = time.perf_counter()
+    signal = pickle.loads(_SHARED['signals'][i])
+    prices = _SHARED['prices']
+    signal.prices = prices[signal.tickers]
+    asyncio.run(signal.update(notional, incremental))
+    return dict(weights=_pack(signal.weights, prices.index), positions=_pack(signal.positions, prices.index),
+                elapsed=time.perf_counter() - start)
+
+
+def _dumps(signal: DailySignal) -> Optional[bytes]:
+    """ The signal pickled without its prices, None if it cannot be pickled (e.g. it holds a client). """
+    signal = copy.copy(signal)
+    signal.prices = None
+    try:
+        return pickle.dumps(signal)
+    except Exception:
+        return None
+
 
 class Portfolio:
 
@@ -25,6 +81,8 @@ class Portfolio:
         self.prices = None
         self.positions = None
         self.weights = None
+        self.timings = dict()
+        self.loader = DataLoader()
 
     @property
     def name(self) -> str:
@@ -38,9 +96,17 @@ class Portfolio:
         return f'Portfolio({self.signal_names})'
 
     async def fetch(self) -> None:
+        """ Load the declared inputs of every signal and the benchmark in one planned batch and hand each its slice
+            before any signal computes.
+        """
         if self.prices is None:
-            prices = await Yahoo().daily(tickers=self.tickers)
-            self.set_prices(prices)
+            signals = self.signals + [self.benchmark]
+            prices = Requirement(PRICES, self.tickers)
+            await self.loader.load([prices] + [r for signal in signals for r in signal.requirements])
+            for signal in signals:
+                signal.data = self.loader.slice(signal.requirements)
+            self.benchmark.prices = self.benchmark.data[PRICES]
+            self.set_prices(self.loader.get(prices))
 
     def set_prices(self, prices: pd.DataFrame) -> None:
         if not isinstance(prices.index, pd.core.indexes.datetimes.DatetimeIndex):
@@ -49,24 +115,81 @@ class Portfolio:
         for signal in self.signals:
             signal.prices = self.prices[signal.tickers]
 
-    async def update(self, notional: float) -> None:
+    async def update(self, notional: float, processes: int = 1, incremental: bool = False) -> None:
+        """ Update every signal with an equal share of the notional and combine their positions and weights.
+            By default signals are updated one by one in this process, processes > 1 updates them concurrently in a
+            process pool.
+            With incremental, each signal only computes the rows that arrived since its last incremental run.
+        """
+        allocation = 1.0 / len(self.signals)
+        self.timings = await self._update_signals(notional * allocation, processes, incremental)
         positions = pd.DataFrame()
         weights = pd.DataFrame()
-        allocation = 1.0 / len(self.signals)
         for signal in self.signals:
-            logger.info(f'Updating {signal.name}')
-            await signal.update(notional * allocation)
             positions = positions.add(signal.positions, fill_value=0)
             if signal.weights is not None:
                 weights = weights.add(signal.weights.mul(allocation, axis='index'), fill_value=0)
         self.positions = positions
         self.weights = weights
 
-    async def run(self, notional: float) -> None:
+    async def _update_signals(self,
+                              notional: float,
+                              processes: int = 1,
+                              incremental: bool = False) -> Dict[str, float]:
+        """
+        With processes > 1, signals that can be pickled are updated in worker processes. The portfolio prices are
+        published once through shared memory in their own dtype (float32 prices stay float32), each worker receives
+        the pickled signals once, and weights and positions come back as row positions and value arrays. The other
+        signals are updated here while the pool runs.
+        :return: seconds spent updating each signal, in signal order
+        """
+        processes = min(processes, len(self.signals))
+        pickled = [_dumps(signal) for signal in self.signals] if processes > 1 and self.prices is not None else []
+        parallel = [i for i, data in enumerate(pickled) if data is not None]
+        parallel = parallel if len(parallel) > 1 else []
+        timings, memory, pool, pending = dict(), None, None, None
+        try:
+            if parallel:
+                prices = self.prices.loc[:, ~self.prices.columns.duplicated()]
+                values = np.ascontiguousarray(prices.values)
+                memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                np.ndarray(values.shape, dtype=values.dtype, buffer=memory.buf)[:] = values
+                workers = min(processes, len(parallel))
+                pool = Pool(workers, initializer=_attach,
+                            initargs=(memory.name, values.shape, values.dtype, prices.index, prices.columns, pickled))
+                pending = pool.starmap_async(_update_signal, [(i, notional, incremental) for i in parallel])
+                logger.info(f'Updating {", ".join(self.signals[i].name for i in parallel)} in {workers} processes')
+            for i, signal in enumerate(self.signals):
+                if i not in parallel:
+                    logger.info(f'Updating {signal.name}')
+                    start = time.perf_counter()
+                    await signal.update(notional, incremental)
+                    timings[i] = time.perf_counter() - start
+            if pending is not None:
+                results = await asyncio.get_running_loop().run_in_executor(None, pending.get)
+                for i, result in zip(parallel, results):
+                    signal = self.signals[i]
+                    signal.notional = notional
+                    signal.weights = _unpack(result['weights'], prices.index)
+                    signal.positions = _unpack(result['positions'], prices.index)
+                    signal.analyzable = True
+                    timings[i] = result['elapsed']
+        finally:
+            if pool is not None:
+                pool.terminate()
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+        timings = {self.signals[i].name: timings[i] for i in sorted(timings)}
+        for name, elapsed in timings.items():
+            logger.info(f'Updated {name} in {elapsed:.2f}s')
+        return timings
+
+    async def run(self, notional: float, incremental: bool = False, processes: int = 1) -> None:
         """ Main entry point for running the portfolio. """
         self.notional = notional
         await self.fetch()
-        await self.update(notional)
+        await self.update(notional, processes, incremental)
         await self.run_benchmark(notional)
 
     async def backtest(self, notional: float) -> None:
@@ -1,15 +1,23 @@
+import copy
+import hashlib
+import json
 import warnings
 from overrides import overrides
+from pathlib import Path
 
 from src.analytics.signal import Signal
-from src.data import Yahoo
+from src.config import DATA_DIR
 from src.execution.analysis import Analysis
+from src.execution.loader import PRICES, DataLoader, Requirement
 from src.execution.plotting import *
 from src.execution.utils import *
 from src.utils.logger import logger
 
 warnings.simplefilter(action='ignore')
 
+# Incremental update state of each signal: price tail, notional, weights and positions of the last run.
+STATE_DIR = str(Path(DATA_DIR) / 'signals' / 'state')
+
 
 class BaseSignal:
 
@@ -31,36 +39,168 @@ class BaseSignal:
 class DailySignal(BaseSignal):
 
     def __init__(self) -> None:
-        self.prices = None
-        self.positions = None
+        self._prices = None
+        self._positions = None
+        self._notional = None
+        self._ledger = None
+        # Declared inputs by requirement name, handed over by Portfolio.fetch or loaded by fetch.
+        self.data: Dict[str, pd.DataFrame] = dict()
         self.weights = None
-        self.notional = None
         self.analyzable = False
 
+    # Accounting results are cached until prices, positions or notional are reassigned.
+
+    @property
+    def prices(self) -> Optional[pd.DataFrame]:
+        return self._prices
+
+    @prices.setter
+    def prices(self, prices: Optional[pd.DataFrame]) -> None:
+        self._prices = prices
+        self._ledger = None
+
+    @property
+    def positions(self) -> Optional[pd.DataFrame]:
+        return self._positions
+
+    @positions.setter
+    def positions(self, positions: Optional[pd.DataFrame]) -> None:
+        self._positions = positions
+        self._ledger = None
+
+    @property
+    def notional(self) -> Optional[float]:
+        return self._notional
+
+    @notional.setter
+    def notional(self, notional: Optional[float]) -> None:
+        self._notional = notional
+        self._ledger = None
+
     @property
     def tickers(self) -> List[str]:
         raise NotImplementedError()
 
+    @property
+    def requirements(self) -> List[Requirement]:
+        """ Inputs the signal needs before computing, daily close prices of its tickers by default.
+            Portfolio.fetch loads the requirements of all signals in one batch.
+        """
+        return [Requirement(PRICES, self.tickers)]
+
     async def fetch(self, force_update: bool = False) -> None:
         """ Fetch daily close prices for tickers. """
         if self.prices is None or force_update:
             logger.info(f'Fetching {self.name}')
             self.prices = await self._fetch()
 
+    def _loader(self) -> DataLoader:
+        return DataLoader()
+
     async def _fetch(self) -> pd.DataFrame:
-        return await Yahoo().daily(tickers=self.tickers)
+        self.data = await self._loader().resolve(self.requirements)
+        return self.data.get(PRICES)
+
+    async def input(self, name: str) -> pd.DataFrame:
+        """ A declared input. Inputs that were not handed over up front are loaded together on first use. """
+        if name not in self.data:
+            missing = [r for r in self.requirements
+                       if r.name not in self.data and not (r.name == PRICES and self.prices is not None)]
+            self.data.update(await self._loader().resolve(missing))
+        return self.data[name]
 
     def set_prices(self, prices: float) -> None:
         self.prices = prices[self.tickers]
 
-    async def update(self, notional: float) -> None:
+    @property
+    def lookback(self) -> Optional[int]:
+        """ Number of price rows, up to and including a date, that decide the weights and positions of that date.
+            None if they depend on the whole history, in which case every update recomputes it.
+        """
+        return None
+
+    async def update(self, notional: float, incremental: bool = False) -> None:
+        """
+        :param incremental: advance the state saved by the last incremental run with the rows that arrived since,
+                            only the last lookback + new rows of prices are computed. The history is recomputed when
+                            there is no usable state.
+        """
         self.notional = notional
-        await self._update(notional)
+        if not (incremental and await self._advance(notional)):
+            await self._update(notional)
+        if incremental:
+            self._write_state()
         self.analyzable = True
 
     async def _update(self, notional: float) -> None:
         raise NotImplementedError()
 
+    # -*- Incremental updates -*-
+
+    @property
+    def state_params(self) -> Dict[str, Any]:
+        """ Constructor parameters that change the weights or positions. They key the saved state, so a signal built
+            with other parameters never advances a history computed with these. Signals with parameters extend it.
+        """
+        return dict()
+
+    @property
+    def _state_file(self) -> Path:
+        key = json.dumps([self.name, list(self.tickers), self.lookback, self.state_params], sort_keys=True, default=str)
+        key = hashlib.sha1(key.encode()).hexdigest()
+        return Path(STATE_DIR) / f'{self.name}_{key[:12]}.pkl'
+
+    def _read_state(self) -> Optional[Dict[str, Any]]:
+        return pd.read_pickle(self._state_file) if self._state_file.exists() else None
+
+    def _write_state(self) -> None:
+        if self.lookback is None:
+            return
+        self._state_file.parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle(dict(notional=self.notional, tail=self.prices.iloc[-self.lookback:], weights=self.weights,
+                          positions=self.positions), self._state_file)
+
+    async def _advance(self, notional: float) -> bool:
+        """ Extend the saved weights and positions with the new rows, False if the history has to be recomputed. """
+        state = self._read_state() if self.lookback is not None else None
+        if state is None or state['notional'] != notional:
+            return False
+        tail, prices = state['tail'], self.prices
+        if not tail.columns.equals(prices.columns) or not tail.index.isin(prices.index).all() or \
+                not np.allclose(prices.loc[tail.index].values, tail.values, equal_nan=True):
+            logger.info(f'{self.name} prices were revised since the last run, recomputing the history')
+            return False
+        last = tail.index[-1]
+        new = int((prices.index > last).sum())
+        weights, positions = state['weights'], state['positions']
+        if new:
+            logger.info(f'Advancing {self.name} by {new} rows')
+            self.prices = prices.iloc[-(self.lookback + new):]
+            try:
+                await self._update(notional)
+            finally:
+                self.prices = prices
+            if weights is not None and self.weights is not None:
+                weights = pd.concat([weights, self.weights.loc[self.weights.index > last]])
+            positions = pd.concat([positions, self.positions.loc[self.positions.index > last]])
+        self.weights, self.positions = weights, positions
+        return True
+
+    async def check(self, notional: float) -> bool:
+        """ Consistency check of an incremental update: recompute the whole history and compare. """
+        def same(a: Optional[pd.DataFrame], b: Optional[pd.DataFrame]) -> bool:
+            if a is None or b is None:
+                return a is b
+            return a.index.equals(b.index) and a.columns.equals(b.columns) and a.dtypes.equals(b.dtypes) and \
+                np.allclose(a.values, b.values, equal_nan=True)
+
+        full = copy.copy(self)
+        await full._update(notional)
+        consistent = same(full.weights, self.weights) and same(full.positions, self.positions)
+        if not consistent:
+            logger.warning(f'{self.name} incremental update differs from the full recompute')
+        return consistent
+
     def get_trade_list(self, date: str) -> Dict[str, int]:
         try:
             logger.info(f'Getting trade list for {date}')
@@ -81,15 +221,25 @@ class DailySignal(BaseSignal):
     def signal(self) -> pd.Series:
         return pd.Series(self.prices.mul(self.weights).sum(axis=1), name=self.name)
 
+    def _accounting(self) -> Dict[str, pd.Series]:
+        """ Gross pnl, transaction cost, net pnl and returns from a single pass over the aligned arrays. """
+        if self._ledger is None:
+            pnl, tcost = ledger(self.positions, self.prices)
+            net_pnl = pnl.subtract(tcost, axis='index')
+            self._ledger = dict(
+                pnl=pd.Series(pnl, name=self.name),
+                tcost=pd.Series(tcost, name=self.name + '_TCost'),
+                net_pnl=pd.Series(net_pnl, name=self.name + '_Net'),
+                returns=pd.Series(pnl.div(self.notional), name=self.name).dropna(),
+                net_returns=pd.Series(net_pnl.div(self.notional), name=self.name + '_Net').dropna(),
+            )
+        return self._ledger
+
     @property
     def pnl(self) -> pd.Series:
         # PnL is calculated by the price difference between day t and day t-1 multiply day t-1's position.
         # Because the rebalance happens near market close.
-        return pd.Series(
-            self.prices.diff().mul(self.positions.shift())
-                .dropna(axis=1, how='all')  # Drop column whose values are all NaN.
-                .dropna()
-                .sum(axis=1), name=self.name)
+        return self._accounting()['pnl']
 
     @property
     def returns(self) -> pd.Series:
@@ -97,18 +247,18 @@ class DailySignal(BaseSignal):
 
     @property
     def tcost(self) -> pd.Series:
-        return pd.Series(txn_cost(self.positions, self.prices), name=self.name + '_TCost')
+        return self._accounting()['tcost']
 
     @property
     def net_pnl(self) -> pd.Series:
-        return pd.Series(self.pnl.subtract(self.tcost, axis='index'), name=self.name + '_Net')
+        return self._accounting()['net_pnl']
 
     @property
     def net_returns(self) -> pd.Series:
-        return pd.Series(self.net_pnl.div(self.notional), name=self.name + '_Net').dropna()
+        return self._accounting()['net_returns']
 
     def pct_return(self) -> pd.Series:
-        return pd.Series(self.pnl.div(self.notional), name=self.name).dropna()
+        return self._accounting()['returns']
 
     def yearly_stats(self, notional: bool = False, tcost: bool = False) -> pd.DataFrame:
         if tcost:
@@ -167,6 +317,10 @@ class Long(DailySignal):
     def tickers(self) -> List[str]:
         return [self.ticker]
 
+    @property
+    def lookback(self) -> Optional[int]:
+        return 1
+
     @overrides
     async def _update(self, notional) -> None:
         self.weights = pd.DataFrame([1] * len(self.prices), index=self.prices.index, columns=self.tickers)
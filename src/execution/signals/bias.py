@@ -1,13 +1,20 @@
+import copy
 import cvxpy as cp
+import hashlib
+import json
 import numpy as np
 import pandas as pd
 
+from multiprocessing import Pool, cpu_count, current_process
 from overrides import overrides
+from pathlib import Path
 from tqdm import tqdm
 from typing import *
 
+from src.config import DATA_DIR
 from src.signals.optimizer import optimize_min_vol
 from src.execution.signal import DailySignal
+from src.storage import LocalStorage
 from src.utils.logger import logger
 from src.utils.time import MarketCalendar, today
 
@@ -23,6 +30,8 @@ TICKERS = ETF + BIG_TECH + TECH + FINANCIAL_SERVICES
 FINANCIAL_SERVICES_WEIGHT = 0.35
 MIN_WEIGHT = 0.0001
 START_DATE = '2012-12-01'
+# Completed quarters' weights are persisted here, keyed by parameters and a fingerprint of the returns window.
+WEIGHT_CACHE_DIR = str(Path(DATA_DIR) / 'signals' / 'bias')
 
 
 def get_quarter_ends(start: str, end: str = None) -> List[str]:
@@ -42,7 +51,9 @@ class Bias(DailySignal):
                  lb: float = LB,
                  ub: float = UB,
                  window: float = WINDOW,
-                 fractional: bool = False) -> None:
+                 fractional: bool = False,
+                 cache: bool = True,
+                 parallel: bool = True) -> None:
         """
         :param tickers: a list of tickers included in the portfolio
         :param gamma: risk factor (the higher the more risk averse)
@@ -51,6 +62,8 @@ class Bias(DailySignal):
         :param window: look back window
         :param fractional: whether to enable fractional trading.
                            Fractional trading is not available with IB API.
+        :param cache: whether to reuse and persist the weights of completed quarters
+        :param parallel: whether to solve uncached quarters in a process pool
         """
         super().__init__()
         self.date = date
@@ -60,6 +73,8 @@ class Bias(DailySignal):
         self._ub = ub
         self._window = window
         self._fractional = fractional
+        self._cache = cache
+        self._parallel = parallel
 
     @property
     @overrides
@@ -68,13 +83,11 @@ class Bias(DailySignal):
 
     @overrides
     async def _update(self, notional: float) -> None:
+        # Market is not necessarily open on each business quarter end date.
         dates = get_quarter_ends(start=START_DATE, end=self.date)
-        weights = []
-        for date in tqdm(dates):
-            # Market is not necessarily open on each business quarter end date.
-            bq_end = MarketCalendar.most_recent_open_date(date)
-            w = self._compute_weight(bq_end)
-            weights.append(pd.DataFrame([w]))
+        dates = MarketCalendar.most_recent_open_dates(dates)
+        returns = self.prices.pct_change()
+        weights = [pd.DataFrame([w]) for w in self._quarter_weights(returns, dates)]
         # Remove rows that have all NaN values, and fill the rest NaN with 0.
         w = pd.concat(weights).dropna(how='all').fillna(0)
         self.weights = w.reindex(self.prices.index, method='ffill')
@@ -87,10 +100,41 @@ class Bias(DailySignal):
         """ Return weights for each quarter. """
         return self.weights.drop_duplicates().tail().sort_index(axis=1)
 
-    def _compute_weight(self, date: str) -> pd.Series:
-        returns = self.prices.pct_change()
+    def _quarter_weights(self, returns: pd.DataFrame, dates: List[str]) -> List[pd.Series]:
+        """ Weights for each quarter end. Completed quarters are served from the persisted history when the
+            parameters and the returns window are unchanged. The most recent quarter is always solved live.
+        """
+        windows = [self._window_returns(returns, date) for date in dates]
+        keys = [self._key(r) for r in windows]
+        history = self._read_history() if self._cache else dict()
+        live = len(dates) - 1
+        results = {i: self._to_weight(history[keys[i]], dates[i]) for i in range(live) if keys[i] in history}
+        missing = [i for i in range(len(dates)) if i not in results]
+        logger.info(f'{self.name}: {len(results)} quarters from history, solving {len(missing)}')
+        for i, w in zip(missing, self._solve([(dates[i], windows[i]) for i in missing])):
+            results[i] = w
+            if i != live:
+                history[keys[i]] = w.to_dict()
+        if self._cache and any(i != live for i in missing):
+            self._write_history(history)
+        return [results[i] for i in range(len(dates))]
+
+    def _solve(self, windows: List[Tuple[str, pd.DataFrame]]) -> List[pd.Series]:
+        # Pool workers (e.g. a Portfolio update) cannot start a pool of their own.
+        if not self._parallel or len(windows) <= 1 or current_process().daemon:
+            return [self._compute_weight(date, r) for date, r in tqdm(windows)]
+        # Ship a copy without the price history to the workers, each task only needs its returns window.
+        worker = copy.copy(self)
+        worker._prices, worker._positions, worker._ledger, worker.weights = None, None, None, None
+        with Pool(min(cpu_count(), len(windows))) as pool:
+            return pool.starmap(worker._compute_weight, windows)
+
+    @staticmethod
+    def _window_returns(returns: pd.DataFrame, date: str) -> pd.DataFrame:
         # Drop any ticker that has NaN in the past WINDOW days.
-        r = returns[returns.index <= date].tail(WINDOW).dropna(axis=1)
+        return returns[returns.index <= date].tail(WINDOW).dropna(axis=1)
+
+    def _compute_weight(self, date: str, r: pd.DataFrame) -> pd.Series:
         w = self._optimize(r)
         weights = pd.Series(w, index=r.columns, name=pd.Timestamp(date)).sort_values(ascending=False)
         # Remove tickers that have too little weight.
@@ -99,15 +143,45 @@ class Bias(DailySignal):
         weights = weights.div(weights.sum())
         return weights
 
+    @staticmethod
+    def _to_weight(data: Dict[str, float], date: str) -> pd.Series:
+        return pd.Series(data, name=pd.Timestamp(date), dtype=float).sort_values(ascending=False)
+
+    @property
+    def _params(self) -> str:
+        return json.dumps([self.name, self._tickers, self._gamma, self._lb, self._ub, WINDOW, MIN_WEIGHT])
+
+    def _key(self, r: pd.DataFrame) -> str:
+        """ Key of a quarter: parameters plus a fingerprint of the returns window (dates, tickers and values). """
+        h = hashlib.sha1(self._params.encode())
+        h.update(f'{r.index.min()}:{r.index.max()}'.encode())
+        h.update(','.join(r.columns).encode())
+        # Rounded so that float noise from re-adjusted prices does not invalidate the history.
+        h.update(np.ascontiguousarray(np.round(r.values, 10)).tobytes())
+        return h.hexdigest()
+
+    @property
+    def _history_file(self) -> str:
+        return f'{self.name}_weights.json'
+
+    def _read_history(self) -> Dict[str, Dict[str, float]]:
+        storage = LocalStorage(WEIGHT_CACHE_DIR)
+        if not (storage.data_dir / self._history_file).exists():
+            return dict()
+        return storage.read_json(self._history_file)
+
+    def _write_history(self, history: Dict[str, Dict[str, float]]) -> None:
+        LocalStorage(WEIGHT_CACHE_DIR).write_json(history, self._history_file)
+
     def _optimize(self, returns: pd.DataFrame) -> np.ndarray:
         """ Return an optimized weight matrix minimizing vol. """
         mu = returns.mean().T.values
         sigma = returns.cov()
         w = cp.Variable(mu.shape[0])
         tickers = list(returns.columns)
-        # List of constraints for BIAS.
+        # List of constraints for BIAS. Without extra constraints the cached problem template is re-solved.
         extra_constraints = self.constraints(w, tickers, returns)
-        return optimize_min_vol(mu, sigma, w=w, risk_factor=self._gamma,
+        return optimize_min_vol(mu, sigma, w=w if extra_constraints else None, risk_factor=self._gamma,
                                 w_lower=self._lb, w_upper=self._ub, constraints=extra_constraints)
 
     def constraints(self, w: cp.Variable, tickers: List[str], returns: pd.DataFrame) -> List:
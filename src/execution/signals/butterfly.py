@@ -16,6 +16,10 @@ class Butterfly(DailySignal):
     def tickers(self) -> List[str]:
         return ['QQQ', 'MDY', 'DIA', 'SPY']
 
+    @property
+    def lookback(self) -> Optional[int]:
+        return WINDOW + 1
+
     async def _update(self, notional: float) -> None:
         head = self.tickers[:-1]
         tail = self.tickers[-1:]
@@ -1,3 +1,4 @@
+import asyncio
 import numpy as np
 import pandas as pd
 
@@ -6,8 +7,11 @@ from typing import *
 
 from src.analytics.signal import Signal
 from src.analytics.ts import TimeSeries
-from src.config import CEF_TICKER_PATH
+from src.config import CEF_TICKER_PATH, COMPACT_PRICES
+from src.data import Yahoo
+from src.data.compact import compact as to_compact
 from src.data.fetcher import YahooDataFetcher
+from src.execution.loader import STORAGE, DataLoader, Requirement
 from src.storage import GCS
 from src.execution.signal import DailySignal
 from src.utils.logger import logger
@@ -16,6 +20,9 @@ from src.utils.time import MarketCalendar
 
 NOTIONAL = 100000
 START = '2012-01-01'
+SPREAD_WINDOW = 5
+# Same thresholds as DataQuality.pct_jump and DataQuality.pct_drop.
+MAX_JUMP, MAX_DROP = 1, 0.9
 # Outlier
 EXCLUDED = {'SRV', 'SRF'}
 # These symbols are not shortable on IB
@@ -30,12 +37,43 @@ NOT_SHORTABLE = {
 
 CEF_DATA = 'data/signals/closure/cef_close.parquet.gz'
 BASKET_DATA = 'data/signals/closure/basket_close.parquet.gz'
+CEF, BASKET = 'cef', 'basket'
+
+
+def last_valid(panel: pd.DataFrame) -> pd.Series:
+    """ Last date with a price for each column, NaT for empty columns. """
+    valid = panel.notna().values
+    rows = len(panel) - 1 - np.argmax(valid[::-1], axis=0)
+    dates = np.where(valid.any(axis=0), panel.index.values[np.maximum(rows, 0)], np.datetime64('NaT'))
+    return pd.Series(pd.DatetimeIndex(dates), index=panel.columns)
+
+
+def append(panel: pd.DataFrame, fresh: pd.DataFrame) -> pd.DataFrame:
+    """ Append fresh prices to a panel. Each column of fresh starts at the last stored date of that column: if the
+        two prices differ there, the adjusted history was revised since (e.g. by a distribution) and the stored history
+        is rescaled by the ratio.
+    """
+    fresh = fresh.dropna(how='all', axis=1)
+    last = last_valid(panel).reindex(fresh.columns).dropna()
+    old = panel.values[panel.index.get_indexer(last.values), panel.columns.get_indexer(last.index)]
+    rows = fresh.index.get_indexer(last.values)
+    new = np.where(rows >= 0, fresh.values[rows, fresh.columns.get_indexer(last.index)], np.nan)
+    ratio = pd.Series(new / old, index=last.index)
+    revised = ratio[np.isfinite(ratio) & ~np.isclose(ratio, 1, rtol=1e-8, atol=0)]
+    if len(revised):
+        logger.info(f'Rescaling revised history of {len(revised)} tickers')
+    panel = panel.reindex(index=panel.index.union(fresh.index),
+                          columns=panel.columns.append(fresh.columns.difference(panel.columns)))
+    panel[revised.index] = panel[revised.index] * revised
+    panel.update(fresh)
+    return panel
 
 
 class Closure(DailySignal):
 
-    def __init__(self):
+    def __init__(self, compact: bool = COMPACT_PRICES):
         super().__init__()
+        self.compact = compact
         self.storage = GCS()
         self._tickers = None
         self._cef_price = None
@@ -48,15 +86,35 @@ class Closure(DailySignal):
             self._tickers = [ticker for ticker in tickers if ticker not in EXCLUDED]
         return self._tickers
 
+    def _loader(self) -> DataLoader:
+        return DataLoader(self.storage)
+
+    @property
+    def lookback(self) -> Optional[int]:
+        # Yesterday's spread over its rolling mean and today's price.
+        return SPREAD_WINDOW + 1
+
+    @property
+    def state_params(self) -> Dict[str, Any]:
+        # float32 panels give slightly different weights.
+        return dict(super().state_params, compact=self.compact)
+
+    @property
+    def requirements(self) -> List[Requirement]:
+        # Prices are the stored CEF panel rather than a Yahoo request.
+        return [Requirement(CEF, source=STORAGE, path=CEF_DATA), Requirement(BASKET, source=STORAGE, path=BASKET_DATA)]
+
     async def fetch(self, date: str = None) -> None:
         if self.prices is None:
-            cef_price = self.storage.read_parquet(CEF_DATA)
-            basket_price = self.storage.read_parquet(BASKET_DATA)
+            cef_price = (await self.input(CEF)).copy()
+            basket_price = (await self.input(BASKET)).copy()
             na = cef_price.columns[cef_price.isnull().any()]
             cef_price, basket_price = TimeSeries._align_index([cef_price, basket_price])
             cols = list(set([col[1:-1] for col in list(basket_price.columns)]) & set(cef_price.columns) -
                         set(na) - NOT_SHORTABLE - EXCLUDED)
             basket_price, cef_price = basket_price[["X{}X".format(j) for j in cols]], cef_price[cols]
+            if self.compact:
+                basket_price, cef_price = to_compact(basket_price), to_compact(cef_price)
             logger.info(f'Closure effective number of tickers: {len(cols)}')
             self._basket_price = basket_price
             self._cef_price = cef_price
@@ -65,16 +123,54 @@ class Closure(DailySignal):
                 self._basket_price.loc[pd.Timestamp(date)] = None
             self.prices = cef_price
 
-    async def update(self, date: str, notional: float) -> Dict[str, float]:
-        """ Closure update generates a list of weights. """
-        await super().update(date, notional)
-        cef_price, basket_price = self._cef_price.copy(), self._basket_price.copy()
+    async def _update(self, notional: float) -> None:
+        # Rows of prices only, an incremental update passes the last lookback + new rows.
+        index = self.prices.index
+        cef_price, basket_price = self._cef_price.reindex(index), self._basket_price.reindex(index)
         spread = pd.DataFrame(np.log(cef_price).values - np.log(basket_price).values,
                               index=cef_price.index, columns=cef_price.columns)
-        self.weights = Signal.holdings(signal=spread.div(spread.rolling(5).mean(), axis=0), pad=False)
-        logger.error(self.weights)
+        self.weights = Signal.holdings(signal=spread.div(spread.rolling(SPREAD_WINDOW).mean(), axis=0), pad=False)
         self.positions = self.weights.mul(notional).div(cef_price).replace(np.inf, np.nan).fillna(0).round().astype(int)
-        return self.weights.loc[date].to_dict()
+
+    async def refresh(self, until: Optional[str] = None) -> None:
+        """ Append the trading days missing from the stored CEF and basket panels, up to the last completed session.
+            Only tickers behind are fetched, each from its last stored date. Use rebuild to download everything again.
+        """
+        until = pd.Timestamp(until or MarketCalendar.prev_open_date())
+        cef = self.tickers
+        basket = ["X{}X".format(ticker) for ticker in cef]
+        for name, tickers, path, check_quality in [(CEF, cef, CEF_DATA, True), (BASKET, basket, BASKET_DATA, False)]:
+            panel = await self.input(name)
+            behind = last_valid(panel).reindex(tickers)
+            behind = behind[~(behind >= until)].fillna(pd.Timestamp(START))
+            if behind.empty:
+                logger.info(f'{path} is up to date')
+                continue
+            groups = behind.groupby(behind).groups
+            logger.info(f'Refreshing {len(behind)} tickers of {path} from {len(groups)} start dates')
+            fresh = await asyncio.gather(*[self._fetch_since(list(names), start) for start, names in groups.items()])
+            fresh = [df for df in fresh if df is not None]
+            if not fresh:
+                continue
+            # Yahoo serves up to today, an intraday run would otherwise store today's partial bar.
+            fresh = pd.concat(fresh, axis=1).loc[:until]
+            panel = append(panel, fresh)
+            if check_quality:
+                pct = panel.loc[behind.min():, fresh.columns].pct_change()
+                moves = pct.columns[((pct > MAX_JUMP) | (pct < -MAX_DROP)).any()]
+                if len(moves):
+                    logger.warning(f'Big moves in refreshed {path}: {list(moves)}')
+            self.storage.write_parquet(panel, path, use_pyarrow=True)
+            self.data[name] = panel
+        # The next fetch rebuilds the prices from the refreshed panels.
+        self.prices = None
+
+    async def _fetch_since(self, tickers: List[str], start: pd.Timestamp) -> Optional[pd.DataFrame]:
+        try:
+            return await Yahoo().daily(tickers=tickers, start=str(start.date()), compact=False)
+        except Exception as e:
+            logger.warning(f'Failed to fetch {len(tickers)} tickers since {start.date()}: {e}')
+            return None
 
     async def _rebuild(self, name: str, tickers: List[str], data_path: str, check_quality: bool = True) -> None:
         logger.info(f'Rebuilding {data_path} with {len(tickers)} tickers.')
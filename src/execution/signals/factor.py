@@ -1,12 +1,13 @@
 import numpy as np
 import pandas as pd
-from typing import List
+from typing import List, Optional
 
-from src.data import Yahoo
+from src.execution.loader import PRICES, Requirement
 from src.execution.signal import DailySignal
 
 HEAD = ['USMV', 'DGRO', 'QUAL', 'MTUM']
 TAIL = ['VLUE', 'HDV']
+SPY = 'SPY'
 ANNUAL, MAX_VOL, WINDOW = 252, 0.2, 30
 
 
@@ -16,13 +17,23 @@ class Factor(DailySignal):
     def tickers(self) -> List[str]:
         return HEAD + TAIL
 
+    @property
+    def lookback(self) -> Optional[int]:
+        # SPY volatility comes from its own input, the spread needs today's return.
+        return 2
+
+    @property
+    def requirements(self) -> List[Requirement]:
+        # SPY volatility gates the spread.
+        return [Requirement(PRICES, self.tickers), Requirement(SPY, [SPY])]
+
     async def _update(self, notional: float) -> None:
         tickers = self.tickers
         returns = self.prices.pct_change().dropna()
         weights = dict(zip(HEAD + TAIL, [1 / len(HEAD)] * len(HEAD) + [-1 / len(TAIL)] * len(TAIL)))
         spread = returns.mul(weights).sum(axis=1)
-        spy_price = await Yahoo().daily(tickers=['SPY'])
-        spy_vol = (np.sqrt(ANNUAL) * spy_price.pct_change()['SPY'].rolling(WINDOW).std()).shift().loc[spread.index]
+        spy_price = await self.input(SPY)
+        spy_vol = (np.sqrt(ANNUAL) * spy_price.pct_change()[SPY].rolling(WINDOW).std()).shift().loc[spread.index]
         self.weights = pd.DataFrame([pd.Series(weights) for _ in spread.index], index=spread.index)
         positions = self.weights.mul(notional, axis=0).div(self.prices).dropna().round().astype(int)
         df = pd.concat([spy_vol, positions], axis=1)
@@ -1,17 +1,24 @@
 import itertools
 import numpy as np
 import pandas as pd
+import warnings
+from multiprocessing import Pool, cpu_count
 from overrides import overrides
-from typing import List
+from typing import *
 
 from src.analytics.signal import Signal
 from src.execution.signal import DailySignal
+from src.utils.fe import ANNUAL
 from src.utils.logger import logger
 
 MSCI = ['EWJ', 'EWZ', 'EWT', 'EWG', 'EWH', 'EWI', 'EWW', 'EWU', 'EWY',
         'EWA', 'EWM', 'EWS', 'EWC', 'EWP', 'EWL']
 ASIA = ['EWJ', 'EWT', 'EWH']
 WINDOW = 256
+WINDOWS = [2 ** i for i in range(1, 9)]
+
+# Read-only grid data for the search workers, set once per process by _init.
+_GRID: Dict[str, Any] = dict()
 
 
 def reversal(prices: pd.DataFrame, window: int = 5):
@@ -29,6 +36,15 @@ class GlobalReversalBase(DailySignal):
     def tickers(self) -> List[str]:
         return self._tickers
 
+    @property
+    def lookback(self) -> Optional[int]:
+        # The rolling max of the previous window rows and today's price.
+        return self.window + 1
+
+    @property
+    def state_params(self) -> Dict[str, Any]:
+        return dict(super().state_params, window=self.window)
+
     @overrides
     async def _update(self, notional: float) -> None:
         signal = reversal(self.prices, self.window)
@@ -42,39 +58,118 @@ class GlobalReversal(GlobalReversalBase):
         super().__init__(ASIA, WINDOW)
 
 
-async def search(notional: float):
+def _shift_valid(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """ Shift (window, date, ticker) values by one valid row along the date axis, as a shift after dropna. """
+    rows = np.arange(values.shape[1])
+    last = np.maximum.accumulate(np.where(valid, rows, -1), axis=1)
+    prev = np.concatenate([np.full((len(last), 1), -1), last[:, :-1]], axis=1)
+    shifted = np.take_along_axis(values, np.maximum(prev, 0)[:, :, None], axis=1)
+    shifted[~valid | (prev < 0)] = np.nan
+    return shifted
+
+
+def _yearly(returns: np.ndarray, rows: np.ndarray, years: np.ndarray) -> Dict[str, np.ndarray]:
+    """ Analysis.yearly_stats for every window at once. Returns (window, year) arrays, NaN for absent years. """
+    bounds = np.flatnonzero(np.diff(years)) + 1
+    stats = {key: [] for key in ['Sharpe', 'Win', 'Max', 'Min', 'Return']}
+    for sl in np.split(np.arange(len(years)), bounds):
+        x, m = returns[:, sl], rows[:, sl]
+        n = m.sum(axis=1)
+        mean = np.where(m, x, 0).sum(axis=1) / n
+        std = np.sqrt(np.where(m, (x - mean[:, None]) ** 2, 0).sum(axis=1) / (n - 1))
+        pos, neg = (m & (x > 0)).sum(axis=1), (m & (x < 0)).sum(axis=1)
+        stats['Sharpe'].append(np.sqrt(ANNUAL) * mean / std)
+        stats['Win'].append(np.where((pos > 0) & (neg > 0), pos / (pos + neg), np.nan))
+        stats['Max'].append(np.where(m, x, -np.inf).max(axis=1))
+        stats['Min'].append(np.where(m, x, np.inf).min(axis=1))
+        stats['Return'].append(np.where(m, 1 + x, 1).prod(axis=1) - 1)
+        for key in stats:
+            stats[key][-1] = np.where(n > 0, stats[key][-1], np.nan)
+    return {key: np.round(np.stack(values, axis=1), 4) for key, values in stats.items()}
+
+
+def evaluate(prices: np.ndarray, signals: np.ndarray, years: np.ndarray, notional: float) -> Dict[str, np.ndarray]:
+    """ Backtest GlobalReversalBase for all windows of one ticker combination as tensor operations.
+
+    :param prices: (date, ticker) prices of the combination
+    :param signals: (window, date, ticker) reversal signals of the combination
+    :param years: year of each date
+    :return: average yearly stats per window, the best Sharpe year excluded from the Sharpe average
+    """
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        z = (signals - np.nanmean(signals, axis=2, keepdims=True)) / np.nanstd(signals, axis=2, ddof=1, keepdims=True)
+        weights = z / np.nansum(np.abs(z), axis=2, keepdims=True)
+        weights = np.concatenate([np.full_like(weights[:, :1], np.nan), weights[:, :-1]], axis=1)
+        positions = weights * notional / prices[None]
+        valid = ~np.isnan(positions).any(axis=2)
+        positions = np.round(positions)
+
+        gross = np.diff(prices, axis=0, prepend=np.nan)[None] * _shift_valid(positions, valid)
+        finite = ~np.isnan(gross)
+        keep = finite.any(axis=1, keepdims=True)
+        rows = (finite | ~keep).all(axis=2)
+        returns = np.where(keep, np.nan_to_num(gross), 0).sum(axis=2) / notional
+
+        stats = _yearly(returns, rows, years)
+        sharpe = stats['Sharpe'].copy()
+        best = np.nanargmax(np.where(np.isnan(sharpe), -np.inf, sharpe), axis=1)
+        sharpe[np.arange(len(sharpe)), best] = np.nan
+        return dict(
+            Sharpe=np.nanmean(sharpe, axis=1),
+            **{key: np.nanmean(stats[key], axis=1) for key in ['Return', 'Min', 'Max', 'Win']},
+        )
+
+
+def _init(grid: Dict[str, Any]) -> None:
+    _GRID.update(grid)
+
+
+def _evaluate(columns: Tuple[int, ...]) -> List[Dict[str, Any]]:
+    cols = list(columns)
+    result = evaluate(_GRID['prices'][:, cols], _GRID['signals'][:, :, cols], _GRID['years'], _GRID['notional'])
+    tickers = [_GRID['tickers'][i] for i in cols]
+    return [dict(Pair=tickers, Window=window, **{key: values[i] for key, values in result.items()})
+            for i, window in enumerate(_GRID['windows']) if result['Sharpe'][i] >= _GRID['min_sharpe']]
+
+
+def grid_search(prices: pd.DataFrame,
+                notional: float,
+                sizes: Iterable[int],
+                windows: List[int] = WINDOWS,
+                min_sharpe: float = 1,
+                processes: Optional[int] = None) -> pd.DataFrame:
+    """ Rank every ticker combination x window by average yearly Sharpe.
+        Reversal signals are computed once for all tickers and windows; each worker evaluates all windows of a
+        combination at once and results are collected as they complete.
+    """
+    grid = dict(
+        prices=prices.values.astype(float),
+        signals=np.stack([reversal(prices, window).values for window in windows]),
+        years=prices.index.year.values,
+        tickers=list(prices.columns),
+        windows=list(windows),
+        notional=notional,
+        min_sharpe=min_sharpe,
+    )
+    data, processes = [], processes or cpu_count()
+    with Pool(processes, initializer=_init, initargs=(grid,)) as pool:
+        for n in sizes:
+            combos = list(itertools.combinations(range(prices.shape[1]), n))
+            logger.info(f'Searching {len(combos)} combinations of {n} with {len(windows)} windows.')
+            chunksize = max(1, len(combos) // (4 * processes))
+            for rows in pool.imap_unordered(_evaluate, combos, chunksize=chunksize):
+                data.extend(rows)
+            logger.info(f'Finished combinations of {n} with cumulative size {len(data)}')
+    columns = ['Pair', 'Window', 'Sharpe', 'Return', 'Min', 'Max', 'Win']
+    return pd.DataFrame(data, columns=columns).sort_values('Sharpe', ascending=False).reset_index(drop=True)
+
+
+async def search(notional: float,
+                 sizes: Iterable[int] = range(2, len(MSCI)),
+                 windows: List[int] = WINDOWS,
+                 processes: Optional[int] = None) -> pd.DataFrame:
     """ Find the optimal symbol and window combination. """
     self = GlobalReversalBase(MSCI)
     await self.fetch()
-    prices = self.prices
-    dfs = []
-    for n in range(2, len(MSCI)):
-        data = []
-        pairs = list(itertools.combinations(MSCI, n))
-        logger.info(f'Generating {n} with {len(pairs)} pairs.')
-        for i in range(1, 9):
-            window = 2 ** i
-            logger.info(f'Generating with window size: {window}')
-            for pair in pairs:
-                tickers = list(pair)
-                signal = GlobalReversalBase(tickers, window)
-                signal.prices = prices[tickers]
-                await signal.update(notional)
-                stats = signal.yearly_stats()
-                avg_sharpe = stats['Sharpe'].drop(stats['Sharpe'].idxmax()).mean()
-                if avg_sharpe >= 1:
-                    info = dict(
-                        Pair=tickers,
-                        Window=window,
-                        Sharpe=avg_sharpe,
-                        Return=stats['Return'].mean(),
-                        Min=stats['Min'].mean(),
-                        Max=stats['Max'].mean(),
-                        Win=stats['Win'].mean(),
-                    )
-                    data.append(info)
-            logger.info(f'Finished window size {i} with cumulative size {len(data)}')
-        df = pd.DataFrame(data)
-        print(df.head())
-        dfs.append(df)
-    return pd.concat(dfs)
+    return grid_search(self.prices[MSCI], notional, sizes, windows, processes=processes)
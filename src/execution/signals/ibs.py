@@ -3,7 +3,7 @@ import pandas as pd
 
 from typing import *
 
-from src.data import Yahoo
+from src.execution.loader import PRICES, Requirement
 from src.execution.signal import DailySignal
 
 KEYS = ['Close', 'High', 'Low']
@@ -21,13 +21,23 @@ class IBS(DailySignal):
     def tickers(self) -> List[str]:
         return TICKERS
 
+    @property
+    def lookback(self) -> Optional[int]:
+        # The bar inputs are not truncated, only today's price is needed.
+        return 1
+
+    @property
+    def requirements(self) -> List[Requirement]:
+        # The daily bar of the first ticker drives the signal.
+        return [Requirement(PRICES, self.tickers)] + [Requirement(key, self.tickers[:1], field=key) for key in KEYS]
+
     async def _update(self, notional: float) -> None:
         tickers = self.tickers
         HEAD = tickers[0]
-        [close, high, low] = [await Yahoo().daily(tickers=[HEAD], field=key) for key in KEYS]
-        prices = await Yahoo().daily(tickers=tickers)
-        data = pd.concat([close[HEAD], high[HEAD], low[HEAD]], keys=KEYS, axis=1)
-        signal = ibs(data).shift().to_frame().rename(columns={0: 'signal'})
+        prices = self.prices
+        data = pd.concat([(await self.input(key))[HEAD] for key in KEYS], keys=KEYS, axis=1)
+        # The bars may cover more days than the prices, e.g. in an incremental update.
+        signal = ibs(data).shift().reindex(prices.index).to_frame().rename(columns={0: 'signal'})
         self.weights = pd.DataFrame([pd.Series(WEIGHTS) for _ in signal.index], index=signal.index)
         positions = self.weights.mul(notional, axis=0).div(prices).dropna().round().astype(int)
         df = pd.concat([signal, positions], axis=1)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from src.execution.signal import DailySignal
 
 TICKERS = ['PALL', 'SGOL', 'GLTR', 'PPLT', 'SIVR']
@@ -13,6 +13,11 @@ class Ironman(DailySignal):
     def tickers(self) -> List[str]:
         return TICKERS
 
+    @property
+    def lookback(self) -> Optional[int]:
+        # Yesterday's correlation of HEDGE_WINDOW returns and today's price.
+        return HEDGE_WINDOW + 2
+
     async def _update(self, notional: float) -> None:
         betas = -self.prices\
             .pct_change().dropna()\
@@ -43,9 +43,7 @@ class Levarb(DailySignal):
                 pass
         signal = pd.DataFrame(signal_dict).dropna()
         # TODO: fix division by zero error
-        signal = signal.div(
-            pd.concat([TimeSeries.ewma(abs(signal[col]), halflife=HALFLIFE) for col in signal.columns], axis=1,
-                      keys=signal.columns))
+        signal = signal.div(TimeSeries.ewma(signal.abs(), halflife=HALFLIFE))
         self.weights = Signal().holdings(signal=signal, pad=False)
         self.prices = self.prices.drop('SPY', axis=1)
         # TODO: due to division by zero error the positions can have NaN value.
@@ -1,8 +1,12 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from datetime import datetime
 from typing import *
 
+from src.analytics.sweep import SignalSweep
+from src.execution.analysis import Analysis
+from src.execution.plotting import plot_cumulative_returns, plot_cumulative_returns_by_year
 from src.execution.signal import DailySignal
 
 
@@ -43,19 +47,19 @@ class Patience(DailySignal):
         """ Note: only run this after await self.fetch(). """
         ((self.prices - self.prices.cummax()) / self.prices.cummax()).plot()
 
-    async def show_performance(self, notional: float = 10000, yearly: bool = False):
+    async def show_performance(self, notional: float = 10000, yearly: bool = False, processes: Optional[int] = None):
         """ Display in Jupyter notebook the effect of different thresholds. """
         from src.utils.jupyter import display_dfs
         await self.fetch()
         thresholds = [-0.05, -0.1, -0.15, -0.2, -0.25, -0.3]
-        sharpes = []
-        returns = []
-        for threshold in thresholds:
-            self.threshold = threshold
-            await self.update(notional)
-            self.cumulative_returns(yearly=yearly)
-            stats = self.yearly_stats()
-            sharpes.append(pd.Series(stats.Sharpe, name=str(threshold)))
-            returns.append(pd.Series(stats.Return, name=str(threshold)))
+        sweep = SignalSweep(Patience, {'threshold': thresholds}, notional, processes=processes, ticker=self._ticker)
+        summary = await sweep.run(self.prices)
+        returns = sweep.returns()
+        if yearly:
+            plot_cumulative_returns_by_year(returns)
+        else:
+            plot_cumulative_returns(returns.loc[str(datetime.today().year)])
         plt.legend([str(t) for t in thresholds])
-        display_dfs([pd.DataFrame(sharpes).T, pd.DataFrame(returns).T], ['Sharpe', 'Return'])
+        stats = Analysis.yearly_stats(returns)
+        sharpes, returns = stats.xs('Sharpe', axis=1, level=1), stats.xs('Return', axis=1, level=1)
+        display_dfs([sharpes, returns, summary], ['Sharpe', 'Return', 'Summary'])
@@ -2,6 +2,7 @@ import itertools
 import pandas as pd
 from typing import List
 
+from src.analytics.rolling import rolling_corr
 from src.analytics.signal import Signal
 from src.execution.signal import DailySignal
 
@@ -19,13 +20,13 @@ class Slope(DailySignal):
 
     async def _update(self, notional: float) -> None:
         target = pd.DataFrame(0, index=self.prices.index, columns=self.tickers)
-        pairs = [list(pair) for pair in list(itertools.combinations(list(self.prices.columns), 2))]
+        pairs = list(itertools.combinations(list(self.prices.columns), 2))
         returns = self.prices.pct_change()
-        corr = 1 / returns.rolling(HEDGE_WINDOW).corr()
+        corr = rolling_corr(returns, pairs, HEDGE_WINDOW)
         for pair in pairs:
-            sub = returns[pair].dropna()
+            sub = returns[list(pair)].dropna()
             leg_1, leg_2 = pair
-            hr = corr.xs(leg_1, level=1)[leg_2]
+            hr = 1 / corr[pair]
             signal = sub[leg_2] - hr * sub[leg_1]
             holdings = Signal.holdings(signal=signal, xs=False, threshold=THRESHOLD)
             target[leg_2] += holdings
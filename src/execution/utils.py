@@ -89,12 +89,63 @@ def round_2(num: float) -> float:
     return round(num, 2)
 
 
+def _diff(values: np.ndarray) -> np.ndarray:
+    out = np.empty(values.shape)
+    out[:1] = np.nan
+    np.subtract(values[1:], values[:-1], out=out[1:])
+    return out
+
+
+def _shift(values: np.ndarray) -> np.ndarray:
+    out = np.empty(values.shape)
+    out[:1] = np.nan
+    out[1:] = values[:-1]
+    return out
+
+
+def _reindex(values: np.ndarray, index: pd.Index, columns: pd.Index,
+             new_index: pd.Index, new_columns: pd.Index) -> np.ndarray:
+    """ Reindex a 2D float array by labels, filling missing labels with NaN. """
+    if values.size == 0:
+        return np.full((len(new_index), len(new_columns)), np.nan)
+    if not index.equals(new_index):
+        rows = index.get_indexer(new_index)
+        values = values.take(np.maximum(rows, 0), axis=0)
+        values[rows < 0] = np.nan
+    if not columns.equals(new_columns):
+        cols = columns.get_indexer(new_columns)
+        values = values.take(np.maximum(cols, 0), axis=1)
+        values[:, cols < 0] = np.nan
+    return values
+
+
+def gross_pnl(positions: pd.DataFrame, prices: pd.DataFrame) -> pd.Series:
+    """ PnL is the price difference between day t and day t-1 multiplied by day t-1's position, computed on the
+        union of both frames. Columns that are all NaN are ignored and dates with any missing value are dropped.
+    """
+    index, columns = prices.index.union(positions.index), prices.columns.union(positions.columns)
+    gross = _reindex(_diff(np.asarray(prices.values, dtype=float)), prices.index, prices.columns, index, columns) * \
+        _reindex(_shift(np.asarray(positions.values, dtype=float)), positions.index, positions.columns, index, columns)
+    valid = ~np.isnan(gross)
+    keep = valid.any(axis=0)
+    rows = valid[:, keep].all(axis=1)
+    return pd.Series(gross[rows][:, keep].sum(axis=1), index=index[rows])
+
+
 def txn_cost(positions: pd.DataFrame, prices: pd.DataFrame, threshold: int = 5) -> pd.Series:
     """ Calculate transaction cost based on IB's pricing model. """
-    qty = positions.diff().abs().dropna()
-    notional = qty.mul(prices).dropna()
-    min_cost = pd.DataFrame(1.0, index=qty.index, columns=qty.columns)
-    share_cost = qty.mul(0.005)
-    notional_cost = notional.mul(0.01)
-    cost = min_cost.combine(share_cost.combine(notional_cost, np.minimum), np.maximum)
-    return pd.DataFrame(np.where(qty > threshold, cost, 0.0), index=qty.index, columns=qty.columns).sum(axis=1)
+    traded = np.abs(_diff(np.asarray(positions.values, dtype=float)))
+    rows = ~np.isnan(traded).any(axis=1)
+    traded = traded[rows]
+    index = positions.index[rows]
+    price = _reindex(np.asarray(prices.values, dtype=float), prices.index, prices.columns, index, positions.columns)
+    cost = np.maximum(1.0, np.minimum(traded * 0.005, traded * price * 0.01))
+    cost = np.where(traded > threshold, cost, 0.0)
+    # Dates without a complete price row have no notional, hence no cost.
+    cost[np.isnan(price).any(axis=1)] = 0.0
+    return pd.Series(cost.sum(axis=1), index=index)
+
+
+def ledger(positions: pd.DataFrame, prices: pd.DataFrame, threshold: int = 5) -> Tuple[pd.Series, pd.Series]:
+    """ Gross PnL and transaction cost from one set of aligned NumPy arrays. """
+    return gross_pnl(positions, prices), txn_cost(positions, prices, threshold)
@@ -5,12 +5,7 @@ from src.constant import *
 
 
 def reversal(prices: pd.DataFrame, notional: int = 10000, window: int = 20) -> pd.DataFrame:
-    universe = list(prices.keys())
-    signals = []
-    for symbol in universe:
-        signal = -(prices[symbol] - TimeSeries.ewma(prices[symbol], window))
-        signals.append(signal)
-    signal = pd.concat(signals, axis=1, keys=universe)
+    signal = -(prices - TimeSeries.ewma(prices, window))
     # TODO: handle missing bar values (ffill)
     holdings = Signal.holdings(signal, xs=True, pad=False)
     positions = holdings.mul(notional).div(prices).round().dropna()
@@ -2,6 +2,7 @@ import cvxpy as cp
 import numpy as np
 import pandas as pd
 
+from functools import lru_cache
 from typing import *
 
 __author__ = 'kqureshi'
@@ -12,14 +13,193 @@ def check_dcp(prob: cp.Problem) -> None:
         raise Exception(f'Problem is not DCP. Please make sure the input data does not contain NaN.')
 
 
+class Template:
+    """
+    A compiled-once cvxpy problem. Data enters through cp.Parameters so that re-solving with new values skips
+    canonicalization, and the previous solution is used as a warm start.
+    """
+
+    def __init__(self, problem: cp.Problem, w: cp.Variable, **params: cp.Parameter):
+        if not problem.is_dcp(dpp=True):
+            raise Exception(f'Template problem is not DPP.')
+        self.problem = problem
+        self.w = w
+        self.params = params
+
+    def solve(self, solver: Optional[str] = None, **values: Any) -> np.ndarray:
+        for name, value in values.items():
+            self.params[name].value = value
+        self.problem.solve(solver=solver, warm_start=True)
+        return self.w.value
+
+
+def factor(sigma: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+    """
+    Square root F of a covariance matrix such that sigma = F @ F.T, so that w' sigma w = ||F.T @ w||^2.
+    Negative eigenvalues from numerical noise are clipped to zero.
+    """
+    sigma = np.asarray(sigma, dtype=float)
+    sigma = (sigma + sigma.T) / 2
+    values, vectors = np.linalg.eigh(sigma)
+    return vectors * np.sqrt(np.clip(values, 0, None))
+
+
+@lru_cache(maxsize=None)
+def min_variance_template(n: int, min_ret: bool = False) -> Template:
+    """
+    minimize ||F.T @ w||^2 s.t. sum(w) == 1, lb <= w <= ub (and mu @ w >= r if min_ret)
+    Cached per (dimension, constraint set).
+    """
+    w = cp.Variable(n)
+    F = cp.Parameter((n, n))
+    lb, ub = cp.Parameter(), cp.Parameter()
+    constraints = [cp.sum(w) == 1, w >= lb, w <= ub]
+    params = dict(F=F, lb=lb, ub=ub)
+    if min_ret:
+        mu, r = cp.Parameter(n), cp.Parameter()
+        constraints.append(mu @ w >= r)
+        params.update(mu=mu, r=r)
+    return Template(cp.Problem(cp.Minimize(cp.sum_squares(F.T @ w)), constraints), w, **params)
+
+
+@lru_cache(maxsize=None)
+def mean_variance_template(n: int) -> Template:
+    """
+    maximize mu @ w - ||F.T @ w||^2 s.t. sum(w) == 1, lb <= w <= ub
+    The risk aversion is folded into F (F = sqrt(gamma) * factor(sigma)) to keep the problem DPP.
+    """
+    w = cp.Variable(n)
+    F, mu = cp.Parameter((n, n)), cp.Parameter(n)
+    lb, ub = cp.Parameter(), cp.Parameter()
+    prob = cp.Problem(cp.Maximize(mu @ w - cp.sum_squares(F.T @ w)), [cp.sum(w) == 1, w >= lb, w <= ub])
+    return Template(prob, w, F=F, mu=mu, lb=lb, ub=ub)
+
+
+def project(v: np.ndarray, lb: float, ub: float) -> np.ndarray:
+    """
+    Euclidean projection of v onto {w: sum(w) == 1, lb <= w <= ub}. The projection is clip(v - tau, lb, ub) for the
+    shift tau at which it sums to one; the sum is piecewise linear in tau so tau is interpolated exactly between
+    the two bracketing breakpoints.
+    """
+    taus = np.sort(np.concatenate([v - lb, v - ub]))
+    sums = np.minimum(np.maximum(v[None, :] - taus[:, None], lb), ub).sum(axis=1)
+    k = min(max(int(np.searchsorted(-sums, -1.0)), 1), len(taus) - 1)
+    t0, t1, s0, s1 = taus[k - 1], taus[k], sums[k - 1], sums[k]
+    tau = t0 if s0 == s1 else t0 + (s0 - 1) * (t1 - t0) / (s0 - s1)
+    return np.minimum(np.maximum(v - tau, lb), ub)
+
+
+def _polish(Q: np.ndarray, c: np.ndarray, w: np.ndarray, lb: float, ub: float, tol: float) -> Optional[np.ndarray]:
+    """
+    Solve the KKT system exactly on the active set guessed from w. Returns None if the guess is not optimal.
+    """
+    at_lb, at_ub = w <= lb + tol, w >= ub - tol
+    free = ~(at_lb | at_ub)
+    fixed = np.where(at_lb, lb, ub)
+    x = np.where(free, 0.0, fixed)
+    if free.any():
+        m = int(free.sum())
+        kkt = np.zeros((m + 1, m + 1))
+        kkt[:m, :m] = Q[np.ix_(free, free)]
+        kkt[:m, m] = kkt[m, :m] = 1
+        rhs = np.append(c[free] - Q[np.ix_(free, ~free)] @ x[~free], 1 - x[~free].sum())
+        try:
+            solution = np.linalg.solve(kkt, rhs)
+        except np.linalg.LinAlgError:
+            return None
+        x[free] = solution[:m]
+        nu = solution[m]
+        if (x[free] < lb - tol).any() or (x[free] > ub + tol).any():
+            return None
+        # Multipliers of the bounds must be non-negative.
+        slack = Q @ x - c + nu
+        if (slack[at_lb] < -tol).any() or (slack[at_ub] > tol).any():
+            return None
+    else:
+        # A vertex: any nu with -g <= nu on the lower bounds and nu <= -g on the upper bounds certifies it.
+        g = Q @ x - c
+        if abs(x.sum() - 1) > tol or (-g[at_lb]).max(initial=-np.inf) > (-g[at_ub]).min(initial=np.inf) + tol:
+            return None
+    return np.clip(x, lb, ub)
+
+
+def solve_box_qp(Q: np.ndarray,
+                 c: np.ndarray,
+                 lb: float,
+                 ub: float,
+                 tol: float = 1e-9,
+                 max_iter: int = 5000) -> Optional[np.ndarray]:
+    """
+    minimize 0.5 * w' Q w - c' w s.t. sum(w) == 1, lb <= w <= ub
+
+    Accelerated projected gradient (FISTA with adaptive restart) identifies the active bounds and an exact KKT solve
+    on that active set finishes the job once the active set stops changing. Returns None if the problem is
+    infeasible or did not converge so that the caller can fall back to cvxpy.
+    """
+    Q, c = np.asarray(Q, dtype=float), np.asarray(c, dtype=float).reshape(-1)
+    n = c.shape[0]
+    if n * lb > 1 + tol or n * ub < 1 - tol or not np.isfinite(Q).all() or not np.isfinite(c).all():
+        return None
+    L = np.linalg.eigvalsh(Q)[-1]
+    if L <= 0:
+        return None
+    step = 1 / L
+    w = project(np.full(n, 1 / n), lb, ub)
+    y, t = w.copy(), 1.0
+    active, tried = None, set()
+    for _ in range(max_iter):
+        w_next = project(y - step * (Q @ y - c), lb, ub)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        if (y - w_next) @ (w_next - w) > 0:
+            # Restart the momentum when it points uphill.
+            y, t = w_next.copy(), 1.0
+        else:
+            y, t = w_next + (t - 1) / t_next * (w_next - w), t_next
+        w = w_next
+        previous, active = active, ((w <= lb) | (w >= ub)).tobytes() + (w >= ub).tobytes()
+        if active == previous and active not in tried:
+            tried.add(active)
+            x = _polish(Q, c, w, lb, ub, tol=tol)
+            if x is not None:
+                return x
+    return None
+
+
+def min_variance(sigma: Union[pd.DataFrame, np.ndarray], lb: float, ub: float) -> np.ndarray:
+    """
+    Long-only minimum variance weights, solved with solve_box_qp and falling back to the cvxpy template.
+    """
+    sigma = np.asarray(sigma, dtype=float)
+    w = solve_box_qp(2 * sigma, np.zeros(sigma.shape[0]), lb, ub)
+    if w is None:
+        w = min_variance_template(sigma.shape[0]).solve(F=factor(sigma), lb=lb, ub=ub)
+    return w
+
+
+def mean_variance(mu: np.ndarray,
+                  sigma: Union[pd.DataFrame, np.ndarray],
+                  gamma: float,
+                  lb: float,
+                  ub: float) -> np.ndarray:
+    """
+    maximize mu' w - gamma * w' sigma w, solved with solve_box_qp and falling back to the cvxpy template.
+    """
+    mu, sigma = np.asarray(mu, dtype=float).reshape(-1), np.asarray(sigma, dtype=float)
+    w = solve_box_qp(2 * gamma * sigma, mu, lb, ub)
+    if w is None:
+        w = mean_variance_template(mu.shape[0]).solve(F=np.sqrt(gamma) * factor(sigma), mu=mu, lb=lb, ub=ub)
+    return w
+
+
 def optimize_risk_adj_return(mu: np.ndarray,
                              sigma: np.ndarray,
                              w: cp.Variable = None,
                              risk_factor: float = 0.075,
                              w_lower: float = 0.01,
                              w_upper: float = 0.15) -> np.ndarray:
+    mu = np.asarray(mu, dtype=float).reshape(-1)
     if w is None:
-        w = cp.Variable(mu.shape[0])
+        return mean_variance(mu, sigma, risk_factor, w_lower, w_upper)
     gamma = cp.Parameter(value=risk_factor, nonneg=True)
     ret = mu.T @ w
     risk = cp.quad_form(w, sigma)
@@ -40,6 +220,13 @@ def optimize_min_vol(mu: np.ndarray,
                      w_lower: float = 0.0,
                      w_upper: float = 0.1,
                      constraints: List = None) -> np.ndarray:
+    """
+    Minimum variance weights. Without a custom variable or extra constraints the dedicated box QP solver is used;
+    extra constraints are bound to the caller's variable so they go through a freshly built cvxpy problem.
+    """
+    if w is None and not constraints:
+        # The risk factor only scales the objective so it does not change the minimizer.
+        return min_variance(sigma, w_lower, w_upper)
     if w is None:
         w = cp.Variable(mu.shape[0])
     if constraints is None:
@@ -1,14 +1,19 @@
 import arrow
 import asyncio
 import contextlib
+import numpy as np
+import os
 import pandas as pd
 import pandas_market_calendars as mcal
 import pytz
 import time
 
 from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
 from pandas.tseries.offsets import BDay
+from pathlib import Path
 from typing import *
+from src.config import DATA_DIR, PERSIST_SESSIONS
 from src.utils.logger import logger
 
 EST = pytz.timezone("US/Eastern")
@@ -16,6 +21,9 @@ PST = pytz.timezone("US/Pacific")
 NYSE = mcal.get_calendar('NYSE')
 ISO_FORMAT = '%Y-%m-%d'
 COMPACT_FORMAT = '%Y%m%d'
+SESSION_START = '1990-01-01'
+SESSION_END = '2040-12-31'
+SESSION_CACHE = Path(DATA_DIR) / 'calendar' / 'nyse_sessions.parquet'
 
 
 def to_est(timestamp: datetime) -> str:
@@ -130,6 +138,107 @@ def _sanitize(timestamp: Any) -> pd.Timestamp:
     return ts
 
 
+class Sessions:
+    """ NYSE sessions as sorted numpy arrays so that every lookup is a searchsorted.
+        Dates are the local session dates, opens and closes are naive UTC datetime64[ns].
+        Every method takes a scalar or an array of dates/timestamps and returns an array.
+
+        Usage:
+        >>> sessions().previous(['2020-07-04', '2020-07-06'])
+        >>> sessions().open_at(pd.Timestamp('2020-01-02 09:30:00', tz='US/Eastern'))
+    """
+
+    def __init__(self, schedule: pd.DataFrame):
+        self.schedule = schedule
+        self.dates = schedule.index.values.astype('datetime64[D]')
+        self.opens = schedule['market_open'].dt.tz_convert('UTC').dt.tz_localize(None).values
+        self.closes = schedule['market_close'].dt.tz_convert('UTC').dt.tz_localize(None).values
+
+    @classmethod
+    def build(cls, start: str = SESSION_START, end: str = SESSION_END, path: Optional[Path] = None) -> 'Sessions':
+        """ Build the session table from the exchange calendar, read from / written to path if given. """
+        if path is not None and os.path.exists(path):
+            return cls(pd.read_parquet(path))
+        schedule = NYSE.schedule(start, end)[['market_open', 'market_close']]
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            schedule.to_parquet(path)
+        return cls(schedule)
+
+    @staticmethod
+    def _days(dates: Any) -> np.ndarray:
+        """ Local calendar day of each date, i.e. the timezone is dropped without conversion. """
+        values = dates if isinstance(dates, (pd.Index, pd.Series, np.ndarray, list, tuple)) else [dates]
+        try:
+            index = pd.DatetimeIndex(values)
+            if index.tz is not None:
+                index = index.tz_localize(None)
+        except (TypeError, ValueError):
+            # Mixed utc offsets.
+            index = pd.DatetimeIndex([pd.Timestamp(d).tz_localize(None) for d in values])
+        return index.values.astype('datetime64[D]')
+
+    @staticmethod
+    def _utc(timestamps: Any) -> np.ndarray:
+        values = timestamps if isinstance(timestamps, (pd.Index, pd.Series, np.ndarray, list, tuple)) else [timestamps]
+        stamps = [pd.Timestamp(ts) for ts in values]
+        if any(ts.tz is None for ts in stamps):
+            raise Exception(f'Please provide timestamps with timezone: {timestamps}')
+        return pd.DatetimeIndex([ts.tz_convert('UTC').tz_localize(None) for ts in stamps]).values
+
+    def _take(self, values: np.ndarray, i: np.ndarray) -> np.ndarray:
+        if (i < 0).any() or (i >= len(values)).any():
+            raise Exception(f'Dates outside of the session table {self.dates[0]} - {self.dates[-1]}.')
+        return values[i]
+
+    def is_session(self, dates: Any) -> np.ndarray:
+        days = self._days(dates)
+        i = np.minimum(np.searchsorted(self.dates, days), len(self.dates) - 1)
+        return self.dates[i] == days
+
+    def previous(self, dates: Any, inclusive: bool = False) -> np.ndarray:
+        """ Last session strictly before each date (or on it if inclusive). """
+        i = np.searchsorted(self.dates, self._days(dates), side='right' if inclusive else 'left') - 1
+        return self._take(self.dates, i)
+
+    def next(self, dates: Any, inclusive: bool = False) -> np.ndarray:
+        """ First session strictly after each date (or on it if inclusive). """
+        i = np.searchsorted(self.dates, self._days(dates), side='left' if inclusive else 'right')
+        return self._take(self.dates, i)
+
+    def offset(self, dates: Any, n: int) -> np.ndarray:
+        """ n sessions after (before if negative) the most recent session on or before each date. """
+        i = np.searchsorted(self.dates, self._days(dates), side='right') - 1 + n
+        return self._take(self.dates, i)
+
+    def count(self, start: Any, end: Any) -> np.ndarray:
+        """ Number of sessions in [start, end]. """
+        return np.searchsorted(self.dates, self._days(end), side='right') - \
+            np.searchsorted(self.dates, self._days(start), side='left')
+
+    def between(self, start: Any, end: Any) -> pd.DatetimeIndex:
+        i = np.searchsorted(self.dates, self._days(start)[0], side='left')
+        j = np.searchsorted(self.dates, self._days(end)[0], side='right')
+        return pd.DatetimeIndex(self.dates[i:j])
+
+    def open_at(self, timestamps: Any) -> np.ndarray:
+        """ Whether the market is open at each timestamp, open inclusive and close exclusive. """
+        ts = self._utc(timestamps)
+        i = np.searchsorted(self.opens, ts, side='right') - 1
+        return (i >= 0) & (ts < self.closes[np.maximum(i, 0)])
+
+    def next_close(self, timestamps: Any) -> pd.DatetimeIndex:
+        """ First close strictly after each timestamp, in UTC. """
+        i = np.searchsorted(self.closes, self._utc(timestamps), side='right')
+        return pd.DatetimeIndex(self._take(self.closes, i)).tz_localize('UTC')
+
+
+@lru_cache(maxsize=None)
+def sessions() -> Sessions:
+    """ Session table built once per process (and persisted under DATA_DIR if PERSIST_SESSIONS). """
+    return Sessions.build(path=SESSION_CACHE if PERSIST_SESSIONS else None)
+
+
 class MarketCalendar:
     """ Market Calendar Helper function
 
@@ -148,8 +257,7 @@ class MarketCalendar:
         ts = pd.Timestamp(timestamp)
         if ts.tz is None:
             raise Exception(f'Please provide a timestamp with timezone: {timestamp}')
-        schedule = NYSE.schedule(ts, ts + pd.Timedelta(days=1))
-        return NYSE.open_at_time(schedule, ts)
+        return bool(sessions().open_at(ts)[0])
 
     @staticmethod
     def open_at_date(timestamp: Any = now(EST)) -> bool:
@@ -157,31 +265,28 @@ class MarketCalendar:
 
         :param timestamp: timestamp in any format (string, pd.Timestamp, datetime, etc)
         """
-        ts = pd.Timestamp(timestamp)
-        schedule = NYSE.schedule(ts, ts + pd.Timedelta(days=1))
-        return ts.date().isoformat() in schedule.index
+        return bool(sessions().is_session(pd.Timestamp(timestamp))[0])
 
     @staticmethod
     def next_close(timestamp: Any = now(EST)) -> datetime:
-        # TODO: this function is confusing.
-        ts = pd.Timestamp(timestamp)
-        schedule = NYSE.schedule(ts, ts + pd.Timedelta(days=4))
-        df = schedule[schedule["market_close"] > ts]
-        return df["market_close"].iloc[0].to_pydatetime()
+        """ Next market close strictly after the given timestamp (UTC). """
+        return sessions().next_close(pd.Timestamp(timestamp))[0].to_pydatetime()
 
     @staticmethod
     def prev_open_date(timestamp: Any = now(EST)) -> str:
         """ Return previous market open date (isoformat) given the ts or the current time. """
-        ts = pd.Timestamp(timestamp)
-        schedule = NYSE.schedule(ts - pd.Timedelta(days=4), ts)
-        current_date = ts.date().isoformat()
-        df = schedule[schedule < current_date].dropna()
-        return df.index[-1].date().isoformat()
+        return str(sessions().previous(pd.Timestamp(timestamp))[0])
 
     @staticmethod
     def most_recent_open_date(timestamp: Any = now(EST)) -> str:
-        ts = pd.Timestamp(timestamp)
-        if MarketCalendar.open_at_date(ts):
-            return ts.date().isoformat()
-        else:
-            return MarketCalendar.prev_open_date(ts)
+        return str(sessions().previous(pd.Timestamp(timestamp), inclusive=True)[0])
+
+    @staticmethod
+    def most_recent_open_dates(dates: Any) -> List[str]:
+        """ Vectorized most_recent_open_date. """
+        return [str(d) for d in sessions().previous(dates, inclusive=True)]
+
+    @staticmethod
+    def open_dates(start: Any, end: Any) -> pd.DatetimeIndex:
+        """ Market open dates in [start, end]. """
+        return sessions().between(start, end)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.performance import Statistics
+from src.analytics.signal import Combination
+
+
+def reference_win_weights(signal_1: pd.Series, signal_2: pd.Series, partitions: int = 20):
+    vec = {}
+    for weight in [(1 / partitions) * j for j in list(range(1, partitions + 1))]:
+        vec[weight] = Statistics().win_rate((weight * signal_1) + ((1 - weight) * signal_2))
+    opt_weight = pd.Series(vec).idxmax()
+    return [opt_weight, 1 - opt_weight]
+
+
+@pytest.fixture
+def signals():
+    rs = np.random.RandomState(0)
+    df = pd.DataFrame(rs.normal(0.0005, 0.01, (160, 2)), index=pd.bdate_range('2020-01-01', periods=160),
+                      columns=['a', 'b'])
+    # Discrete returns produce ties and zero blends.
+    df.iloc[:80] = (df.iloc[:80] * 1000).round() / 1000
+    df.iloc[40:45, 0] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('partitions', [5, 20])
+def test_win_weights_match_reference(signals, partitions):
+    for j in range(0, len(signals) - 10, 7):
+        data = signals.iloc[j:j + 10]
+        assert Combination._win_weights(data.a, data.b, partitions) == \
+            reference_win_weights(data.a, data.b, partitions)
+
+
+def test_win_weights_rolling(signals):
+    weights = pd.DataFrame([reference_win_weights(data.a, data.b) for data in Combination._window(signals, 20)],
+                           index=signals.index[19:], columns=signals.columns)
+    expected = weights.mul(signals, axis=1).sum(axis=1)
+    assert Combination.win_weights(signals).equals(expected)
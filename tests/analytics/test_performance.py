@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.performance import GroupStats, Statistics
+from src.execution.analysis import Analysis
+
+
+@pytest.fixture
+def returns():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2015-01-01', periods=1000, name='date')
+    return pd.Series(rs.normal(0.0005, 0.01, len(index)), index=index)
+
+
+def agg(data: pd.Series, keys, notional: bool = False) -> pd.DataFrame:
+    """ The per group lambdas the stat tables used to run. """
+    return pd.DataFrame(data.groupby(keys).agg(
+        Sharpe=Statistics.sharpe, Sortino=Statistics.sortino, Win=Statistics.win_rate, CAGR=Statistics.cagr,
+        Max=np.max, Min=np.min,
+        Return=lambda x: Statistics.cumulative_returns(x, history=False, notional=notional), Count=np.size))
+
+
+def test_statistics_tables_match_groupby(returns):
+    columns = GroupStats.STATS
+    pd.testing.assert_frame_equal(Statistics.yearly_stats(returns), agg(returns, returns.index.year)[columns],
+                                  check_dtype=False)
+    expected = agg(returns, [returns.index.year, returns.index.month])[columns].unstack()
+    pd.testing.assert_frame_equal(Statistics.ym_stats(returns), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('notional', [False, True])
+def test_analysis_tables_match_groupby(returns, notional):
+    data = returns * 10000 if notional else returns
+    expected = agg(data, [data.index.year, data.index.month], notional)[Analysis.STATS].round(4)
+    expected.index.set_names(['Year', 'Month'], inplace=True)
+    pd.testing.assert_frame_equal(Analysis.monthly_stats(data, notional), expected, check_dtype=False)
+
+
+def test_nan_rows_are_counted_like_groupby(returns):
+    returns = returns.copy()
+    # A leading NaN as from pct_change and NaNs inside the months. The old Statistics.cagr turned NaN whenever a
+    # group ended on a NaN, so the month ends stay valid.
+    month_end = returns.index.to_series().groupby([returns.index.year, returns.index.month]).transform('max')
+    returns[(np.arange(len(returns)) % 9 == 0) & (returns.index != month_end)] = np.nan
+    assert returns.isna().sum() > 100
+    columns = GroupStats.STATS
+    pd.testing.assert_frame_equal(Statistics.yearly_stats(returns), agg(returns, returns.index.year)[columns],
+                                  check_dtype=False)
+    expected = agg(returns, [returns.index.year, returns.index.month])[Analysis.STATS].round(4)
+    expected.index.set_names(['Year', 'Month'], inplace=True)
+    pd.testing.assert_frame_equal(Analysis.monthly_stats(returns), expected, check_dtype=False)
+    # Counting only the returns there are is opt-in.
+    counts = GroupStats(returns, returns.index.year, dropna=True).stat('Count')
+    pd.testing.assert_series_equal(counts, returns.groupby(returns.index.year).count(), check_dtype=False,
+                                   check_names=False)
+
+
+def test_many_series_at_once(returns):
+    data = pd.concat([returns, 2 * returns, returns.iloc[300:]], axis=1, keys=['a', 'b', 'c'])
+    table = Analysis.yearly_stats(data)
+    assert list(table.columns.get_level_values(0).unique()) == ['a', 'b', 'c']
+    pd.testing.assert_frame_equal(table['c'], Analysis.yearly_stats(data['c']), check_dtype=False)
+    # Full years of c match, the rows before it starts still count in its first year.
+    pd.testing.assert_frame_equal(table['c'].loc[2017:], Analysis.yearly_stats(returns.iloc[300:]).loc[2017:],
+                                  check_dtype=False)
+    assert table.loc[2016, ('c', 'Count')] == table.loc[2016, ('a', 'Count')]
+
+
+def test_drawdown(returns):
+    drawdown = GroupStats(returns, returns.index.year).stat('Drawdown')
+    for year, value in drawdown.items():
+        wealth = (1 + returns.loc[str(year)]).cumprod()
+        assert value == pytest.approx((wealth / np.maximum(wealth.cummax(), 1) - 1).min())
+
+
+def test_streaks():
+    index = pd.bdate_range('2020-01-01', periods=9)
+    returns = pd.Series([0.01, -0.02, 0.03, 0.01, np.nan, 0.02, 0.0, -0.01, -0.01], index=index)
+    streaks = Statistics.streaks(returns)
+    assert streaks.Sign.tolist() == [1, -1, 1, 1, -1]
+    assert streaks.Length.tolist() == [1, 1, 2, 1, 2]
+    assert streaks.Start.tolist() == list(index[[0, 1, 2, 5, 7]])
+    assert streaks.End.tolist() == list(index[[0, 1, 3, 5, 8]])
+    assert streaks.Return.iloc[2] == pytest.approx(1.03 * 1.01 - 1)
+    # A streak never crosses into the next column or group.
+    frame = Statistics.streaks(pd.concat([returns, returns], axis=1, keys=['a', 'b']), groups=[0] * 3 + [1] * 6)
+    assert frame.Series.tolist() == ['a'] * 6 + ['b'] * 6
+    assert frame.Length.tolist()[:6] == [1, 1, 1, 1, 1, 2]
+
+
+def test_trend(returns):
+    trend = Statistics.trend(returns)
+    signs = np.sign(returns)
+    rally = trend['rally'].dropna()
+    assert len(rally) == max(len(run) for run in ''.join('+' if s > 0 else ' ' for s in signs).split())
+    assert (rally['returns (%)'] > 0).all() and (trend['tank'].dropna()['returns (%)'] > 0).all()
+    yearly = Statistics.yearly_trend(returns, 'tank')
+    assert len(yearly.columns) == returns.index.year.nunique()
+    assert (yearly.iloc[0] < 0).all()
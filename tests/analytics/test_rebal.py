@@ -0,0 +1,24 @@
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+
+from src.analytics.rebal import MAX_WEIGHT, MIN_WEIGHT, rebalance
+
+
+def direct(rets: np.ndarray) -> np.ndarray:
+    w = cp.Variable(rets.shape[1])
+    objective = cp.Maximize(rets.mean(0) @ w - cp.quad_form(w, np.cov(rets.T)))
+    cp.Problem(objective, [cp.sum(w) == 1, w >= MIN_WEIGHT, w <= MAX_WEIGHT]).solve(solver='ECOS')
+    return w.value
+
+
+def test_rebalance_matches_direct_solves():
+    rs = np.random.RandomState(0)
+    data = pd.DataFrame(2 * rs.rand(60, 3) - 1, columns=['a', 'b', 'c'])
+    data.iloc[30, 1] = np.nan
+    result = rebalance(data, window=10, processes=3)
+    assert list(result.index) == list(data.index[10:])
+    for j in range(len(data) - 10):
+        rets = data.values[j:j + 10]
+        expected = np.full(3, 1 / 3) if np.isnan(rets).any() else direct(rets)
+        assert np.allclose(result.iloc[j].values, expected, atol=2e-3), j
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.rolling import RollingMoments, rolling_corr, sliding
+from src.analytics.signal import Combination
+
+
+@pytest.fixture
+def signals():
+    rs = np.random.RandomState(0)
+    return pd.DataFrame(rs.normal(0.001, 0.01, (400, 4)), index=pd.bdate_range('2020-01-01', periods=400),
+                        columns=['a', 'b', 'c', 'd'])
+
+
+def test_sliding_is_a_view(signals):
+    values = signals.values
+    windows = sliding(values, 20)
+    assert windows.shape == (381, 20, 4)
+    assert np.shares_memory(windows, values)
+    assert (windows[5] == values[5:25]).all()
+
+
+def test_rolling_moments_match_pandas(signals):
+    values = signals.values.copy()
+    values[100] = np.nan
+    moments = list(RollingMoments(values, 30, refresh=7))
+    assert len(moments) == len(values) - 29
+    for j, mu, sigma in moments:
+        window = pd.DataFrame(values[j:j + 30])
+        if window.isna().any().any():
+            assert np.isnan(mu).all() and np.isnan(sigma).all()
+        else:
+            assert np.allclose(mu, window.mean().values, rtol=0, atol=1e-15)
+            assert np.allclose(sigma, window.cov().values, rtol=0, atol=1e-15)
+
+
+def test_mvo_matches_spo_per_window(signals):
+    result = Combination.mvo(signals, window=20)
+    shifted = signals.shift()
+    weights = pd.concat([Combination.spo(shifted.iloc[j:j + 20], min_weight=0.2, aversion=1000)
+                         for j in range(1, len(signals) - 19)], axis=1, keys=shifted.index[20:]).T
+    expected = signals.mul(weights).sum(axis=1)
+    assert np.allclose(result.values, expected.reindex(result.index).fillna(0).values, atol=1e-9)
+
+
+@pytest.mark.parametrize('window, min_periods', [(60, None), (60, 20)])
+def test_rolling_corr_matches_pandas(signals, window, min_periods):
+    data = signals.copy()
+    data.iloc[50:55, 1] = np.nan
+    pairs = [('a', 'b'), ('d', 'a')]
+    result = rolling_corr(data, pairs, window, min_periods)
+    expected = data.rolling(window, min_periods=min_periods).corr()
+    assert list(result.columns) == pairs
+    for a, b in pairs:
+        ref = expected.xs(a, level=1)[b]
+        assert ref.isna().equals(result[(a, b)].isna())
+        assert np.allclose(result[(a, b)].dropna(), ref.dropna(), rtol=0, atol=1e-12)
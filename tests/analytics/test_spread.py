@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from src.analytics.pairs.spread import rolling_ols
+
+
+@pytest.fixture
+def prices():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2015-01-01', periods=600)
+    x = 100 * np.exp(rs.normal(0.0003, 0.01, len(index)).cumsum())
+    y = 0.8 * x * np.exp(rs.normal(0, 0.005, len(index)).cumsum())
+    df = np.log(pd.DataFrame(dict(x=x, y=y), index=index))
+    df.iloc[100:103, 0] = np.nan
+    return df
+
+
+def ols(data: pd.DataFrame):
+    data = data.dropna()
+    result = sm.OLS(data.y, sm.add_constant(data.x)).fit()
+    return result.params['const'], result.params['x'], data.y.iloc[-1] - result.fittedvalues.iloc[-1]
+
+
+@pytest.mark.parametrize('window', [20, 120])
+def test_rolling_ols_matches_statsmodels(prices, window):
+    result = rolling_ols(prices.y, prices.x, window=window)
+    assert result.beta.iloc[:window - 1].isna().all()
+    for end in range(window - 1, len(prices), 13):
+        data = prices.iloc[end - window + 1:end + 1]
+        alpha, beta, resid = ols(data)
+        assert result.alpha.iloc[end] == pytest.approx(alpha, rel=1e-7)
+        assert result.beta.iloc[end] == pytest.approx(beta, rel=1e-7)
+        if data.iloc[-1].notna().all():
+            assert result.resid.iloc[end] == pytest.approx(resid, rel=1e-6, abs=1e-10)
+
+
+def test_expanding_ols_matches_statsmodels(prices):
+    result = rolling_ols(prices.y, prices.x, min_periods=30)
+    assert result.beta.iloc[:29].isna().all()
+    for end in range(29, len(prices), 37):
+        alpha, beta, _ = ols(prices.iloc[:end + 1])
+        assert result.alpha.iloc[end] == pytest.approx(alpha, rel=1e-7)
+        assert result.beta.iloc[end] == pytest.approx(beta, rel=1e-7)
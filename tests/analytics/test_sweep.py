@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.sweep import SignalSweep, grid_points, sweep
+from src.execution.signals.patience import Patience
+
+CALLS = []
+
+
+def scaled(data: pd.Series, scale: float, shift: float) -> pd.Series:
+    CALLS.append((scale, shift))
+    return data * scale + shift
+
+
+@pytest.fixture
+def prices():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2016-01-01', '2019-12-31')
+    return pd.DataFrame({'QQQ': 100 * np.exp(rs.normal(0.0003, 0.015, len(index)).cumsum())}, index=index)
+
+
+def test_grid_points():
+    assert grid_points({'a': [1, 2], 'b': ['x']}) == [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'x'}]
+
+
+def test_sweep_caches_finished_points(tmp_path):
+    data = pd.Series([1.0, 2.0, 3.0])
+    CALLS.clear()
+    results = sweep(scaled, {'scale': [1, 2], 'shift': [0, 1]}, data, name='test', processes=1, cache_dir=tmp_path)
+    assert len(CALLS) == 4
+    assert results[3][0] == {'scale': 2, 'shift': 1} and results[3][1].tolist() == [3, 5, 7]
+    results = sweep(scaled, {'scale': [1, 2, 3], 'shift': [0, 1]}, data, name='test', processes=1, cache_dir=tmp_path)
+    assert len(CALLS) == 6 and len(results) == 6
+    # Changing the shared data invalidates the cache.
+    sweep(scaled, {'scale': [1], 'shift': [0]}, data + 1, name='test', processes=1, cache_dir=tmp_path)
+    assert len(CALLS) == 7
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('processes', [1, 2])
+async def test_signal_sweep_matches_signal(prices, processes):
+    thresholds = [-0.05, -0.1]
+    # processes=1 runs inside the running event loop of this test.
+    sweep = SignalSweep(Patience, {'threshold': thresholds}, notional=10000, processes=processes, ticker='QQQ')
+    summary = await sweep.run(prices)
+    assert list(summary.columns) == ['threshold', 'Sharpe', 'CAGR', 'Turnover']
+    assert summary.threshold.tolist() == thresholds
+    for threshold, row in zip(thresholds, summary.itertuples()):
+        signal = Patience('QQQ', threshold)
+        signal.prices = prices
+        await signal.update(10000)
+        assert row.Sharpe == pytest.approx(np.sqrt(252) * signal.returns.mean() / signal.returns.std())
+        assert sweep.returns()[str(threshold)].equals(signal.returns.rename(str(threshold)))
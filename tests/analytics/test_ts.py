@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.ts import TimeSeries
+
+
+@pytest.fixture
+def data():
+    rs = np.random.RandomState(0)
+    df = pd.DataFrame(rs.normal(100, 1, (300, 4)), index=pd.bdate_range('2020-01-01', periods=300),
+                      columns=['a', 'b', 'c', 'd'])
+    df.iloc[:40, 1] = np.nan
+    df.iloc[:, 3] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('adjust', [True, False])
+@pytest.mark.parametrize('halflife', [0.5, 20])
+def test_ewma_matches_pandas(data, adjust, halflife):
+    expected = data.ewm(halflife=halflife, adjust=adjust).mean()
+    pd.testing.assert_frame_equal(TimeSeries.ewma(data, halflife, adjust=adjust), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('bias', [True, False])
+@pytest.mark.parametrize('adjust', [True, False])
+def test_ewvar_matches_pandas(data, adjust, bias):
+    expected = data.ewm(halflife=10, adjust=adjust).var(bias=bias)
+    pd.testing.assert_frame_equal(TimeSeries.ewvar(data, 10, adjust=adjust, bias=bias), expected, rtol=1e-10)
+
+
+def test_ewma_gaps_with_adjust(data):
+    data.iloc[100:110, 0] = np.nan
+    expected = data.ewm(halflife=5, adjust=True)
+    pd.testing.assert_frame_equal(TimeSeries.ewma(data, 5, adjust=True), expected.mean(), rtol=1e-12)
+    pd.testing.assert_frame_equal(TimeSeries.ewvar(data, 5, adjust=True), expected.var(), rtol=1e-10)
+
+
+@pytest.mark.parametrize('halflife', [0.5, 5, 60])
+def test_ewma_gaps_without_adjust(data, halflife):
+    data = data.cumsum()
+    data.iloc[100:110, 0] = np.nan
+    data.iloc[::7, 2] = np.nan
+    expected = data.ewm(halflife=halflife, adjust=False)
+    pd.testing.assert_frame_equal(TimeSeries.ewma(data, halflife), expected.mean(), rtol=1e-12)
+    pd.testing.assert_frame_equal(TimeSeries.ewvar(data, halflife), expected.var(), rtol=1e-9)
+    pd.testing.assert_frame_equal(TimeSeries.ewvar(data, halflife, bias=True), expected.var(bias=True), rtol=1e-9)
+    series = data.iloc[:, 2]
+    pd.testing.assert_series_equal(TimeSeries.ewma(series, halflife), series.ewm(halflife=halflife, adjust=False).mean(),
+                                   rtol=1e-12)
+
+
+def test_ewma_many_gaps_without_adjust():
+    # Thousands of gaps shrink the gap scaled weights below what a float holds.
+    data = pd.DataFrame(np.random.RandomState(2).normal(0, 1, (7000, 2)).cumsum(axis=0))
+    data.iloc[::2, 0] = np.nan
+    expected = data.ewm(halflife=0.5, adjust=False)
+    pd.testing.assert_frame_equal(TimeSeries.ewma(data, 0.5), expected.mean(), rtol=1e-12)
+    pd.testing.assert_frame_equal(TimeSeries.ewvar(data, 0.5), expected.var(), rtol=1e-9)
+
+
+def test_ewma_long_series_short_halflife():
+    series = pd.Series(np.random.RandomState(1).normal(0, 1, 20000), name='x')
+    result = TimeSeries.ewma(series, 1)
+    assert isinstance(result, pd.Series) and result.name == 'x'
+    assert np.isfinite(result).all()
+    np.testing.assert_allclose(result, series.ewm(halflife=1, adjust=False).mean(), atol=1e-12)
+
+
+def test_ewma_keeps_array_shape():
+    values = np.arange(10, dtype=float)
+    assert TimeSeries.ewma(values, 2).shape == (10,)
+    assert TimeSeries.ewvar(values.reshape(5, 2), 2).shape == (5, 2)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.compact import compact, drift, expand, memory, validate
+
+
+@pytest.fixture
+def prices():
+    index = pd.bdate_range('2010-01-01', periods=500)
+    values = 100 * np.exp(np.random.RandomState(0).normal(0, 0.01, (500, 50)).cumsum(axis=0))
+    return pd.DataFrame(values, index=index, columns=[f'T{i}' for i in range(50)])
+
+
+def test_compact(prices):
+    df = compact(prices)
+    assert (df.dtypes == np.float32).all()
+    assert isinstance(df.columns, pd.CategoricalIndex)
+    assert memory(df) < memory(prices)
+    assert expand(df).columns.equals(prices.columns)
+    assert (expand(df).dtypes == np.float64).all()
+
+
+def test_drift(prices):
+    returns = prices.pct_change().sum(axis=1)
+    compact_returns = compact(prices).pct_change().sum(axis=1)
+    assert validate(compact_returns, returns) < 1e-4
+    assert drift(returns, returns) == 0
+    with pytest.raises(ValueError):
+        validate(returns * 1.01, returns)
+
+
+def test_build_binance_round_trip(prices, tmp_path):
+    from src.data.data_loader import Data
+
+    data = Data()
+    data.src = str(tmp_path / '{}_data.parquet.gz')
+    for sym in prices.columns[:3]:
+        prices[[sym]].rename(columns={sym: 'close'}).to_parquet(data.src.format(sym))
+    data.build_binance(list(prices.columns[:3]), compact=True)
+    loaded = data.load(compact=True)
+    assert (loaded.dtypes == np.float32).all() and isinstance(loaded.columns, pd.CategoricalIndex)
+    assert validate(loaded, prices[prices.columns[:3]]) < 1e-6
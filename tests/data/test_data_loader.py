@@ -0,0 +1,38 @@
+import os
+import pandas as pd
+
+from src.data import data_loader
+from src.data.data_loader import Factor
+
+
+def fake_reader(calls):
+    def reader(name, source, start):
+        calls.append(start)
+        index = pd.bdate_range('2021-01-04', periods=len(calls) + 4)
+        index = index[index >= pd.Timestamp(start)]
+        if name.startswith('F-F_Momentum'):
+            return [pd.DataFrame({'Mom   ': 1.0}, index=index)]
+        return [pd.DataFrame({'Mkt-RF': 1.0, 'SMB': 2.0, 'HML': 3.0, 'RF': 0.0}, index=index)]
+    return reader
+
+
+def test_fama_french_factors_cache(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(data_loader.web, 'DataReader', fake_reader(calls))
+    cache = tmp_path / 'ff.parquet'
+
+    df = Factor.fama_french_factors(cache=cache)
+    assert list(df.columns) == ['Mkt-RF', 'SMB', 'HML', 'RF', 'Mom']
+    assert df.shape[0] == 5 and len(calls) == 2
+
+    # Checked today already, served from disk.
+    cached = Factor.fama_french_factors(cache=cache)
+    assert len(calls) == 2
+    pd.testing.assert_frame_equal(df, cached)
+
+    # Stale cache: only new rows are merged.
+    os.utime(cache, (0, 0))
+    df = Factor.fama_french_factors(cache=cache)
+    assert len(calls) == 4
+    assert df.shape[0] == 7
+    assert not df.index.duplicated().any()
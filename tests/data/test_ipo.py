@@ -0,0 +1,30 @@
+import pytest
+
+from pathlib import Path
+
+from src.constant import *
+from src.data import ipo
+
+FIXTURE = Path(__file__).resolve().parent / 'fixtures' / 'ipo_filings.html'
+
+
+def test_parse():
+    df = ipo.parse(FIXTURE.read_text())
+    assert list(df.columns) == ipo.COLUMNS
+    assert df[TICKER].tolist() == ['ACME', 'FHB', 'GFE']
+    assert df.loc[1, ISSUER] == 'First Harbor Bancorp'
+    assert df.loc[2, SECTOR] == 'Oil & Gas'
+
+
+def test_parse_empty():
+    assert ipo.parse('<html><body><div id="app"></div></body></html>').empty
+
+
+@pytest.mark.asyncio
+async def test_fetch_http(monkeypatch):
+    async def fetch_pages(urls):
+        return [FIXTURE.read_text() for _ in urls]
+
+    monkeypatch.setattr(ipo, 'fetch_pages', fetch_pages)
+    df = await ipo.fetch_http(['page1', 'page2'])
+    assert df.shape == (3, len(ipo.COLUMNS))
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.constant import *
+from src.data import option
+from src.data.option import Option
+
+
+@pytest.fixture
+def option_dir(tmp_path, monkeypatch):
+    dates = ['2021-01-04', '2021-01-05', '2021-01-06']
+    exps = ['2021-01-15', '2021-02-19']
+    rows = [dict(ticker='SPY', tradeDate=d, expirDate=e, strike=k, stockPrice=370.0, delta=delta,
+                 callValue=5.0, putValue=4.0)
+            for d in dates for e in exps for k, delta in [(360, 0.8), (370, 0.5), (380, 0.2)]]
+    pd.DataFrame(rows).to_parquet(tmp_path / 'SPY.parquet.gz')
+    monkeypatch.setattr(option, 'OPTION_DATA_DIR', str(tmp_path))
+    Option.clear_cache()
+    yield tmp_path
+    Option.clear_cache()
+
+
+def test_daily(option_dir):
+    df = Option().daily('SPY', right=CALL)
+    assert df.shape == (18, 7)
+    expected = np.busday_count([d.date() for d in df[DATE]], [d.date() for d in df[EXP]])
+    assert (df[DTE].values == expected).all()
+
+
+def test_daily_filters(option_dir):
+    df = Option().daily('SPY', right=PUT, start='2021-01-05', exp_end='2021-01-31', min_delta=-0.6, max_delta=-0.4)
+    assert df.shape[0] == 2
+    assert (df[DATE] >= '2021-01-05').all()
+    assert (df[DELTA] == -0.5).all()
+    assert (df[PRICE] == 4.0).all()
+    df = Option().daily('SPY', right=CALL, max_dte=10)
+    assert (df[DTE] <= 10).all() and df.shape[0] == 9
+
+
+def test_daily_cache(option_dir):
+    Option().daily('SPY', start='2021-01-05')
+    Option().daily('SPY', start='2021-01-05')
+    assert Option._read.cache_info().hits == 1
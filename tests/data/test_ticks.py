@@ -0,0 +1,68 @@
+import pytest
+
+from src.config import TRADES
+from src.constant import *
+from src.data.ticks import TickStore, compact, paginate
+
+
+class Tick:
+    def __init__(self, raw):
+        self._raw = raw
+
+
+def make_ticks(n: int):
+    # Two ticks per timestamp so that page boundaries fall inside a timestamp.
+    return [dict(sip_timestamp=1609770600000000000 + i // 2, sequence_number=i, price=100 + i * 0.01, size=100,
+                 exchange=i % 3) for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_paginate():
+    ticks = make_ticks(25)
+
+    async def fetch(symbol, date, timestamp=None, limit=None):
+        start = 0 if timestamp is None else next(i for i, t in enumerate(ticks) if t['sip_timestamp'] >= timestamp)
+        return [Tick(t) for t in ticks[start:start + limit]]
+
+    rows = await paginate(fetch, 'SPY', '2021-01-04', limit=5)
+    assert [row['sequence_number'] for row in rows] == list(range(25))
+
+
+def test_compact():
+    df = compact(make_ticks(10), TRADES)
+    assert str(df[TIMESTAMP].dtype) == 'int64'
+    assert str(df[PRICE].dtype) == 'float32'
+    assert str(df[EXCHANGE].dtype) == 'category'
+    assert compact([], TRADES).empty
+
+
+def test_store(tmp_path):
+    store = TickStore(tmp_path)
+    store.write(compact(make_ticks(10), TRADES), 'SPY', '2021-01-04')
+    store.write(compact(make_ticks(4), TRADES), 'SPY', '2021-01-05')
+    assert store.dates('SPY') == ['2021-01-04', '2021-01-05']
+    assert store.read('SPY').shape == (14, 3)
+    df = store.read('SPY', start='2021-01-05', columns=[PRICE])
+    assert df.shape == (4, 1)
+    assert str(df.index.tz) == 'UTC'
+
+
+@pytest.mark.asyncio
+async def test_downloader_leaves_a_passed_client_connected(tmp_path, monkeypatch):
+    pytest.importorskip('alpaca_trade_api.polygon')
+    from src.data.polygon import Polygon, TickDownloader
+
+    async def all_trades(self, symbol, date):
+        return compact(make_ticks(6), TRADES)
+
+    monkeypatch.setattr(Polygon, 'all_trades', all_trades)
+    polygon = Polygon()
+    await polygon.connect()
+    counts = await TickDownloader(TickStore(tmp_path), polygon=polygon).run(['SPY'], ['2021-01-04'], kind=TRADES)
+    assert counts == {('SPY', '2021-01-04'): 6}
+    assert polygon.is_connected()
+    await polygon.disconnect()
+    # A client the downloader created itself is closed at the end of the run.
+    downloader = TickDownloader(TickStore(tmp_path))
+    await downloader.run(['QQQ'], ['2021-01-04'], kind=TRADES)
+    assert not downloader.polygon.is_connected()
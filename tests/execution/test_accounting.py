@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.execution.signal import Long
+from src.execution.utils import gross_pnl, ledger, txn_cost
+
+
+def pandas_pnl(positions: pd.DataFrame, prices: pd.DataFrame) -> pd.Series:
+    return prices.diff().mul(positions.shift()).dropna(axis=1, how='all').dropna().sum(axis=1)
+
+
+def pandas_txn_cost(positions: pd.DataFrame, prices: pd.DataFrame, threshold: int = 5) -> pd.Series:
+    qty = positions.diff().abs().dropna()
+    notional = qty.mul(prices).dropna()
+    min_cost = pd.DataFrame(1.0, index=qty.index, columns=qty.columns)
+    share_cost = qty.mul(0.005)
+    notional_cost = notional.mul(0.01)
+    cost = min_cost.combine(share_cost.combine(notional_cost, np.minimum), np.maximum)
+    return pd.DataFrame(np.where(qty > threshold, cost, 0.0), index=qty.index, columns=qty.columns).sum(axis=1)
+
+
+@pytest.fixture
+def data():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2010-01-01', periods=300)
+    columns = [f'T{i}' for i in range(20)]
+    prices = pd.DataFrame(100 * np.exp(rs.normal(0, 0.01, (300, 20)).cumsum(axis=0)), index=index, columns=columns)
+    prices.iloc[:30, 3] = np.nan
+    prices.iloc[120, 5] = np.nan
+    positions = (pd.DataFrame(rs.normal(0, 1, (300, 20)), index=index, columns=columns) * 1000 / prices).round()
+    return positions.iloc[10:].dropna(), prices
+
+
+def test_ledger(data):
+    positions, prices = data
+    pd.testing.assert_series_equal(gross_pnl(positions, prices), pandas_pnl(positions, prices), check_freq=False)
+    pd.testing.assert_series_equal(txn_cost(positions, prices), pandas_txn_cost(positions, prices), check_freq=False)
+    pnl, tcost = ledger(positions.iloc[:, :5], prices)
+    pd.testing.assert_series_equal(pnl, pandas_pnl(positions.iloc[:, :5], prices), check_freq=False)
+
+
+def test_signal_accounting_cache(data):
+    positions, prices = data
+    signal = Long('T0')
+    signal.prices, signal.positions, signal.notional = prices, positions, 10000
+    pnl = signal.pnl
+    assert signal.pnl is pnl
+    pd.testing.assert_series_equal(signal.net_returns,
+                                   (pnl - signal.tcost).div(10000).dropna().rename('T0_Net'), check_freq=False)
+    signal.positions = positions * 2
+    assert signal.pnl is not pnl
+    np.testing.assert_allclose(signal.pnl.values, 2 * pnl.values)
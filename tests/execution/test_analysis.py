@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.constant import PEAK, RECOVERY, VALLEY, DURATION
+from src.execution.analysis import Analysis
+
+
+def search(returns: pd.Series, top: int):
+    """ Reference: repeatedly take the deepest trough and drop its episode. """
+    uw = Analysis.underwater(returns)
+    found = []
+    for _ in range(top):
+        valley = uw.idxmin()
+        peak = uw[:valley][uw[:valley] == 0].index[-1]
+        recovered = uw[valley:][uw[valley:] == 0].index
+        if len(recovered):
+            uw.drop(uw[peak:recovered[0]].index[1:-1], inplace=True)
+        else:
+            uw = uw.loc[:peak]
+        found.append((peak, valley, recovered[0] if len(recovered) else pd.NaT))
+        if len(uw) == 0 or np.min(uw) == 0:
+            break
+    return found
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_drawdowns_match_trough_search(seed):
+    rs = np.random.RandomState(seed)
+    returns = pd.Series(rs.normal(0.0003, 0.01, 1500), index=pd.bdate_range('2010-01-01', periods=1500))
+    expected = search(returns, 8)
+    table = Analysis.drawdowns(returns, 8)
+    assert list(table.index) == list(range(8))
+    assert list(table[[PEAK, VALLEY, RECOVERY]].dropna(how='all').itertuples(index=False, name=None)) == expected
+    uw = Analysis.underwater(returns)
+    assert table['Percent Drawdown'].iloc[0] == pytest.approx(-uw.min() * 100)
+    recovered = table.dropna(subset=[RECOVERY]).iloc[0]
+    assert recovered[DURATION] == len(pd.date_range(recovered[PEAK], recovered[RECOVERY], freq='B'))
+
+
+def test_drawdowns_of_many_series():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2015-01-01', periods=600)
+    returns = pd.DataFrame(rs.normal(0.0003, 0.01, (600, 3)), index=index, columns=['a', 'b', 'c'])
+    returns['c'] = 0.001
+    returns.iloc[:100, 1] = np.nan
+    table = Analysis.drawdowns(returns, 4)
+    assert list(table.index.get_level_values(0).unique()) == ['a', 'b', 'c']
+    pd.testing.assert_frame_equal(table.loc['a'], Analysis.drawdowns(returns['a'], 4), check_names=False)
+    pd.testing.assert_frame_equal(table.loc['b'], Analysis.drawdowns(returns['b'].dropna(), 4), check_names=False)
+    assert table.loc['c'].isna().all().all()
+    episodes = Analysis.drawdown_episodes(returns).dropna(subset=[RECOVERY])
+    assert (episodes['Recovery Time'] <= episodes[DURATION]).all()
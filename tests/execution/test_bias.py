@@ -1,5 +1,9 @@
+import numpy as np
+import pandas as pd
 import pytest
-from src.execution.signals import BiasV2
+
+from src.execution.signals import Bias, BiasV2
+from src.execution.signals.bias import TICKERS
 
 
 @pytest.mark.asyncio
@@ -9,3 +13,44 @@ async def test_weights_sum_to_one(monkeypatch):
     await bias.fetch()
     await bias.update(10000)
     assert set(bias.weights.sum(axis=1).round(2).unique()) == {1, 0}
+
+
+@pytest.fixture
+def prices():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2012-01-02', '2014-12-31')
+    values = 100 * np.exp(rs.normal(0.0003, 0.01, (len(index), len(TICKERS))).cumsum(axis=0))
+    return pd.DataFrame(values, index=index, columns=TICKERS)
+
+
+@pytest.mark.asyncio
+async def test_quarter_weight_history(prices, tmp_path, monkeypatch):
+    monkeypatch.setattr('src.execution.signals.bias.WEIGHT_CACHE_DIR', str(tmp_path))
+    solved = []
+    original = Bias._compute_weight
+
+    def compute_weight(self, date, r):
+        solved.append(date)
+        return original(self, date, r)
+
+    monkeypatch.setattr(Bias, '_compute_weight', compute_weight)
+    bias = Bias(date='2014-12-31', parallel=False)
+    bias.prices = prices
+    await bias.update(10000)
+    quarters = len(solved)
+    cold = bias.weights
+
+    # Second run only solves the current quarter.
+    bias = Bias(date='2014-12-31', parallel=False)
+    bias.prices = prices
+    await bias.update(10000)
+    assert len(solved) == quarters + 1
+    pd.testing.assert_frame_equal(bias.weights, cold)
+
+    # A changed returns window invalidates that quarter and the ones after it.
+    changed = prices.copy()
+    changed.loc['2014-06-02':] *= 1 + 0.01 * np.random.RandomState(1).normal(size=changed.loc['2014-06-02':].shape)
+    bias = Bias(date='2014-12-31', parallel=False)
+    bias.prices = changed
+    await bias.update(10000)
+    assert quarters + 1 < len(solved) < 2 * quarters + 1
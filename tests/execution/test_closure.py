@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import Yahoo
+from src.execution.signals import closure
+from src.execution.signals.closure import BASKET_DATA, CEF_DATA, SPREAD_WINDOW, Closure, append, last_valid
+
+TICKERS = ['AAA', 'BBB', 'CCC']
+
+
+@pytest.fixture
+def history():
+    """ The adjusted closes Yahoo serves today. BBB paid a distribution, so its earlier history is adjusted down. """
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2021-01-01', periods=60)
+    columns = TICKERS + [f'X{ticker}X' for ticker in TICKERS]
+    return pd.DataFrame(20 * np.exp(rs.normal(0, 0.01, (len(index), len(columns))).cumsum(axis=0)), index=index,
+                        columns=columns)
+
+
+@pytest.fixture
+def storage(history, monkeypatch, tmp_path):
+    stored = history.iloc[:-3].copy()
+    stored.iloc[-4:, 2] = np.nan
+    stored['BBB'] = stored['BBB'] / 0.98
+
+    class Storage:
+        files = {CEF_DATA: stored[TICKERS], BASKET_DATA: stored[[f'X{ticker}X' for ticker in TICKERS]]}
+        writes = []
+
+        def read_csv(self, path):
+            return pd.DataFrame({'ticker': TICKERS})
+
+        def read_parquet(self, path):
+            return self.files[path].copy()
+
+        def write_parquet(self, df, path, **kwargs):
+            self.writes.append(path)
+            self.files[path] = df
+
+    monkeypatch.setattr(closure, 'GCS', Storage)
+    monkeypatch.setattr('src.execution.signal.STATE_DIR', str(tmp_path))
+    return Storage
+
+
+@pytest.fixture
+def requests(history, monkeypatch):
+    calls = []
+
+    async def daily(self, tickers, start, **kwargs):
+        calls.append((list(tickers), start))
+        return history.loc[start:, list(tickers)]
+
+    monkeypatch.setattr(Yahoo, 'daily', daily)
+    return calls
+
+
+def test_last_valid_and_append(history):
+    panel = history[TICKERS].iloc[:50].copy()
+    panel.iloc[-2:, 0] = np.nan
+    panel['CCC'] = np.nan
+    assert list(last_valid(panel)[:2]) == [history.index[47], history.index[49]]
+    assert pd.isna(last_valid(panel)['CCC'])
+    panel['BBB'] *= 1.1
+    fresh = pd.concat([history['AAA'].iloc[47:], history['BBB'].iloc[49:], history['CCC']], axis=1)
+    pd.testing.assert_frame_equal(append(panel, fresh), history[TICKERS], check_freq=False)
+
+
+@pytest.mark.asyncio
+async def test_refresh_appends_missing_days(history, storage, requests):
+    signal = Closure(compact=False)
+    await signal.refresh(until=str(history.index[-1].date()))
+    # One request per start date, from the last stored day of each ticker.
+    last, gap = str(history.index[-4].date()), str(history.index[-8].date())
+    assert requests == [(['CCC'], gap), (['AAA', 'BBB'], last), (['XAAAX', 'XBBBX', 'XCCCX'], last)]
+    for path in [CEF_DATA, BASKET_DATA]:
+        stored = storage.files[path]
+        pd.testing.assert_frame_equal(stored, history[stored.columns], check_freq=False, check_names=False)
+    await signal.refresh(until=str(history.index[-1].date()))
+    assert len(requests) == 3 and storage.writes == [CEF_DATA, BASKET_DATA]
+
+
+@pytest.mark.asyncio
+async def test_refresh_stops_at_until(history, storage, requests):
+    # An intraday run: Yahoo already serves a partial bar for today.
+    until = history.index[-2]
+    signal = Closure(compact=False)
+    await signal.refresh(until=str(until.date()))
+    for path in [CEF_DATA, BASKET_DATA]:
+        stored = storage.files[path]
+        assert stored.index[-1] == until
+        pd.testing.assert_frame_equal(stored, history.loc[:until, stored.columns], check_freq=False,
+                                      check_names=False)
+
+
+@pytest.mark.asyncio
+async def test_incremental_update_after_refresh(history, storage, requests, monkeypatch):
+    storage.files[CEF_DATA] = history[TICKERS].iloc[:-3]
+    computed = []
+    original = Closure._update
+
+    async def _update(self, notional):
+        computed.append(len(self.prices))
+        await original(self, notional)
+
+    monkeypatch.setattr(Closure, '_update', _update)
+    signal = Closure(compact=False)
+    await signal.fetch()
+    await signal.update(10000, incremental=True)
+    await signal.refresh(until=str(history.index[-1].date()))
+    await signal.fetch()
+    await signal.update(10000, incremental=True)
+    # Only the three new days and the rows deciding them are computed.
+    assert computed == [len(history) - 3, SPREAD_WINDOW + 1 + 3]
+    assert signal.positions.index[-1] == history.index[-1]
+    assert await signal.check(10000)
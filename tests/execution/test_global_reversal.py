@@ -0,0 +1,46 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.execution.signals.global_reversal import GlobalReversalBase, grid_search
+
+
+@pytest.fixture
+def prices():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2015-01-01', '2018-12-31')
+    values = 50 * np.exp(rs.normal(0, 0.015, (len(index), 5)).cumsum(axis=0))
+    df = pd.DataFrame(values, index=index, columns=['EWJ', 'EWT', 'EWH', 'EWG', 'EWZ'])
+    df.iloc[100:103, 2] = np.nan
+    return df
+
+
+async def expected(prices: pd.DataFrame, tickers, window: int, notional: float):
+    signal = GlobalReversalBase(tickers, window)
+    signal.prices = prices[tickers]
+    await signal.update(notional)
+    stats = signal.yearly_stats()
+    return dict(
+        Sharpe=stats['Sharpe'].drop(stats['Sharpe'].idxmax()).mean(),
+        Return=stats['Return'].mean(),
+        Min=stats['Min'].mean(),
+        Max=stats['Max'].mean(),
+        Win=stats['Win'].mean(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_grid_search_matches_signal_backtest(prices):
+    notional = 10000
+    windows = [2, 8, 32]
+    result = grid_search(prices, notional, sizes=[2, 3], windows=windows, min_sharpe=-np.inf, processes=2)
+    assert len(result) == (10 + 10) * len(windows)
+    assert result['Sharpe'].is_monotonic_decreasing
+    result = result.set_index(result['Pair'].map(tuple) + result['Window'].map(lambda w: (w,)))
+    for n in [2, 3]:
+        for tickers in itertools.combinations(prices.columns, n):
+            for window in windows:
+                row = result.loc[[tickers + (window,)]].iloc[0]
+                for key, value in (await expected(prices, list(tickers), window, notional)).items():
+                    assert row[key] == pytest.approx(value, abs=1e-9, nan_ok=True), (tickers, window, key)
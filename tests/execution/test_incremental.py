@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.execution.signal import DailySignal, Long
+from src.execution.signals.butterfly import Butterfly
+from src.execution.signals.factor import Factor, HEAD, TAIL
+from src.execution.signals.global_reversal import GlobalReversalBase
+from src.execution.signals.ibs import IBS, TICKERS as IBS_TICKERS
+from src.execution.signals.ironman import Ironman, TICKERS
+
+
+class Levered(Long):
+    """ A parameter that changes the weights but not the lookback. """
+
+    def __init__(self, ticker: str, leverage: float = 1):
+        super().__init__(ticker)
+        self.leverage = leverage
+
+    @property
+    def state_params(self):
+        return dict(super().state_params, leverage=self.leverage)
+
+    async def _update(self, notional) -> None:
+        await super()._update(notional * self.leverage)
+        self.weights = self.weights * self.leverage
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr('src.execution.signal.STATE_DIR', str(tmp_path))
+
+
+@pytest.fixture
+def prices():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2018-01-01', periods=300)
+    columns = TICKERS + IBS_TICKERS + HEAD + TAIL + ['EWJ', 'EWT', 'EWH', 'QQQ', 'MDY', 'DIA', 'SPY']
+    values = 50 * np.exp(rs.normal(0, 0.015, (len(index), len(columns))).cumsum(axis=0))
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def signals():
+    return [Long('QQQ'), GlobalReversalBase(['EWJ', 'EWT', 'EWH'], 5), Ironman(), Butterfly(), IBS(), Factor()]
+
+
+def inputs(prices: pd.DataFrame) -> dict:
+    """ Bar and SPY inputs over the whole history, as Portfolio.fetch hands them over. """
+    head = prices[IBS_TICKERS[:1]]
+    return dict(Close=head, High=head * 1.01, Low=head * 0.985, SPY=prices[['SPY']])
+
+
+async def run(signal: DailySignal, prices: pd.DataFrame, incremental: bool = True) -> DailySignal:
+    signal.data = inputs(prices)
+    signal.set_prices(prices)
+    await signal.update(10000, incremental)
+    return signal
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('i', range(6))
+async def test_incremental_matches_full(prices, i, monkeypatch):
+    await run(signals()[i], prices.iloc[:-5])
+    computed = []
+    original = type(signals()[i])._update
+
+    async def _update(self, notional):
+        computed.append(len(self.prices))
+        await original(self, notional)
+
+    monkeypatch.setattr(type(signals()[i]), '_update', _update)
+    for end in [-3, None, None]:
+        signal = await run(signals()[i], prices.iloc[:end])
+    assert computed == [signal.lookback + 2, signal.lookback + 3]
+    full = await run(signals()[i], prices, incremental=False)
+    pd.testing.assert_frame_equal(signal.positions, full.positions, check_freq=False)
+    pd.testing.assert_frame_equal(signal.weights, full.weights, check_freq=False)
+    assert await signal.check(10000)
+
+
+@pytest.mark.asyncio
+async def test_revised_prices_or_notional_recompute(prices):
+    await run(Ironman(), prices.iloc[:-1])
+    revised = prices.copy()
+    revised.iloc[-3] *= 1.01
+    signal = await run(Ironman(), revised)
+    assert await signal.check(10000)
+    signal = Ironman()
+    signal.set_prices(revised)
+    await signal.update(20000, incremental=True)
+    assert await signal.check(20000)
+
+
+@pytest.mark.asyncio
+async def test_other_parameters_do_not_advance_the_state(prices):
+    await run(Levered('QQQ', 1), prices.iloc[:-1])
+    signal = await run(Levered('QQQ', 2), prices)
+    assert await signal.check(10000)
+    assert (signal.weights['QQQ'] == 2).all()
+    assert signal._state_file != Levered('QQQ', 1)._state_file
+    assert Long('QQQ')._state_file == Long('QQQ')._state_file
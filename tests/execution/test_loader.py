@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import Yahoo
+from src.execution.loader import PRICES, STORAGE, DataLoader, Requirement
+from src.execution.portfolio import Portfolio
+from src.execution.signal import Long
+from src.execution.signals.factor import Factor
+from src.execution.signals.ibs import IBS
+
+FIELDS = [Yahoo.ADJ_CLOSE, Yahoo.CLOSE, Yahoo.HIGH, Yahoo.LOW]
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """ Record Yahoo requests and answer them with synthetic (field, ticker) frames. """
+    calls = []
+
+    async def daily(self, tickers, start, field=Yahoo.ADJ_CLOSE, **kwargs):
+        calls.append((list(tickers), start, field))
+        index = pd.bdate_range('2015-01-01', periods=400, name=Yahoo.DATE)
+        index = index[index >= pd.Timestamp(start)]
+        columns = pd.MultiIndex.from_product([FIELDS, tickers])
+        rs = np.random.RandomState(len(calls))
+        values = 50 * np.exp(rs.normal(0, 0.01, (len(index), len(columns))).cumsum(axis=0))
+        df = pd.DataFrame(values, index=index, columns=columns)
+        df[Yahoo.HIGH] = df[Yahoo.HIGH] * 1.01
+        df[Yahoo.LOW] = df[Yahoo.LOW] * 0.99
+        return df if field is None else df[field]
+
+    monkeypatch.setattr(Yahoo, 'daily', daily)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_one_batched_and_cached_load(requests):
+    loader = DataLoader()
+    requirements = [Requirement(PRICES, ['A', 'B'], start='2015-06-01'),
+                    Requirement('High', ['B'], field=Yahoo.HIGH, start='2015-06-01'),
+                    Requirement('C', ['C'], start='2015-03-02')]
+    data = await loader.resolve(requirements)
+    assert requests == [(['A', 'B', 'C'], '2015-03-02', None)]
+    assert list(data['C'].columns) == ['C'] and data['C'].index[0] == pd.Timestamp('2015-03-02')
+    assert data[PRICES].index[0] == pd.Timestamp('2015-06-01')
+    assert list(data['High'].columns) == ['B']
+    # Cached tickers are not requested again, an earlier start is.
+    await loader.load([Requirement(PRICES, ['A', 'D'], start='2015-06-01')])
+    await loader.load([Requirement(PRICES, ['D'], start='2015-04-01')])
+    assert requests[1:] == [(['D'], '2015-06-01', None), (['D'], '2015-04-01', None)]
+    assert list(loader.get(Requirement(PRICES, ['A', 'D'])).columns) == ['A', 'D']
+
+
+@pytest.mark.asyncio
+async def test_storage_files_are_read_once():
+    class Storage:
+        reads = []
+
+        def read_parquet(self, path):
+            self.reads.append(path)
+            return pd.DataFrame({'x': [1.0]})
+
+    loader = DataLoader(Storage())
+    requirement = Requirement('cef', source=STORAGE, path='cef.parquet')
+    await loader.load([requirement, requirement])
+    await loader.load([requirement])
+    assert Storage.reads == ['cef.parquet'] and loader.get(requirement).x.tolist() == [1.0]
+
+
+@pytest.mark.asyncio
+async def test_portfolio_hands_each_signal_its_slice(requests):
+    portfolio = Portfolio([IBS(), Factor(), Long('QQQ')])
+    await portfolio.fetch()
+    assert len(requests) == 1
+    assert set(requests[0][0]) == set(portfolio.tickers) | {'SPY'}
+    ibs, factor, _ = portfolio.signals
+    assert set(ibs.data) == {PRICES, 'Close', 'High', 'Low'} and list(ibs.data['High'].columns) == ['SPXL']
+    assert list(factor.data['SPY'].columns) == ['SPY']
+    assert portfolio.benchmark.prices is not None
+    await portfolio.update(10000, processes=1)
+    await portfolio.run_benchmark(10000)
+    assert len(requests) == 1
+    assert list(portfolio.positions.columns.sort_values()) == sorted(portfolio.tickers)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.execution.portfolio import Portfolio
+from src.execution.signal import Long
+from src.execution.signals.global_reversal import GlobalReversalBase
+from src.execution.signals.ironman import Ironman, TICKERS
+
+
+class Unpicklable(Long):
+    """ Holds a handle that cannot be pickled, like a storage client, so it stays in the parent process. """
+
+    def __init__(self, ticker: str):
+        super().__init__(ticker)
+        self.client = lambda: None
+
+
+@pytest.fixture
+def prices():
+    rs = np.random.RandomState(0)
+    index = pd.bdate_range('2016-01-01', periods=600)
+    columns = TICKERS + ['EWJ', 'EWT', 'EWH', 'QQQ']
+    values = 50 * np.exp(rs.normal(0, 0.015, (len(index), len(columns))).cumsum(axis=0))
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def portfolio(prices: pd.DataFrame) -> Portfolio:
+    signals = [Ironman(), GlobalReversalBase(['EWJ', 'EWT', 'EWH'], 5), Long('QQQ'), Unpicklable('EWJ')]
+    portfolio = Portfolio(signals)
+    portfolio.set_prices(prices)
+    return portfolio
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+async def test_parallel_update_matches_sequential(prices, dtype):
+    # Compact prices are float32, the workers must see them as they are.
+    prices = prices.astype(dtype)
+    sequential, parallel = portfolio(prices), portfolio(prices)
+    await sequential.update(10000)
+    await parallel.update(10000, processes=2)
+    pd.testing.assert_frame_equal(parallel.positions, sequential.positions, check_exact=True)
+    pd.testing.assert_frame_equal(parallel.weights, sequential.weights, check_exact=True)
+    assert list(parallel.timings) == [signal.name for signal in parallel.signals]
+    for expected, signal in zip(sequential.signals, parallel.signals):
+        pd.testing.assert_frame_equal(signal.positions, expected.positions)
+        assert signal.notional == expected.notional == 2500
+        assert signal.analyzable
@@ -0,0 +1,70 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+
+from src.signals.optimizer import factor, min_variance, min_variance_template, optimize_min_vol, \
+    optimize_risk_adj_return, solve_box_qp
+
+
+@pytest.fixture
+def moments():
+    rs = np.random.RandomState(0)
+    returns = rs.normal(0.0005, 0.01, (250, 12))
+    return returns.mean(axis=0), np.cov(returns.T)
+
+
+def test_min_vol_template_agrees_with_quad_form(moments):
+    mu, sigma = moments
+    w = cp.Variable(len(mu))
+    expected = optimize_min_vol(mu, sigma, w=w, w_lower=0.0, w_upper=0.3)
+    result = optimize_min_vol(mu, sigma, w_lower=0.0, w_upper=0.3)
+    assert np.allclose(result, expected, atol=1e-4)
+
+
+def test_risk_adj_return_template_agrees_with_quad_form(moments):
+    mu, sigma = moments
+    w = cp.Variable(len(mu))
+    expected = optimize_risk_adj_return(mu, sigma, w=w, risk_factor=50, w_lower=0.0, w_upper=0.5)
+    result = optimize_risk_adj_return(mu, sigma, risk_factor=50, w_lower=0.0, w_upper=0.5)
+    assert np.allclose(result, expected, atol=1e-4)
+
+
+def test_template_is_reused(moments):
+    mu, sigma = moments
+    template = min_variance_template(len(mu), min_ret=True)
+    hits = min_variance_template.cache_info().hits
+    for scale in [1, 2, 3]:
+        w = min_variance_template(len(mu), min_ret=True).solve(F=factor(sigma * scale), mu=mu, r=0, lb=0, ub=0.3)
+        assert w.sum() == pytest.approx(1)
+    assert min_variance_template(len(mu), min_ret=True) is template
+    assert min_variance_template.cache_info().hits >= hits + 3
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('lb, ub', [(0.0, 1.0), (0.0, 0.15), (0.02, 0.3)])
+def test_box_qp_agrees_with_cvxpy(seed, lb, ub):
+    rs = np.random.RandomState(seed)
+    n = 20
+    returns = rs.normal(0.0005, 0.01, (120, n)) @ (np.eye(n) + rs.normal(0, 0.2, (n, n)))
+    Q, c = 2 * 10 * np.cov(returns.T), returns.mean(axis=0)
+    result = solve_box_qp(Q, c, lb, ub)
+    w = cp.Variable(n)
+    cp.Problem(cp.Minimize(0.5 * cp.quad_form(w, Q) - c @ w), [cp.sum(w) == 1, w >= lb, w <= ub]).solve()
+    assert result is not None
+    assert result.sum() == pytest.approx(1)
+    assert result.min() >= lb and result.max() <= ub
+    assert np.allclose(result, w.value, atol=1e-4)
+
+
+def test_box_qp_infeasible_falls_back(moments):
+    mu, sigma = moments
+    assert solve_box_qp(2 * sigma, np.zeros(len(mu)), 0.0, 0.05) is None
+    assert min_variance(sigma, 0.0, 1.0).sum() == pytest.approx(1)
+
+
+def test_extra_constraints_use_cvxpy(moments, monkeypatch):
+    mu, sigma = moments
+    monkeypatch.setattr('src.signals.optimizer.solve_box_qp', lambda *args, **kwargs: pytest.fail('fast path used'))
+    w = cp.Variable(len(mu))
+    result = optimize_min_vol(mu, sigma, w=w, w_upper=0.3, constraints=[w[0] >= 0.2])
+    assert result[0] >= 0.2 - 1e-6
@@ -1,11 +1,12 @@
 import arrow
+import numpy as np
 import pandas as pd
 import pytest
 import pytz
 
 from datetime import datetime
 
-from src.utils.time import EST, MarketCalendar, yesterday
+from src.utils.time import EST, NYSE, MarketCalendar, Sessions, sessions, yesterday
 
 
 @pytest.mark.parametrize("timestamp, expected", [
@@ -74,3 +75,33 @@ def test_prev_open_date(ts, expected):
 ])
 def test_yesterday(base, expected):
     assert yesterday(base=base) == expected
+
+
+def test_sessions_match_exchange_calendar():
+    schedule = NYSE.schedule('2019-01-01', '2020-12-31')
+    rs = np.random.RandomState(0)
+    ts = pd.to_datetime(rs.randint(schedule.market_open.iloc[0].value, schedule.market_close.iloc[-2].value, 500))\
+        .tz_localize('UTC').append(pd.DatetimeIndex(schedule.market_close.iloc[:20]))
+    expected = [NYSE.open_at_time(schedule, t) for t in ts]
+    assert sessions().open_at(ts).tolist() == expected
+    expected = [schedule.market_close[schedule.market_close > t].iloc[0] for t in ts]
+    assert sessions().next_close(ts).equals(pd.DatetimeIndex(expected))
+
+
+def test_sessions_vectorized():
+    dates = ['2020-07-02', '2020-07-03', '2020-07-04', '2020-07-06']
+    assert sessions().is_session(dates).tolist() == [True, False, False, True]
+    assert MarketCalendar.most_recent_open_dates(dates) == ['2020-07-02', '2020-07-02', '2020-07-02', '2020-07-06']
+    assert sessions().next(dates).astype(str).tolist() == ['2020-07-06', '2020-07-06', '2020-07-06', '2020-07-07']
+    assert sessions().offset(dates, -1).astype(str).tolist() == ['2020-07-01', '2020-07-01', '2020-07-01', '2020-07-02']
+    assert sessions().count('2020-07-01', '2020-07-10').tolist() == [7]
+    assert MarketCalendar.open_dates('2020-07-01', '2020-07-07').equals(
+        pd.DatetimeIndex(['2020-07-01', '2020-07-02', '2020-07-06', '2020-07-07']))
+
+
+def test_sessions_persisted(tmp_path):
+    path = tmp_path / 'sessions.parquet'
+    built = Sessions.build('2020-01-01', '2020-12-31', path=path)
+    loaded = Sessions.build(path=path)
+    assert path.exists()
+    assert (loaded.dates == built.dates).all() and (loaded.closes == built.closes).all()